@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+'''
+Microbenchmark showing that the cost of converting one snippet does not grow
+with the number of conversion rules.
+'''
+
+from __future__ import print_function
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from catkinize.convert_cmake import RuleTable, conversions, manual_conversions
+
+
+def main():
+    snippets = [('  rosbuild_add_executable', '(foo src/foo.cpp)'),
+                ('rosbuild_add_compile_flags', '(foo -O3)'),
+                ('include', '($ENV{ROS_ROOT}/core/rosbuild/rosbuild.cmake)'),
+                ('add_definitions', '(-DFOO)')]
+    print('%8s %14s %14s' % ('rules', 'us/snippet', 'us/uncached'))
+    for count in [0, 10, 100, 1000, 10000]:
+        extra = [('in_house_macro_%d' % i, 'house_macro_%d' % i) for i in range(count)]
+        table = RuleTable(conversions + extra, manual_conversions)
+        number = 20000
+
+        def cached():
+            for name, args in snippets:
+                table.convert(name, args)
+
+        def uncached():
+            for name, args in snippets:
+                table._convert(name, args)
+        per_snippet = min(timeit.repeat(cached, number=number, repeat=3)) / number / len(snippets)
+        per_uncached = min(timeit.repeat(uncached, number=number, repeat=3)) / number / len(snippets)
+        print('%8d %14.3f %14.3f' % (count, per_snippet * 1e6, per_uncached * 1e6))
+
+
+if __name__ == '__main__':
+    main()
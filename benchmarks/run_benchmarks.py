@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+'''
+Benchmarks of the converter hot paths on the test fixtures, scaled up to 100
+times their size. Results are written as JSON, and can be compared to those
+of an earlier run to catch regressions.
+'''
+
+from __future__ import print_function
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import time
+import timeit
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import catkinize
+from catkinize import cmake_lexer, xml_lib
+from catkinize.convert_cmake import FUNCALL_PATTERN, convert_snippet, convert_boost_snippet, \
+    iter_convert_cmake, rewrite_cmake
+from catkinize.convert_manifest import convert_manifest, make_from_manifest, create_project_xml, merge_dups, Manifest
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'test', 'fixtures')
+FIXTURES = ['navfn', 'stage', 'rpekf']
+SCALES = [1, 10, 100]
+DEPEND_RX = re.compile(r'^.*<(?:depend|rosdep) .*$', re.MULTILINE)
+
+
+def read_fixture(pattern, fixture):
+    with open(os.path.join(FIXTURES_DIR, pattern % fixture)) as fhand:
+        return fhand.read()
+
+
+def scaled_cmakelists(fixture, scale):
+    return read_fixture('CMakeLists.%s.txt.in', fixture) * scale
+
+
+def scaled_manifest(fixture, scale):
+    """manifest with scale times as many dependencies, all with distinct names"""
+    content = read_fixture('manifest.%s.xml', fixture)
+    depends = [match.group(0) for match in DEPEND_RX.finditer(content)]
+    if not depends:
+        depends = ['<depend package="roscpp"/>']
+    extra = '\n'.join(line.replace('"/>', '_%d"/>' % count).replace('" />', '_%d" />' % count)
+                      for count in range(1, scale)
+                      for line in depends)
+    return content.replace('</package>', extra + '\n</package>')
+
+
+def project_xml_args(manifest):
+    return dict(package_name='foo', version='1.0.0', description=manifest.description,
+                maintainers=[(a, {'email': ''}) if not isinstance(a, tuple) else a for a in manifest.authors],
+                licenses=manifest.licenses, website_url=manifest.website_url, bugtracker_url='',
+                authors=manifest.authors, build_depends=manifest.depends, run_depends=manifest.depends,
+                test_depends=manifest.depends, replaces=[], conflicts=[], exports=manifest.exports,
+                architecture_independent=False, metapackage=False)
+
+
+# each case maps (fixture, scale) to (size of the input, function to time)
+def case_funcall_pattern(fixture, scale):
+    content = scaled_cmakelists(fixture, scale)
+    return len(content), lambda: FUNCALL_PATTERN.split(content)
+
+
+def case_cmake_lexer(fixture, scale):
+    content = scaled_cmakelists(fixture, scale)
+    return len(content), lambda: cmake_lexer.scan(content)
+
+
+def case_convert_snippet(fixture, scale):
+    content = scaled_cmakelists(fixture, scale)
+    snippets = [(content[c.start:c.args_start], content[c.args_start:c.end])
+                for c in cmake_lexer.scan(content).commands]
+
+    def run():
+        for name, args in snippets:
+            convert_snippet(name, args)
+    return len(content), run
+
+
+def case_convert_boost_snippet(fixture, scale):
+    content = scaled_cmakelists(fixture, scale)
+    snippets = [(content[c.start:c.args_start], content[c.args_start:c.end])
+                for c in cmake_lexer.scan(content).commands]
+
+    def run():
+        for name, args in snippets:
+            convert_boost_snippet(name, args)
+    return len(content), run
+
+
+def case_iter_convert_cmake(fixture, scale):
+    content = scaled_cmakelists(fixture, scale)
+    manifest = Manifest(read_fixture('manifest.%s.xml', fixture))
+    return len(content), lambda: ''.join(iter_convert_cmake([content], 'foo', manifest=manifest))
+
+
+def case_rewrite_cmake(fixture, scale):
+    content = scaled_cmakelists(fixture, scale)
+    manifest = Manifest(read_fixture('manifest.%s.xml', fixture))
+    return len(content), lambda: rewrite_cmake(content, 'foo', manifest=manifest)
+
+
+def case_make_from_manifest(fixture, scale):
+    content = scaled_manifest(fixture, scale)
+    return len(content), lambda: make_from_manifest(content, 'foo', '1.0.0', False, False, '', [], [])
+
+
+def case_convert_manifest(fixture, scale):
+    content = scaled_manifest(fixture, scale)
+    manifest = Manifest(content)
+    return len(content), lambda: convert_manifest('foo', None, '1.0.0', manifest=manifest)
+
+
+def case_create_project_xml(fixture, scale):
+    content = scaled_manifest(fixture, scale)
+    args = project_xml_args(Manifest(content))
+    return len(content), lambda: create_project_xml(**args)
+
+
+def case_merge_dups(fixture, scale):
+    content = scaled_manifest(fixture, scale)
+    lines = make_from_manifest(content, 'foo', '1.0.0', False, False, '', [], []).splitlines()
+    return len(content), lambda: merge_dups(lines)
+
+
+def case_comment_out_tags_named(fixture, scale):
+    content = scaled_manifest(fixture, scale)
+    xml = create_project_xml(**project_xml_args(Manifest(content)))
+    return len(xml), lambda: xml_lib.comment_out_tags_named(xml, 'test_depend')
+
+
+CASES = [
+    ('funcall_pattern', case_funcall_pattern),
+    ('cmake_lexer', case_cmake_lexer),
+    ('convert_snippet', case_convert_snippet),
+    ('convert_boost_snippet', case_convert_boost_snippet),
+    ('iter_convert_cmake', case_iter_convert_cmake),
+    ('rewrite_cmake', case_rewrite_cmake),
+    ('make_from_manifest', case_make_from_manifest),
+    ('convert_manifest', case_convert_manifest),
+    ('create_project_xml', case_create_project_xml),
+    ('merge_dups', case_merge_dups),
+    ('comment_out_tags_named', case_comment_out_tags_named),
+]
+
+
+def time_function(function, repeat, min_time):
+    """
+    :returns: best and mean seconds per call over repeat runs, each run
+    calling function often enough to take at least min_time
+    """
+    timer = timeit.Timer(function)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return min(times), sum(times) / len(times)
+
+
+def peak_allocated(function):
+    """
+    :returns: peak bytes allocated during one call of function, None if
+    tracemalloc is not available, as on Python 2
+    """
+    if tracemalloc is None:
+        return None
+    function()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(cases, scales, repeat, min_time):
+    results = []
+    for case_name, case in cases:
+        for fixture in FIXTURES:
+            for scale in scales:
+                size, function = case(fixture, scale)
+                best, mean = time_function(function, repeat, min_time)
+                peak = peak_allocated(function)
+                results.append(dict(case=case_name, fixture=fixture, scale=scale,
+                                    size=size, best=best, mean=mean, peak_allocated=peak))
+                print('%-24s %-6s %4dx %9d bytes %12.1f us%s'
+                      % (case_name, fixture, scale, size, best * 1e6,
+                         '' if peak is None else ' %10d bytes peak' % peak),
+                      file=sys.stderr)
+    return dict(meta=dict(catkinize_version=catkinize.__version__,
+                          python=platform.python_version(),
+                          platform=platform.platform(),
+                          time=time.strftime('%Y-%m-%dT%H:%M:%S')),
+                results=results)
+
+
+def compare(old, new, threshold):
+    """
+    prints the ratio of new to old best times per benchmark
+    :returns: list of the benchmarks slower than threshold times the old time
+    """
+    old_results = dict(((r['case'], r['fixture'], r['scale']), r) for r in old['results'])
+    regressions = []
+    for result in new['results']:
+        key = (result['case'], result['fixture'], result['scale'])
+        if key not in old_results:
+            continue
+        ratio = result['best'] / old_results[key]['best']
+        marker = ''
+        if ratio > threshold:
+            marker = '  REGRESSION'
+            regressions.append(key)
+        print('%-24s %-6s %4dx %8.2fx%s' % (key + (ratio, marker)))
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='runs benchmarks of the converter hot paths')
+    parser.add_argument('-o', '--output', default=None,
+                        help='file to write the results to as JSON (default: stdout)')
+    parser.add_argument('-c', '--compare', default=None,
+                        help='JSON results of an earlier run to compare with, exits with 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown factor reported as regression (default: %(default)s)')
+    parser.add_argument('-k', '--cases', default=None,
+                        help='comma-separated names of the cases to run (default: all)')
+    parser.add_argument('--scales', default=','.join(str(s) for s in SCALES),
+                        help='comma-separated input scale factors (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of timed runs per benchmark (default: %(default)s)')
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help='minimum seconds per timed run (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    cases = CASES
+    if args.cases:
+        names = args.cases.split(',')
+        cases = [(name, case) for name, case in CASES if name in names]
+    scales = [int(scale) for scale in args.scales.split(',')]
+    results = run_benchmarks(cases, scales, args.repeat, args.min_time)
+
+    if args.output:
+        with open(args.output, 'w') as fhand:
+            json.dump(results, fhand, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+    if args.compare:
+        with open(args.compare) as fhand:
+            old = json.load(fhand)
+        if compare(old, results, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,169 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+"""
+Batch conversion of many packages in a pool of processes, for the
+single file conversion scripts.
+
+Results are either written below an output directory, mirroring the
+package paths, or as JSON lines of the form
+
+  {"path": "foo", "ok": true, "result": "cmake_minimum_required(..."}
+  {"path": "bar", "ok": false, "error": "..."}
+"""
+
+from __future__ import print_function
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+from catkinize.convert_cmake import convert_cmake
+from catkinize.convert_manifest import convert_manifest
+
+# errors of a single package that do not stop the others
+CONVERSION_ERRORS = (IOError, OSError, ValueError, ET.ParseError)
+
+
+def expand_paths(patterns, from_file=None, instream=sys.stdin):
+    """
+    :param patterns: paths, or glob patterns matched in sorted order
+    :param from_file: file listing more paths, one per line, - for instream.
+    Empty lines and lines starting with # are skipped.
+    :returns: list of paths, without duplicates, in the given order
+    """
+    patterns = list(patterns)
+    if from_file == '-':
+        patterns.extend(instream.read().splitlines())
+    elif from_file:
+        with open(from_file) as fhand:
+            patterns.extend(fhand.read().splitlines())
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        pattern = pattern.strip()
+        if not pattern or pattern.startswith('#'):
+            continue
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+def output_path(output_dir, package_path, filename):
+    """
+    :returns: path of filename in output_dir, below the package path relative
+    to the current directory, or below the absolute package path if outside
+    """
+    path = os.path.relpath(os.path.abspath(package_path))
+    if path == os.pardir or path.startswith(os.pardir + os.sep):
+        path = os.path.abspath(package_path).lstrip(os.sep)
+    return os.path.normpath(os.path.join(output_dir, path, filename))
+
+
+def convert_cmake_task(project_path):
+    """
+    Converts the CMakeLists.txt of the package at project_path.
+    :returns: project_path, and the converted file or the error message
+    """
+    try:
+        return project_path, True, convert_cmake(project_path) + '\n'
+    except CONVERSION_ERRORS as exc:
+        return project_path, False, str(exc)
+
+
+def convert_manifest_task(args):
+    """
+    Converts a manifest.xml, taking all arguments of convert_manifest as one tuple.
+    :returns: the manifest path, and the package.xml or the error message
+    """
+    manifest_xml_path = args[1]
+    try:
+        package_xml = convert_manifest(*args)
+    except CONVERSION_ERRORS as exc:
+        return manifest_xml_path, False, str(exc)
+    if package_xml is None:
+        return manifest_xml_path, False, 'could not parse %s' % manifest_xml_path
+    return manifest_xml_path, True, package_xml + '\n'
+
+
+def run_batch(task, items, jobs=None, output=None, output_file=None, errstream=sys.stderr,
+              initializer=None, initargs=()):
+    """
+    Runs task on all items in a pool of jobs processes, one per CPU by
+    default, and writes the results in the order of items.
+    :param task: function returning the path, whether it succeeded and the
+    result or error message
+    :param output: function returning the file to write a result to, given
+    the path. Without it, results are written as JSON lines to output_file.
+    :param initializer: function called with initargs in each worker process
+    :returns: number of failed items
+    """
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    jobs = max(1, min(jobs, len(items)))
+    if jobs == 1:
+        pool = None
+        results = (task(item) for item in items)
+    else:
+        pool = multiprocessing.Pool(jobs, initializer, initargs)
+        # several items per task keep the workers busy with small packages
+        results = pool.imap(task, items, max(1, len(items) // (jobs * 4)))
+    failed = 0
+    try:
+        for path, ok, result in results:
+            if not ok:
+                failed += 1
+            if output is None:
+                record = {'path': path, 'ok': ok}
+                record['result' if ok else 'error'] = result
+                output_file.write(json.dumps(record) + '\n')
+            elif ok:
+                filename = output(path)
+                directory = os.path.dirname(filename)
+                if directory and not os.path.isdir(directory):
+                    os.makedirs(directory)
+                with open(filename, 'w') as fhand:
+                    fhand.write(result)
+            else:
+                print('Could not convert %s: %s' % (path, result), file=errstream)
+        if pool is not None:
+            pool.close()
+    except:
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        if pool is not None:
+            pool.join()
+    if output_file is not None:
+        output_file.flush()
+    return failed
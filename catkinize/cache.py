@@ -0,0 +1,150 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Persistent cache of converted files, addressed by a hash of everything a
+conversion depends on.
+"""
+
+import hashlib
+import os
+import tempfile
+
+import catkinize
+
+try:
+    basestring
+except NameError:
+    # Python 3
+    basestring = str
+
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024
+
+
+class ConversionCache(object):
+    """
+    Stores converted file contents in cache_dir, one file per key. Reading an
+    entry marks it as recently used by touching it, and prune() removes the
+    least recently used entries once the cache grows beyond max_size bytes.
+    Counts hits and misses of get() for conversions.
+    """
+
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, *parts):
+        """
+        :returns: hash of the catkinize version and all parts, which are the
+        inputs and options of a conversion
+        """
+        digest = hashlib.sha1()
+        for part in (catkinize.__version__,) + parts:
+            if not isinstance(part, bytes):
+                part = repr(part) if not isinstance(part, basestring) else part
+                part = part.encode('utf-8')
+            # length prefix, so that no two different lists of parts collide
+            digest.update(('%d:' % len(part)).encode('ascii'))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key[2:])
+
+    def get(self, key, count=True):
+        """
+        :param count: whether to count the lookup as a hit or miss, False for
+        entries that are no converted files
+        :returns: the cached contents for key, None if not cached
+        """
+        path = self._path(key)
+        try:
+            with open(path) as fhand:
+                contents = fhand.read()
+            os.utime(path, None)
+        except (IOError, OSError):
+            if count:
+                self.misses += 1
+            return None
+        if count:
+            self.hits += 1
+        return contents
+
+    def put(self, key, contents):
+        path = self._path(key)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # created concurrently
+                if not os.path.isdir(dirname):
+                    raise
+        # write to a temporary file first, readers never see partial entries
+        handle, tmp_path = tempfile.mkstemp(dir=dirname)
+        with os.fdopen(handle, 'w') as fhand:
+            fhand.write(contents)
+        os.rename(tmp_path, path)
+
+    def prune(self):
+        """
+        Removes least recently used entries until the cache is no larger than max_size.
+        :returns: number of removed entries
+        """
+        entries = []
+        total = 0
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        for subdir in os.listdir(self.cache_dir):
+            subdir = os.path.join(self.cache_dir, subdir)
+            if not os.path.isdir(subdir):
+                continue
+            for filename in os.listdir(subdir):
+                path = os.path.join(subdir, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def summary(self):
+        return 'Conversion cache %s: %d hits, %d misses' % (self.cache_dir, self.hits, self.misses)
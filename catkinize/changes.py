@@ -0,0 +1,164 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Compact records of planned changes, holding large converted contents in
+files instead of memory.
+"""
+
+import os
+import tempfile
+
+# contents larger than this many bytes are spilled to files
+SPILL_THRESHOLD = 64 * 1024
+
+
+class SpilledContent(object):
+    """
+    Produces content spilled to the file at path. Picklable, so that changes
+    can be sent to other processes without their contents.
+    """
+
+    __slots__ = ('path',)
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self):
+        with open(self.path) as fhand:
+            return fhand.read()
+
+    def __getstate__(self):
+        return self.path
+
+    def __setstate__(self, path):
+        self.path = path
+
+
+class Change(object):
+    """
+    A planned change: oldfile is renamed to backup_file, and newfile is
+    created with content. Either may be None. content may be the text or a
+    picklable callable producing it on demand. A Change unpacks and compares
+    like the 4-tuple of oldfile, backup_file, newfile, content it replaces,
+    indexing the paths does not produce the content.
+    """
+
+    __slots__ = ('oldfile', 'backup_file', 'newfile', '_content', 'size')
+
+    def __init__(self, oldfile, backup_file, newfile=None, content=None, size=None):
+        self.oldfile = oldfile
+        self.backup_file = backup_file
+        self.newfile = newfile
+        self._content = content
+        # bytes of content, None if unknown before producing it
+        if size is None and not callable(content) and content is not None:
+            size = len(content)
+        self.size = size
+
+    @property
+    def content(self):
+        if callable(self._content):
+            return self._content()
+        return self._content
+
+    @property
+    def memory_size(self):
+        """bytes of content held in memory"""
+        if callable(self._content) or self._content is None:
+            return 0
+        return len(self._content)
+
+    def spill(self, directory, threshold=None):
+        """
+        Moves content larger than threshold bytes, by default SPILL_THRESHOLD,
+        to a new file in directory.
+        """
+        if threshold is None:
+            threshold = SPILL_THRESHOLD
+        if callable(self._content) or self._content is None or len(self._content) <= threshold:
+            return
+        handle, path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.newfile) + '.')
+        with os.fdopen(handle, 'w') as fhand:
+            fhand.write(self._content)
+        self._content = SpilledContent(path)
+
+    def __iter__(self):
+        return iter((self.oldfile, self.backup_file, self.newfile, self.content))
+
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        if index in (3, -1):
+            return self.content
+        return (self.oldfile, self.backup_file, self.newfile, None)[index]
+
+    def __eq__(self, other):
+        try:
+            return len(other) == 4 and tuple(self) == tuple(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        content = self._content
+        if callable(content):
+            content = '<%s bytes>' % self.size
+        else:
+            content = repr(content)
+        return 'Change(%r, %r, %r, %s)' % (self.oldfile, self.backup_file, self.newfile, content)
+
+    def __getstate__(self):
+        return self.oldfile, self.backup_file, self.newfile, self._content, self.size
+
+    def __setstate__(self, state):
+        self.oldfile, self.backup_file, self.newfile, self._content, self.size = state
+
+
+def changeset_sizes(changeset):
+    """
+    :returns: total bytes of the new contents in changeset, and bytes of those held in memory
+    """
+    total = 0
+    in_memory = 0
+    for change in changeset:
+        if isinstance(change, Change):
+            total += change.size or 0
+            in_memory += change.memory_size
+        elif change[3] is not None:
+            total += len(change[3])
+            in_memory += len(change[3])
+    return total, in_memory
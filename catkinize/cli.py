@@ -0,0 +1,218 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+"""
+Options and run of the catkinize and catkinize_stack scripts, which only
+differ in their arguments and in converting a package or a whole stack.
+"""
+
+from __future__ import print_function
+import cProfile
+import os
+import shutil
+import sys
+import tempfile
+
+from catkinize import profiling
+from catkinize.cache import ConversionCache, DEFAULT_MAX_SIZE
+from catkinize.changes import changeset_sizes
+from catkinize.diff import ChangesetDiffs
+from catkinize.engine import ConversionEngine
+from catkinize.report import make_report, write_report
+from catkinize.rosdep import get_rosdep_resolver
+from catkinize.rules import use_rule_packs
+from catkinize.main import build_package_index, prompt_changes, perform_changes, \
+    resume_changes, rollback_changes, JOURNAL_NAME, WRITE_JOBS
+
+
+def add_conversion_options(parser):
+    """
+    Adds the options for the cache, package index, rosdep keys and rule
+    packs, which any conversion uses.
+    """
+    parser.add_option('--cache-dir',
+                      dest='cache_dir',
+                      type='string', default=None,
+                      help='Directory caching converted files across runs')
+    parser.add_option('--cache-size',
+                      dest='cache_size',
+                      type='int', default=DEFAULT_MAX_SIZE // (1024 * 1024),
+                      help='Size limit of the cache in MB, least recently used files are removed beyond (default: %default)')
+    parser.add_option('--workspace',
+                      dest='workspaces',
+                      action='append', default=[],
+                      help='Index the packages below this path, which may be given several times, to tell catkin package dependencies from system dependencies')
+    parser.add_option('--rosdep-dir',
+                      dest='rosdep_dir',
+                      type='string', default=None,
+                      help='Check rosdep keys against the rosdep database files in this directory, and list the known ones as dependencies')
+    parser.add_option('--rules',
+                      dest='rules',
+                      action='append', default=[],
+                      help='Also convert CMake commands by the rules in this YAML or JSON rule pack, which may be given several times, later packs overriding earlier ones')
+
+
+def add_common_options(parser):
+    """
+    Adds the options of both scripts, see run().
+    """
+    parser.add_option('--io-concurrency',
+                      dest='io_concurrency',
+                      type='int', default=0,
+                      help='Read and convert with this many file system operations in flight, for network storage')
+    add_conversion_options(parser)
+    parser.add_option('--profile',
+                      dest='profile',
+                      action='store_true', default=False,
+                      help='Print the time spent per stage and the slowest packages')
+    parser.add_option('--profile-output',
+                      dest='profile_output',
+                      type='string', default=None,
+                      help='Also write cProfile statistics of the run to this file, for pstats')
+    parser.add_option('--trace',
+                      dest='trace',
+                      type='string', default=None,
+                      help='Write a timeline of the stages of every package and file, per process and thread, to this file in the Chrome trace event format')
+    parser.add_option('-y', '--yes', '--batch',
+                      dest='yes',
+                      action='store_true', default=False,
+                      help='Perform the changes without asking for confirmation')
+    parser.add_option('--report',
+                      dest='report',
+                      type='string', default=None,
+                      help='Write a JSON report of the changes, timings and manual migration markers per package to this file')
+    parser.add_option('--diff-output',
+                      dest='diff_output',
+                      type='string', default=None,
+                      help='Write the diffs of all changes to this file before asking for confirmation')
+    parser.add_option('--write-jobs',
+                      dest='write_jobs',
+                      type='int', default=WRITE_JOBS,
+                      help='Number of files to write in parallel (default: %default)')
+    parser.add_option('--resume',
+                      dest='resume',
+                      action='store_true', default=False,
+                      help='Finish the changes of an interrupted run in path')
+    parser.add_option('--rollback',
+                      dest='rollback',
+                      action='store_true', default=False,
+                      help='Undo the changes of an interrupted run in path')
+
+
+def recover(parser, options, args):
+    """
+    Finishes or undoes an interrupted run for --resume or --rollback.
+    :returns: False if neither was given, so there is a run to do
+    """
+    if not (options.resume or options.rollback):
+        return False
+    if len(args) != 1:
+        parser.error('Expected only the path with --resume or --rollback')
+    journal = os.path.join(args[0], JOURNAL_NAME)
+    if not os.path.exists(journal):
+        parser.error('No interrupted run in %s' % args[0])
+    if options.rollback:
+        rollback_changes(journal, print)
+    elif not resume_changes(journal, print):
+        print('Run was interrupted before any file was changed, cleaned up')
+    return True
+
+
+def run(options, path, convert, jobs=None):
+    """
+    Converts, shows and performs the changes of path as the options of
+    add_common_options() say, with profiling, cache upkeep and report.
+    :param convert: called with a ConversionEngine, or None without
+    --io-concurrency, and the cache, spill directory, package index and
+    rosdep resolver, returning the changeset
+    :param jobs: number of processes computing the diffs, None for one per
+    CPU
+    """
+    profiler = None
+    if options.trace:
+        profiler = profiling.enable(profiling.Tracer())
+    elif options.profile or options.profile_output or options.report:
+        profiler = profiling.enable()
+    cprofile = None
+    if options.profile_output:
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+
+    cache = None
+    if options.cache_dir:
+        cache = ConversionCache(options.cache_dir, options.cache_size * 1024 * 1024)
+    changeset = []
+    # large converted files wait here instead of in memory
+    spill_dir = tempfile.mkdtemp(prefix='catkinize-')
+    try:
+        package_index = None
+        if options.workspaces:
+            package_index = build_package_index(options.workspaces)
+            print('Indexed %d packages' % len(package_index))
+        rosdep_resolver = None
+        if options.rosdep_dir:
+            rosdep_resolver = get_rosdep_resolver(options.rosdep_dir)
+            print('Loaded %d rosdep keys' % len(rosdep_resolver))
+        if options.rules:
+            print('Loaded %d rules' % use_rule_packs(options.rules, cache))
+        if options.io_concurrency > 0:
+            with ConversionEngine(options.io_concurrency, cache, spill_dir, package_index,
+                                  rosdep_resolver) as engine:
+                changeset = convert(engine, cache, spill_dir, package_index, rosdep_resolver)
+        else:
+            changeset = convert(None, cache, spill_dir, package_index, rosdep_resolver)
+        if cache is not None:
+            print(cache.summary())
+            cache.prune()
+        diffs = ChangesetDiffs(changeset, jobs)
+        if options.diff_output:
+            diffs.write(options.diff_output)
+            print('Wrote diffs to %s' % options.diff_output)
+        status = 'declined'
+        if options.yes or prompt_changes(changeset, diffs=diffs):
+            perform_changes(changeset, os.path.join(path, JOURNAL_NAME), options.write_jobs)
+            status = 'applied'
+        if options.report:
+            write_report(make_report(path, changeset, status, profiler), options.report)
+    except Exception as err:
+        if options.report:
+            write_report(make_report(path, changeset, 'failed', profiler, err), options.report)
+        raise
+    finally:
+        shutil.rmtree(spill_dir)
+
+    if cprofile is not None:
+        cprofile.disable()
+        cprofile.dump_stats(options.profile_output)
+    if options.trace:
+        profiler.write_trace(options.trace)
+        print('Wrote trace to %s' % options.trace, file=sys.stderr)
+    if options.profile or options.profile_output:
+        print(profiler.summary(), file=sys.stderr)
+        total_size, memory_size = changeset_sizes(changeset)
+        print('\n%d changes, %d bytes of new contents, %d bytes of those in memory'
+              % (len(changeset), total_size, memory_size), file=sys.stderr)
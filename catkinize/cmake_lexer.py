@@ -0,0 +1,308 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Lexer for CMake code, finding all command invocations in a single pass
+over the buffer, following the syntax in the cmake-language manual.
+"""
+
+import re
+
+# anything outside of commands that matters: a comment or a command name
+TOPLEVEL_PATTERN = re.compile(r'#|[A-Za-z_][A-Za-z0-9_]*')
+OPEN_PAREN_PATTERN = re.compile(r'[ \t]*\(')
+BLANKS_PATTERN = re.compile(r'[ \t]*')
+BRACKET_OPEN_PATTERN = re.compile(r'\[(=*)\[')
+# one lexical element inside the parentheses of a command invocation.
+# Quoted text is matched as runs of plain characters between escapes, so that
+# a quote that is never closed costs one pass to the end of the content and
+# not a backtracking step per character.
+ARGUMENT_PATTERN = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<open>\()
+  | (?P<close>\))
+  | (?P<quoted>"[^"\\]*(?:\\.[^"\\]*)*")
+  | (?P<bracket>\[=*\[)
+  | (?P<comment>\#)
+  | (?P<unquoted>(?:[^\s()"#\\]|\\.)(?:[^\s()"#\\]+|\\.|"[^"\\]*(?:\\.[^"\\]*)*")*)
+''', re.VERBOSE | re.DOTALL)
+
+
+class CMakeSyntaxError(ValueError):
+    """Malformed CMake code, with the line where the offending element starts"""
+
+    def __init__(self, message, line):
+        ValueError.__init__(self, '%s at line %d' % (message, line))
+        self.message = message
+        self.line = line
+
+
+class Command(object):
+    """
+    A command invocation, as positions in the scanned content.
+    content[start:args_start] is the name with its indentation,
+    content[args_start:end] the arguments including the parentheses.
+    """
+    __slots__ = ('name', 'start', 'args_start', 'end')
+
+    def __init__(self, name, start, args_start, end):
+        self.name = name
+        self.start = start
+        self.args_start = args_start
+        self.end = end
+
+
+class Scan(object):
+    """
+    Result of scanning CMake code: the list of command invocations and the
+    set of command names, so that checks like 'has catkin_package' need no
+    further pass over the content.
+    """
+
+    def __init__(self, commands, names):
+        self.commands = commands
+        self.names = names
+
+    def has_command(self, name):
+        return name in self.names
+
+
+def _syntax_error(message, content, pos):
+    return CMakeSyntaxError(message, content.count('\n', 0, pos) + 1)
+
+
+def _skip_bracket(content, pos, what):
+    """
+    Skips a bracket argument or comment starting at pos with [=*[
+    :returns: position after the closing bracket
+    """
+    match = BRACKET_OPEN_PATTERN.match(content, pos)
+    closing = ']%s]' % match.group(1)
+    end = content.find(closing, match.end())
+    if end < 0:
+        raise _syntax_error('Unterminated bracket %s' % what, content, pos)
+    return end + len(closing)
+
+
+def _skip_comment(content, pos, final=True):
+    """
+    Skips a line or bracket comment starting at pos with #
+    :returns: position after the comment, not consuming the newline, or -1 if
+    the comment may continue after the end of content when not final
+    """
+    if BRACKET_OPEN_PATTERN.match(content, pos + 1):
+        try:
+            return _skip_bracket(content, pos + 1, 'comment')
+        except CMakeSyntaxError:
+            if final:
+                raise
+            return -1
+    end = content.find('\n', pos)
+    if end < 0:
+        return len(content) if final else -1
+    return end
+
+
+def _scan_arguments(content, pos, arguments=None):
+    """
+    Scans the arguments of a command invocation from pos, just after the
+    opening parenthesis, to the matching closing parenthesis.
+    Arguments are appended to the arguments list if given, without comments
+    and nested parentheses.
+    :returns: position after the closing parenthesis
+    """
+    start = pos
+    depth = 1
+    while True:
+        match = ARGUMENT_PATTERN.match(content, pos)
+        if match is None:
+            if pos >= len(content):
+                raise _syntax_error('Unterminated command invocation', content, start)
+            raise _syntax_error('Unterminated quoted argument', content, pos)
+        kind = match.lastgroup
+        if kind == 'close':
+            depth -= 1
+            if depth == 0:
+                return match.end()
+            pos = match.end()
+        elif kind == 'open':
+            depth += 1
+            pos = match.end()
+        elif kind == 'comment':
+            pos = _skip_comment(content, pos)
+        elif kind == 'bracket':
+            end = _skip_bracket(content, pos, 'argument')
+            if arguments is not None:
+                arguments.append(content[pos:end])
+            pos = end
+        else:
+            if arguments is not None and kind != 'space':
+                arguments.append(match.group())
+            pos = match.end()
+
+
+def _name_start(content, start, pos):
+    """blanks before a command name are part of the name, back to pos at most"""
+    while start > pos and content[start - 1] == ' ':
+        start -= 1
+    return start
+
+
+def _scan(content, final, commands, names):
+    """
+    Appends the command invocations in content to commands, and their names to
+    names. If not final, content may be followed by more code, and scanning
+    stops before anything that could continue there.
+    :returns: position up to which content has been scanned completely
+    """
+    pos = 0
+    while True:
+        match = TOPLEVEL_PATTERN.search(content, pos)
+        if match is None:
+            return len(content) if final else _name_start(content, len(content), pos)
+        if match.group() == '#':
+            end = _skip_comment(content, match.start(), final)
+            if end < 0:
+                return match.start()
+            pos = end
+            continue
+        start = _name_start(content, match.start(), pos)
+        paren = OPEN_PAREN_PATTERN.match(content, match.end())
+        if paren is None:
+            if not final and BLANKS_PATTERN.match(content, match.end()).end() == len(content):
+                return start
+            pos = match.end()
+            continue
+        try:
+            end = _scan_arguments(content, paren.end())
+        except CMakeSyntaxError:
+            if final:
+                raise
+            return start
+        name = match.group()
+        commands.append(Command(name, start, match.end(), end))
+        names.add(name)
+        pos = end
+
+
+def scan(content, commands=None):
+    """
+    Finds all command invocations in CMake code.
+    As with the former FUNCALL_PATTERN, blanks before a command name are part
+    of the name, blanks before the parenthesis part of the arguments.
+    :param commands: list to append the Commands to, or any object whose
+    append() takes each Command as soon as it is found, so that they need
+    not all be kept
+
+    >>> result = scan('# foo(x)\\n  bar (x (y) ")" [[)]])\\nif(z)')
+    >>> [(c.name, c.start, c.args_start, c.end) for c in result.commands]
+    [('bar', 9, 14, 32), ('if', 33, 35, 38)]
+    >>> sorted(result.names)
+    ['bar', 'if']
+    """
+    if commands is None:
+        commands = []
+    names = set()
+    _scan(content, True, commands, names)
+    return Scan(commands, names)
+
+
+def iter_scan(chunks):
+    """
+    Finds all command invocations in CMake code given as an iterable of string
+    chunks. Yields (text, name, funargs) for each command, text being the code
+    before it, and (text, None, None) for code that is followed by no command
+    or not yet known to be.
+    Only code that may belong to an unfinished command is held back, so memory
+    is bounded by the largest command rather than by the whole input.
+
+    >>> list(iter_scan(['foo(a', ' b)\\n  ba', 'r()  ']))
+    [('', 'foo', '(a b)'), ('\\n', None, None), ('', '  bar', '()'), ('  ', None, None)]
+    """
+    parts = []
+    size = 0
+    # a held back command is scanned again only once the input has doubled,
+    # which keeps the total work linear in the size of the input
+    retry_size = 0
+    line = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        size += len(chunk)
+        if size < retry_size:
+            continue
+        content = ''.join(parts)
+        commands = []
+        try:
+            stop = _scan(content, False, commands, set())
+        except CMakeSyntaxError as exc:
+            raise CMakeSyntaxError(exc.message, exc.line + line)
+        pos = 0
+        for command in commands:
+            yield (content[pos:command.start],
+                   content[command.start:command.args_start],
+                   content[command.args_start:command.end])
+            pos = command.end
+        if pos < stop:
+            yield (content[pos:stop], None, None)
+        line += content.count('\n', 0, stop)
+        rest = content[stop:]
+        parts = [rest]
+        size = len(rest)
+        retry_size = 2 * size
+
+    content = ''.join(parts)
+    commands = []
+    try:
+        _scan(content, True, commands, set())
+    except CMakeSyntaxError as exc:
+        raise CMakeSyntaxError(exc.message, exc.line + line)
+    pos = 0
+    for command in commands:
+        yield (content[pos:command.start],
+               content[command.start:command.args_start],
+               content[command.args_start:command.end])
+        pos = command.end
+    if pos < len(content):
+        yield (content[pos:], None, None)
+
+
+def split_arguments(funargs):
+    """
+    Splits the arguments of a command invocation, given with their enclosing
+    parentheses. Comments and nested parentheses are dropped, quoted and
+    bracket arguments are kept as written.
+
+    >>> split_arguments('(foo "bar baz" # comment\\n  [[qux]] f(x))')
+    ['foo', '"bar baz"', '[[qux]]', 'f', 'x']
+    """
+    paren = OPEN_PAREN_PATTERN.match(funargs.lstrip())
+    if paren is None:
+        raise ValueError('Not an argument list: %s' % funargs)
+    arguments = []
+    _scan_arguments(funargs.lstrip(), paren.end(), arguments)
+    return arguments
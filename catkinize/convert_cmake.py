@@ -28,10 +28,14 @@
 
 
 from __future__ import print_function
+import hashlib
 import re
 import os
 import sys
-import xml.etree.ElementTree as ET
+import tempfile
+
+from catkinize import cmake_lexer, progress
+from catkinize.convert_manifest import load_manifest
 
 # removals and stuff we can replace
 conversions = [
@@ -63,85 +67,234 @@ manual_conversions = [
     ('rosbuild_make_distribution', '# use bloom tool')
     ]
 
-# adding ^ to the beginning of the re would discard all commented lines
+# anything that looks like a macro or function call (broken for nested round
+# parens, and quadratic on long names without parens). Superseded by
+# cmake_lexer.scan(), kept for compatibility.
 FUNCALL_PATTERN = re.compile(r'([ ]*[a-zA-Z][a-zA-Z_]+)(\s*\([^)]*\))', re.MULTILINE)
 
+# commands that make the package generate messages or services
+MESSAGE_COMMANDS = set(['rosbuild_genmsg', 'rosbuild_gensrv', 'add_message_files', 'add_service_files'])
 
-def chunks(l, n):
-    """
-    returns a list of n-szed chunks of list l
-
-    >>> chunks([], 3)
-    []
-    >>> chunks([2, 5, 7], 3)
-    [[2, 5, 7]]
-    >>> chunks([2, 5, 7, 4, 6, 8], 3)
-    [[2, 5, 7], [4, 6, 8]]
-    """
-    return [l[i:i + n] for i in range(0, len(l), n)]
+# size of chunks read from files
+READ_SIZE = 64 * 1024
+# converted code beyond this size is spooled to a temporary file
+SPOOL_SIZE = 1024 * 1024
 
 
-def convert_cmake(project_path, cmakelists_path=None, manifest_xml_path=None):
-    project_name = os.path.basename(os.path.abspath(project_path))
+def convert_cmake(project_path, cmakelists_path=None, manifest_xml_path=None, manifest=None,
+                  package_index=None, rosdep_resolver=None):
+    """
+    :param manifest: Manifest already parsed from manifest_xml_path, if any
+    :param package_index: PackageIndex of the workspace to tell catkin from system dependencies, if any
+    :param rosdep_resolver: RosdepResolver to check the rosdep keys with, if any
+    """
     if not cmakelists_path:
         cmakelists_path = os.path.join(project_path, 'CMakeLists.txt')
-    if not manifest_xml_path:
-        manifest_xml_path = os.path.join(project_path, 'manifest.xml')
-
-    print('Converting %s' % cmakelists_path, file=sys.stderr)
+    if not progress.is_quiet():
+        print('Converting %s' % cmakelists_path, file=sys.stderr)
     with open(cmakelists_path, 'r') as f_in:
         content = f_in.read()
+    return rewrite_cmake(content, project_path, manifest_xml_path, manifest, package_index, rosdep_resolver)
 
-    dependencies_str = ' '.join(get_dependencies(manifest_xml_path))
 
-    # anything that looks like a macro or function call (broken for nested round parens)
-    tokens = FUNCALL_PATTERN.split(content)
+def read_chunks(fileobj, limit=None, size=READ_SIZE):
+    """
+    yields the contents of fileobj in chunks of size, up to limit characters if given
+    """
+    while limit is None or limit > 0:
+        chunk = fileobj.read(size if limit is None else min(size, limit))
+        if not chunk:
+            break
+        if limit is not None:
+            limit -= len(chunk)
+        yield chunk
 
-    # storing the originals allows interactive mode where user confirms each change
-    result = tokens[:1]
-    original = tokens[:1]
-    boost_components = set()
 
-    # find replacement for each snippet. Chunks are (funcall, argslist, otherlines)
-    first_boost = -1
-    for count, (name, fun_args, rest) in enumerate(chunks(tokens[1:], 3)):
-        oldsnippet = '%s%s' % (name, fun_args)
-        original.append(oldsnippet)
+class Edit(object):
+    """
+    Replacement of content[start:end] of the original content.
+    """
+    __slots__ = ('start', 'end', 'replacement')
+
+    def __init__(self, start, end, replacement):
+        self.start = start
+        self.end = end
+        self.replacement = replacement
+
+
+def write_edits(content, edits, write):
+    """
+    Writes content with edits applied, which must be sorted and must not
+    overlap, as slices of content between the replacements.
+
+    >>> parts = []
+    >>> write_edits('foo(a) bar(b)', [Edit(0, 3, 'baz'), Edit(7, 13, '')], parts.append)
+    >>> ''.join(parts)
+    'baz(a) '
+    """
+    pos = 0
+    for edit in edits:
+        if edit.start > pos:
+            write(content[pos:edit.start])
+        write(edit.replacement)
+        pos = edit.end
+    if pos < len(content):
+        write(content[pos:])
+
+
+class _CommandRewriter(object):
+    """
+    Converts commands one by one, collecting the Boost components of all
+    Boost snippets. For the commands cmake_lexer.scan() gives to append(), an
+    Edit of content is recorded for each that converts to something else.
+    """
+
+    def __init__(self, content=None):
+        self.content = content
+        self.edits = []
+        self.boost_components = set()
+        self.seen_boost = False
+        # edit of the first Boost snippet, the Boost lines go before it
+        self.first_boost = None
+
+    def convert(self, name, fun_args):
+        """
+        :returns: the conversion of a command, and True if it is the first
+        Boost snippet, before which the Boost lines go
+        """
         newsnippet, components = convert_boost_snippet(name, fun_args)
         if newsnippet is None:
-            newsnippet = convert_snippet(name, fun_args)
-            if newsnippet != oldsnippet:
-                result.append(newsnippet)
-            else:
-                result.append(None)
-        else:
-            if first_boost < 0:
-                first_boost = count * 2 + 1
-            boost_components = boost_components.union(components)
-            result.append(newsnippet)
-
-        result.append(None)
-        original.append(rest)
-
-    if boost_components:
-        # reverse order due to insert
-        result.insert(first_boost, 'include_directories(${Boost_INCLUDE_DIRS})\n')
-        result.insert(first_boost, 'find_package(Boost REQUIRED COMPONENTS %s)\n' % ' '.join(boost_components))
-        original.insert(first_boost, '')
-        original.insert(first_boost, '')
-
-    result_string = ''
-    lines = content.splitlines()
-    if not [l for l in lines if 'catkin_package' in l]:
-        result_string += ('\n'.join(make_header_lines(project_name, dependencies_str)))
-
-    for (old_snippet, new_snippet) in zip(original, result):
-        if old_snippet or new_snippet:
-            result_string += (new_snippet or old_snippet)
-
-    with_messages = ('add_message_files' in result or 'add_service_files' in result_string)
-    result_string += make_package_lines(dependencies_str, with_messages)
-    return result_string
+            return convert_snippet(name, fun_args), False
+        first = not self.seen_boost
+        self.seen_boost = True
+        self.boost_components = self.boost_components.union(components)
+        return newsnippet, first
+
+    def append(self, command):
+        content = self.content
+        newsnippet, first = self.convert(content[command.start:command.args_start],
+                                         content[command.args_start:command.end])
+        if first:
+            self.first_boost = Edit(command.start, command.end, newsnippet)
+            self.edits.append(self.first_boost)
+        # commands converted to themselves are left in place
+        elif len(newsnippet) != command.end - command.start or not content.startswith(newsnippet, command.start):
+            self.edits.append(Edit(command.start, command.end, newsnippet))
+
+
+def rewrite_cmake(content, project_path, manifest_xml_path=None, manifest=None, package_index=None,
+                  rosdep_resolver=None):
+    """
+    Converts the contents of a CMakeLists.txt, like iter_convert_cmake(). The
+    conversion is recorded as Edits of the commands that change, and the
+    result is written in one pass from slices of content and the replacements.
+    """
+    project_name = os.path.basename(os.path.abspath(project_path))
+    dependencies = _dependency_strings(project_path, manifest_xml_path, manifest, package_index, rosdep_resolver)
+    rewriter = _CommandRewriter(content)
+    names = cmake_lexer.scan(content, rewriter).names
+    if rewriter.boost_components:
+        rewriter.first_boost.replacement = (_boost_lines(rewriter.boost_components) +
+                                            rewriter.first_boost.replacement)
+
+    parts = []
+    if 'catkin_package' not in names:
+        parts.append(_header(project_name, dependencies))
+    write_edits(content, rewriter.edits, parts.append)
+    parts.append(_footer(dependencies, bool(names & MESSAGE_COMMANDS)))
+    return ''.join(parts)
+
+
+def iter_convert_cmake(chunks, project_path, manifest_xml_path=None, spool_size=SPOOL_SIZE, manifest=None,
+                       package_index=None, rosdep_resolver=None):
+    """
+    Converts a CMakeLists.txt given as an iterable of string chunks, yielding
+    the result in chunks.
+    With a package_index, dependencies found in it become catkin COMPONENTS and
+    CATKIN_DEPENDS, rosdeps become system DEPENDS, and only package dependencies
+    missing from the index are left to check. With a rosdep_resolver, rosdeps
+    it does not know are left out of the dependencies with a TODO.
+    The header and the Boost lines depend on all of the input, so the converted
+    code is spooled, to a temporary file beyond spool_size, and yielded once
+    the input is exhausted. Memory use is bounded by spool_size and the
+    largest single command.
+    """
+    project_name = os.path.basename(os.path.abspath(project_path))
+    dependencies = _dependency_strings(project_path, manifest_xml_path, manifest, package_index, rosdep_resolver)
+
+    names = set()
+    rewriter = _CommandRewriter()
+    # position of the first Boost snippet in the converted code
+    first_boost = -1
+    size = 0
+    body = tempfile.SpooledTemporaryFile(spool_size, mode='w+')
+    try:
+        for text, name, fun_args in cmake_lexer.iter_scan(chunks):
+            body.write(text)
+            size += len(text)
+            if name is None:
+                continue
+            names.add(name.strip())
+            newsnippet, first = rewriter.convert(name, fun_args)
+            if first:
+                first_boost = size
+            body.write(newsnippet)
+            size += len(newsnippet)
+
+        if 'catkin_package' not in names:
+            yield _header(project_name, dependencies)
+        body.seek(0)
+        if rewriter.boost_components:
+            for chunk in read_chunks(body, first_boost):
+                yield chunk
+            yield _boost_lines(rewriter.boost_components)
+        for chunk in read_chunks(body):
+            yield chunk
+        yield _footer(dependencies, bool(names & MESSAGE_COMMANDS))
+    finally:
+        body.close()
+
+
+def _dependency_strings(project_path, manifest_xml_path, manifest, package_index, rosdep_resolver):
+    """
+    :returns: the system dependencies, or all without package_index, the
+    catkin dependencies and those not found in package_index, None without
+    it, as strings, and the list of rosdeps unknown to rosdep_resolver
+    """
+    if manifest is None:
+        if not manifest_xml_path:
+            manifest_xml_path = os.path.join(project_path, 'manifest.xml')
+        manifest = load_manifest(manifest_xml_path)
+    rosdeps = manifest.rosdeps
+    unresolved = []
+    if rosdep_resolver is not None:
+        rosdeps, unresolved = rosdep_resolver.split(rosdeps)
+    if package_index is None:
+        return ' '.join(manifest.depends + rosdeps), None, None, unresolved
+    catkin, unknown, system = package_index.split(manifest.depends, rosdeps)
+    return ' '.join(system), ' '.join(catkin), ' '.join(unknown), unresolved
+
+
+def _header(project_name, dependencies):
+    dependencies_str, catkin_str, unknown_str, _ = dependencies
+    if catkin_str is None:
+        return '\n'.join(make_header_lines(project_name, dependencies_str))
+    return '\n'.join(make_header_lines(project_name, catkin_str, unknown_str))
+
+
+def _boost_lines(components):
+    return ('find_package(Boost REQUIRED COMPONENTS %s)\n' % ' '.join(components) +
+            'include_directories(${Boost_INCLUDE_DIRS})\n')
+
+
+def _footer(dependencies, with_messages):
+    dependencies_str, catkin_str, _, unresolved = dependencies
+    footer = make_package_lines(dependencies_str, with_messages, catkin_str)
+    if unresolved:
+        footer = ('\n# TODO: not found in the rosdep database, add to DEPENDS if needed: %s' % ' '.join(unresolved) +
+                  footer)
+    return footer
+
 
 def make_metapackage_cmake(name):
     result_string = """cmake_minimum_required(VERSION 2.8.3)
@@ -156,39 +309,50 @@ def get_dependencies(manifest_path):
     Given a path to a manifest.xml file, get_dependencies() parses the file and
     yields all dependencies listed in it.
     '''
-    with open(manifest_path) as file:
-        tree = ET.XML(file.read())
-        for tag in tree.findall('depend'):
-            pkg = tag.attrib.get('package')
-            if pkg:
-                yield pkg
-        for tag in tree.findall('rosdep'):
-            pkg = tag.attrib.get('name')
-            if pkg:
-                yield pkg
+    manifest = load_manifest(manifest_path)
+    for pkg in manifest.depends + manifest.rosdeps:
+        yield pkg
 
 
-def make_header_lines(project_name, deps_str):
+def make_header_lines(project_name, deps_str, unknown_str=None):
     """
     Make top lines of CMakeLists file according to
     http://www.ros.org/doc/groovy/api/catkin/html/user_guide/standards.html
+    :param unknown_str: dependencies not known to be catkin packages, if
+    deps_str are known catkin packages. By default all of deps_str are unknown.
     """
+    if unknown_str is None:
+        todo_str = '# TODO: remove all from COMPONENTS that are not catkin packages.'
+    elif unknown_str.strip():
+        todo_str = '# TODO: remove from COMPONENTS if not catkin packages: %s' % unknown_str
+        deps_str = ' '.join(deps for deps in [deps_str, unknown_str] if deps.strip())
+    else:
+        todo_str = ''
     components_str = 'COMPONENTS %s' % deps_str if deps_str.strip() else ''
     header = '''
 # http://ros.org/doc/groovy/api/catkin/html/user_guide/supposed.html
 cmake_minimum_required(VERSION 2.8.3)
 project(%s)
 # Load catkin and all dependencies required for this package
-# TODO: remove all from COMPONENTS that are not catkin packages.
+%s
 find_package(catkin REQUIRED %s)
 
 # include_directories(include ${Boost_INCLUDE_DIR} ${catkin_INCLUDE_DIRS})
-''' % (project_name, components_str)
-    return header.strip().splitlines()
+''' % (project_name, todo_str, components_str)
+    lines = header.strip().splitlines()
+    if not todo_str:
+        lines.remove(todo_str)
+    return lines
 
 
-def make_package_lines(deps_str, with_messages):
+def make_package_lines(deps_str, with_messages, catkin_deps_str=None):
+    """
+    :param catkin_deps_str: catkin packages dependent projects also need, if
+    known. deps_str are then system dependencies only.
+    """
     full_deps_str = 'DEPENDS %s' % deps_str if deps_str.strip() else 'DEPENDS  # TODO'
+    if catkin_deps_str is None or not catkin_deps_str.strip():
+        catkin_deps_str = '# TODO'
     msg_str = '## Generate added messages and services with any dependencies listed here\ngenerate_messages(\n  #TODO DEPENDENCIES geometry_msgs std_msgs\n)' if with_messages else ''
     lines = '''%s
 # TODO: fill in what other packages will need to use this package
@@ -198,47 +362,156 @@ def make_package_lines(deps_str, with_messages):
 ## LIBRARIES: libraries you create in this project that dependent projects also need
 catkin_package(
     %s
-    CATKIN_DEPENDS # TODO
+    CATKIN_DEPENDS %s
     INCLUDE_DIRS # TODO include
     LIBRARIES # TODO
-)''' % (msg_str, full_deps_str)
+)''' % (msg_str, full_deps_str, catkin_deps_str)
     return lines
 
 
+# actions of compiled rules
+RENAME = 'rename'
+REMOVE = 'remove'
+MANUAL = 'manual'
+INCLUDE = 'include'
+REPLACE = 'replace'
+TEMPLATE = 'template'
+
+REMOVED_COMMENT = '\n# CATKIN_MIGRATION: removed during catkin migration'
+# placeholders in templates: the command name, all arguments as written, or the nth argument
+TEMPLATE_PLACEHOLDER = re.compile(r'@(NAME|ARGS|[1-9][0-9]*)@')
+
+
+class RuleTable(object):
+    """
+    The rules to convert single snippets, compiled from the conversions and
+    manual_conversions tables into one dict from command name to
+    (action, text). Converting a snippet costs one lookup however many rules
+    there are, and converted snippets are memoized.
+    :param packs: rule packs, lists of (name, action, text) as compiled by
+    catkinize.rules, which override the tables, later packs earlier ones
+    """
+
+    def __init__(self, conversions, manual_conversions, cache_size=10000, packs=()):
+        self.rules = {}
+        for pack in packs:
+            for name, action, text in pack:
+                self.rules[name] = (action, text)
+        self.fingerprint = None
+        if packs:
+            self.fingerprint = hashlib.sha1(repr(sorted(self.rules.items())).encode('utf-8')).hexdigest()
+        # the first rule for a name wins, as in a sequential search of the tables
+        for name, replacement in conversions:
+            if replacement is None:
+                self.rules.setdefault(name, (REMOVE, REMOVED_COMMENT))
+            else:
+                self.rules.setdefault(name, (RENAME, replacement))
+        for name, message in manual_conversions:
+            self.rules.setdefault(name, (MANUAL, '\n# CATKIN_MIGRATION\n%s' % message))
+        self.rules.setdefault('include', (INCLUDE, REMOVED_COMMENT))
+        self.rules.setdefault('rosbuild_genmsg', (REPLACE, 'add_message_files(\n  FILES\n  # TODO: List your msg files here\n)'))
+        self.rules.setdefault('rosbuild_gensrv', (REPLACE, 'add_service_files(\n  FILES\n  # TODO: List your msg files here\n)'))
+        self.cache_size = cache_size
+        self._cache = {}
+
+    def convert(self, name, funargs):
+        key = (name, funargs)
+        snippet = self._cache.get(key)
+        if snippet is None:
+            snippet = self._convert(name, funargs)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[key] = snippet
+        return snippet
+
+    def _convert(self, name, funargs):
+        command = name.strip()
+        rule = self.rules.get(command)
+        if rule is None:
+            return name + funargs
+        action, text = rule
+        if action == RENAME:
+            # same as replacing in the whole snippet, the name holds the command only once
+            return name.replace(command, text) + funargs.replace(command, text)
+        if action == INCLUDE:
+            if 'rosbuild' in funargs:
+                return comment(name + funargs, text)
+            return name + funargs
+        if action == REPLACE:
+            return text
+        if action == TEMPLATE:
+            return expand_template(text, name, funargs)
+        return comment(name + funargs, text)
+
+
+def expand_template(template, name, funargs):
+    """
+    :returns: template with @NAME@, @ARGS@ and @1@, @2@... replaced by the
+    command name, its arguments as written, and single arguments, indented as name
+
+    >>> expand_template('add_executable(@1@ @ARGS@)', '  my_add_bin', '(foo  a.cpp)')
+    '  add_executable(foo foo  a.cpp)'
+    """
+    command = name.lstrip()
+    # split only if a template needs single arguments
+    arguments = []
+
+    def placeholder(match):
+        key = match.group(1)
+        if key == 'NAME':
+            return command
+        if key == 'ARGS':
+            return funargs[funargs.index('(') + 1:-1]
+        if not arguments:
+            arguments.append(cmake_lexer.split_arguments(funargs))
+        index = int(key) - 1
+        return arguments[0][index] if index < len(arguments[0]) else ''
+    return name[:len(name) - len(command)] + TEMPLATE_PLACEHOLDER.sub(placeholder, template)
+
+
+_rule_table = None
+# rule packs used by get_rule_table()
+_rule_packs = ()
+
+
+def get_rule_table():
+    """
+    :returns: the RuleTable compiled from the module tables and the rule packs
+    """
+    global _rule_table
+    if _rule_table is None:
+        _rule_table = RuleTable(conversions, manual_conversions, packs=_rule_packs)
+    return _rule_table
+
+
+def set_rule_packs(packs):
+    """
+    Makes the conversions use the compiled rule packs, see catkinize.rules.
+    """
+    global _rule_packs
+    _rule_packs = tuple(packs)
+    reset_rule_table()
+
+
+def get_rule_packs():
+    return _rule_packs
+
+
+def reset_rule_table():
+    """
+    Drops the compiled rules, must be called after changing conversions or
+    manual_conversions.
+    """
+    global _rule_table
+    _rule_table = None
+
+
 def convert_snippet(name, funargs):
     """
     Do all replacements that can be done for a single snippet without looking at
     anything else.
     """
-    snippet = '%s%s' % (name, funargs)
-    converted = False
-    for a, b in conversions:
-        if a == name.strip():
-            if b is not None:
-                snippet = snippet.replace(a, b)
-            else:
-                snippet = comment(snippet, '\n# CATKIN_MIGRATION: removed during catkin migration')
-            converted = True
-            break
-    if not converted:
-        for a, b in manual_conversions:
-            if a == name.strip():
-                snippet = comment(snippet, '\n# CATKIN_MIGRATION\n%s' % b)
-                converted = True
-                break
-    if not converted:
-        if 'include' == name.strip():
-            if 'rosbuild' in funargs:
-                snippet = comment(snippet, '\n# CATKIN_MIGRATION: removed during catkin migration')
-            converted = True
-    if not converted:
-        if 'rosbuild_genmsg' == name.strip():
-            snippet = 'add_message_files(\n  FILES\n  # TODO: List your msg files here\n)'
-            converted = True
-        elif 'rosbuild_gensrv' == name.strip():
-            snippet = 'add_service_files(\n  FILES\n  # TODO: List your msg files here\n)'
-            converted = True
-    return snippet
+    return get_rule_table().convert(name, funargs)
 
 
 def comment(snippet, header):
@@ -266,10 +539,10 @@ def convert_boost_snippet(name, args):
     realname = name.strip()
     if realname == 'rosbuild_link_boost':
         # rosbuild_link_boost snippets expand to multiple statements.
-        m = ARGUMENT_SPLITTER.match(args)
-        if not m:
-            raise ValueError('Could not recognize rosbuild_link_boost arguments (maybe multi-line?): \n%s' % args)
-        target = m.group(1)
-        components = m.group(2)
-        return "target_link_libraries(%s ${Boost_LIBRARIES})" % (target), components.split()
+        arguments = cmake_lexer.split_arguments(args)
+        if len(arguments) < 2:
+            raise ValueError('Could not recognize rosbuild_link_boost arguments: \n%s' % args)
+        target = arguments[0]
+        components = arguments[1:]
+        return "target_link_libraries(%s ${Boost_LIBRARIES})" % (target), components
     return None, None
@@ -32,10 +32,69 @@ import os
 import logging
 import re
 import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
 
 from catkinize import xml_lib
 
+try:
+    basestring
+except NameError:
+    # Python 3
+    basestring = str
+
 SPACE_COMMA_RX = re.compile(r',\s*')
+# escaped in attribute values besides &, < and >
+ATTRIBUTE_ENTITIES = {'"': '&quot;'}
+WEBSITE_ATTRS = {'type': 'website'}
+BUGTRACKER_ATTRS = {'type': 'bugtracker'}
+
+
+class Manifest(object):
+    """
+    The contents of a manifest.xml or stack.xml, parsed once so that all
+    converters of a package can share them.
+    """
+
+    def __init__(self, manifest_xml_str):
+        tree = ET.XML(manifest_xml_str)
+        self.description = (xml_lib.xml_find(tree, 'description').text or '').strip()
+        self.authors = parse_authors_field(xml_lib.xml_find(tree, 'author').text)
+        self.licenses = SPACE_COMMA_RX.split(xml_lib.xml_find(tree, 'license').text or '')
+        self.website_url = xml_lib.xml_find(tree, 'url').text
+        self.depends = [tag.attrib['package'] for tag in tree.findall('depend') if tag.attrib.get('package')]
+        self.rosdeps = [tag.attrib['name'] for tag in tree.findall('rosdep') if tag.attrib.get('name')]
+        self.exports = [(e.tag, e.attrib) for e in list(xml_lib.xml_find(tree, 'export'))]
+
+
+def load_manifest(manifest_xml_path):
+    """
+    Reads and parses a manifest.xml file, logging the offending line if it is
+    not valid XML.
+
+    :returns: Manifest
+    :raises: ET.ParseError
+    """
+    with open(manifest_xml_path) as f:
+        manifest_xml_str = f.read()
+    return parse_manifest(manifest_xml_str)
+
+
+def parse_manifest(manifest_xml_str):
+    """
+    Parses the contents of a manifest.xml file, logging the offending line if
+    it is not valid XML.
+
+    :returns: Manifest
+    :raises: ET.ParseError
+    """
+    try:
+        return Manifest(manifest_xml_str)
+    except ET.ParseError as exc:
+        logging.basicConfig(format='%(levelname)s - %(message)s')
+        line_num = int(re.compile(r'.*line (\d+).*').match(str(exc)).group(1))
+        line = manifest_xml_str.splitlines()[line_num - 1]
+        logging.error('%s\n"%s"\n', exc, line)
+        raise
 
 
 def convert_manifest(package_path,
@@ -45,30 +104,36 @@ def convert_manifest(package_path,
                      metapackage=False,
                      bugtracker_url='',
                      replaces=None,
-                     conflicts=None):
+                     conflicts=None,
+                     manifest=None,
+                     rosdep_resolver=None):
+    """
+    :param manifest: Manifest already parsed from manifest_xml_path, if any
+    :param rosdep_resolver: RosdepResolver to check the rosdep keys with, if any
+    """
     if conflicts is None:
         conflicts = []
     if replaces is None:
         replaces = []
     package_name = os.path.basename(os.path.abspath(package_path))
-    logging.basicConfig(format='%(levelname)s - %(message)s')
-    try:
-        with open(manifest_xml_path) as f:
-            manifest_xml_str = f.read()
-            pkg_xml = make_from_manifest(manifest_xml_str,
-                                         package_name,
-                                         version,
-                                         architecture_independent,
-                                         metapackage,
-                                         bugtracker_url,
-                                         replaces,
-                                         conflicts)
-            pkg_xml = '\n'.join(merge_dups(pkg_xml.splitlines()))
-            return pkg_xml
-    except ET.ParseError as exc:
-        line_num = int(re.compile(r'.*line (\d+).*').match(str(exc)).group(1))
-        line = manifest_xml_str.splitlines()[line_num - 1]
-        logging.error('%s\n"%s"\n', exc, line)
+    if manifest is None:
+        try:
+            manifest = load_manifest(manifest_xml_path)
+        except ET.ParseError:
+            return None
+    # duplicate lines are merged while writing, as merge_dups() would
+    writer = PackageXmlWriter(commented=['test_depend'], merge_duplicates=True, final_newline=False)
+    write_from_manifest(writer,
+                        manifest,
+                        package_name,
+                        version,
+                        architecture_independent,
+                        metapackage,
+                        bugtracker_url,
+                        replaces,
+                        conflicts,
+                        rosdep_resolver)
+    return writer.getvalue()
 
 
 def merge_dups(lines):
@@ -91,10 +156,12 @@ def make_from_manifest(manifest_xml_str,
                        package_name,
                        version,
                        architecture_independent, metapackage,
-                       bugtracker_url, replaces, conflicts):
+                       bugtracker_url, replaces, conflicts, rosdep_resolver=None):
     """
     Make the contents of a project.xml file from the string contents of
-    manifest.xml.
+    manifest.xml, or from a Manifest parsed from it.
+    Rosdeps are dependencies too if rosdep_resolver is given, those it does
+    not know are left commented out with a TODO.
 
     >>> manifest_xml_str = '\
     <package>\
@@ -128,42 +195,60 @@ def make_from_manifest(manifest_xml_str,
     >>> import xml.etree.ElementTree as ET
     >>> pkg = ET.XML(pkg_xml)
     """
-    manifest = ET.XML(manifest_xml_str)
-    description = xml_lib.xml_find(manifest, 'description').text.strip()
-    authors_str = xml_lib.xml_find(manifest, 'author').text
-    authors = parse_authors_field(authors_str)
-    licenses_str = xml_lib.xml_find(manifest, 'license').text
-    licenses = SPACE_COMMA_RX.split(licenses_str)
-    website_url = xml_lib.xml_find(manifest, 'url').text
+    writer = PackageXmlWriter(commented=['test_depend'])
+    write_from_manifest(writer,
+                        manifest_xml_str,
+                        package_name,
+                        version,
+                        architecture_independent,
+                        metapackage,
+                        bugtracker_url,
+                        replaces,
+                        conflicts,
+                        rosdep_resolver)
+    return writer.getvalue()
+
+
+def write_from_manifest(writer,
+                        manifest_xml_str,
+                        package_name,
+                        version,
+                        architecture_independent, metapackage,
+                        bugtracker_url, replaces, conflicts, rosdep_resolver=None):
+    """
+    Writes a project.xml made from manifest.xml to writer, see make_from_manifest().
+    """
+    manifest = manifest_xml_str
+    if isinstance(manifest, basestring):
+        manifest = Manifest(manifest)
+    authors = manifest.authors
     maintainers = [(a,{'email':''}) if isinstance(a,basestring) else a for a in authors ]
-    depend_tags = manifest.findall('depend')
-    depends = [d.attrib['package'] for d in depend_tags]
-    export_tags = xml_lib.xml_find(manifest, 'export').getchildren()
-    exports = [(e.tag, e.attrib) for e in export_tags]
-
-    xml = create_project_xml(package_name=package_name,
-                             version=version,
-                             description=description,
-                             maintainers=maintainers,
-                             licenses=licenses,
-                             website_url=website_url,
-                             bugtracker_url=bugtracker_url,
-                             authors=authors,
-                             build_depends=depends,
-                             run_depends=depends,
-                             test_depends=depends,
-                             replaces=replaces,
-                             conflicts=conflicts,
-                             exports=exports,
-                             architecture_independent=architecture_independent,
-                             metapackage=metapackage)
+    depends = manifest.depends
+    unresolved = []
+    if rosdep_resolver is not None:
+        known, unresolved = rosdep_resolver.split(manifest.rosdeps)
+        depends = depends + known
 
     # Maintainer tags without e-mail addresses are already invalid without also being commented out
-    # Most dependencies are build and run depends
-    for name in ['test_depend']:
-        xml = xml_lib.comment_out_tags_named(xml, name)
-
-    return xml
+    # Most dependencies are build and run depends, test_depend tags are commented out by the writer
+    write_project_xml(writer,
+                      package_name=package_name,
+                      version=version,
+                      description=manifest.description,
+                      maintainers=maintainers,
+                      licenses=manifest.licenses,
+                      website_url=manifest.website_url,
+                      bugtracker_url=bugtracker_url,
+                      authors=authors,
+                      build_depends=depends,
+                      run_depends=depends,
+                      test_depends=depends,
+                      replaces=replaces,
+                      conflicts=conflicts,
+                      exports=manifest.exports,
+                      architecture_independent=architecture_independent,
+                      metapackage=metapackage,
+                      unresolved=unresolved)
 
 
 def make_from_stack_manifest(manifest_xml_str,
@@ -206,22 +291,17 @@ def make_from_stack_manifest(manifest_xml_str,
     >>> import xml.etree.ElementTree as ET
     >>> pkg = ET.XML(pkg_xml)
     """
-    manifest = ET.XML(manifest_xml_str)
-    description = xml_lib.xml_find(manifest, 'description').text.strip()
-    authors_str = xml_lib.xml_find(manifest, 'author').text
-    authors = parse_authors_field(authors_str)
-    licenses_str = xml_lib.xml_find(manifest, 'license').text
-    licenses = SPACE_COMMA_RX.split(licenses_str)
-    website_url = xml_lib.xml_find(manifest, 'url').text
+    manifest = Manifest(manifest_xml_str)
+    authors = manifest.authors
 
     maintainers = [(a,{'email':''}) if isinstance(a,basestring) else a for a in authors ]
 
     xml = create_project_xml(package_name=package_name,
                              version=version,
-                             description=description,
+                             description=manifest.description,
                              maintainers=maintainers,
-                             licenses=licenses,
-                             website_url=website_url,
+                             licenses=manifest.licenses,
+                             website_url=manifest.website_url,
                              bugtracker_url='',
                              authors=authors,
                              build_depends=[],
@@ -304,79 +384,140 @@ def create_project_xml(package_name, version, description, maintainers,
     >>> tree = ET.XML(pxml)
 
     """
-    subs = {}
-    subs['maintainers_part'] = make_section('maintainer', maintainers)
-    subs['licenses_part'] = '\n'.join(
-        indent('<license>%s</license>' % l)
-        for l in licenses)
+    writer = PackageXmlWriter()
+    write_project_xml(writer, package_name, version, description, maintainers,
+                      licenses, website_url, bugtracker_url, authors,
+                      build_depends, run_depends, test_depends, replaces,
+                      conflicts, exports, architecture_independent,
+                      metapackage)
+    return writer.getvalue()
+
 
-    bugtracker_part = '<url type="bugtracker">%s</url>' % bugtracker_url
+class PackageXmlWriter(object):
+    """
+    Writes a package.xml line by line to stream, or collects it for
+    getvalue() if there is no stream. Tags named in commented are written
+    commented out. With merge_duplicates a line equal to the line before is
+    left out, as merge_dups() does.
+    """
+
+    def __init__(self, stream=None, commented=(), merge_duplicates=False, final_newline=True):
+        self._parts = []
+        self._write = stream.write if stream is not None else self._parts.append
+        self.commented = frozenset(commented)
+        self.merge_duplicates = merge_duplicates
+        self.final_newline = final_newline
+        self._previous = None
+
+    def line(self, text=''):
+        previous = self._previous
+        if previous is None:
+            self._write(text)
+        elif not (self.merge_duplicates and text == previous):
+            self._write('\n' + text)
+        self._previous = text
+
+    def lines(self, *texts):
+        if self.merge_duplicates:
+            for text in texts:
+                self.line(text)
+            return
+        if self._previous is None:
+            self._write('\n'.join(texts))
+        else:
+            self._write('\n' + '\n'.join(texts))
+        self._previous = texts[-1]
+
+    def element(self, name, xml, level=1):
+        """
+        Writes xml, a complete element named name, on a line of its own.
+        """
+        if name in self.commented:
+            xml = comment_out(xml)
+        self.line(indent(xml, level))
+
+    def section(self, name, rows):
+        """
+        Writes a tag per row, an empty line if there are no rows.
+        """
+        if not rows:
+            self.line()
+            return
+        lines = ['  ' + make_tag_from_row(name, row) for row in rows]
+        if name in self.commented:
+            lines = ['  <!-- %s -->' % line[2:] for line in lines]
+        self.lines(*lines)
+
+    def finish(self):
+        if self.final_newline and self._previous is not None:
+            self._write('\n')
+
+    def getvalue(self):
+        return ''.join(self._parts)
+
+
+def write_project_xml(writer, package_name, version, description, maintainers,
+                      licenses, website_url, bugtracker_url, authors,
+                      build_depends, run_depends, test_depends, replaces,
+                      conflicts, exports, architecture_independent,
+                      metapackage, unresolved=()):
+    """
+    Writes the contents of project.xml to a PackageXmlWriter, see create_project_xml().
+    :param unresolved: dependencies to write commented out for manual review
+    """
+    writer.lines('<package>',
+                 '  ' + make_tag('name', None, package_name),
+                 '  ' + make_tag('version', None, version),
+                 '  ' + make_tag('description', None, description))
+    writer.section('maintainer', maintainers)
+    writer.line()
+    writer.section('license', licenses)
+    bugtracker_part = '  ' + make_tag('url', BUGTRACKER_ATTRS, bugtracker_url)
     if not bugtracker_url:
-        bugtracker_part = comment_out(bugtracker_part)
-    subs['bugtracker_part'] = indent(bugtracker_part)
-
-    subs['authors_part'] = make_section('author', authors)
-    subs['build_depends_part'] = make_section('build_depend', build_depends)
-    subs['run_depends_part'] = make_section('run_depend', run_depends)
-    subs['test_depends_part'] = make_section('test_depend', test_depends)
-    subs['replaces_part'] = make_section('replace', replaces)
-    subs['conflicts_part'] = make_section('conflict', conflicts)
-    subs['version'] = version
-    subs['package_name'] = package_name
-    subs['description'] = description
-    subs['website_url'] = website_url
-    subs['exports_part'] = make_exports_section(
-      exports,
-      architecture_independent,
-      metapackage
-    )
-    return '''\
-<package>
-  <name>%(package_name)s</name>
-  <version>%(version)s</version>
-  <description>%(description)s</description>
-%(maintainers_part)s
-
-%(licenses_part)s
-
-  <url type="website">%(website_url)s</url>
-%(bugtracker_part)s
-
-%(authors_part)s
-
-  <!-- Dependencies which this package needs to build itself. -->
-  <buildtool_depend>catkin</buildtool_depend>
-
-  <!-- Dependencies needed to compile this package. -->
-%(build_depends_part)s
-
-  <!-- Dependencies needed after this package is compiled. -->
-%(run_depends_part)s
-
-  <!-- Dependencies needed only for running tests. -->
-%(test_depends_part)s
-
-%(replaces_part)s
-%(conflicts_part)s
-
-  <export>
-%(exports_part)s
-  </export>
-</package>
-''' % subs
+        bugtracker_part = '  ' + comment_out(bugtracker_part[2:])
+    writer.lines('',
+                 '  ' + make_tag('url', WEBSITE_ATTRS, website_url),
+                 bugtracker_part,
+                 '')
+    writer.section('author', authors)
+    writer.lines('',
+                 '  <!-- Dependencies which this package needs to build itself. -->',
+                 '  <buildtool_depend>catkin</buildtool_depend>',
+                 '',
+                 '  <!-- Dependencies needed to compile this package. -->')
+    writer.section('build_depend', build_depends)
+    writer.lines('',
+                 '  <!-- Dependencies needed after this package is compiled. -->')
+    writer.section('run_depend', run_depends)
+    if unresolved:
+        writer.lines('  <!-- TODO: not found in the rosdep database, replace by the right keys -->',
+                     *['  ' + comment_out(make_tag('run_depend', None, key)) for key in unresolved])
+    writer.lines('',
+                 '  <!-- Dependencies needed only for running tests. -->')
+    writer.section('test_depend', test_depends)
+    writer.line()
+    writer.section('replace', replaces)
+    writer.section('conflict', conflicts)
+    writer.lines('',
+                 '  <export>')
+    exports = [(name, make_empty_tag(name, attrs_dict)) for name, attrs_dict in exports]
+    if architecture_independent:
+        exports.append(('architecture_independent', '<architecture_independent/>'))
+    if metapackage:
+        exports.append(('metapackage', '<metapackage/>'))
+    if not exports:
+        writer.line()
+    for name, xml in exports:
+        writer.element(name, xml, 2)
+    writer.lines('  </export>',
+                 '</package>')
+    writer.finish()
 
 
 def comment_out(xml):
     return '<!-- %s -->' % xml
 
 
-def make_section(tag_name, rows):
-    """
-    Make a string in XML format for a section with a given tag name.
-    """
-    return '\n'.join(indent(make_tag_from_row(tag_name, r)) for r in rows)
-
-
 def make_tag_from_row(name, row):
     """
     Make an XML tag from a row.
@@ -387,15 +528,26 @@ def make_tag_from_row(name, row):
     '<foo baz="buzz">bar</foo>'
     """
     if isinstance(row, basestring):
-        return make_tag(name, attrs_dict={}, contents=row)
+        return make_tag(name, None, row)
     if isinstance(row, tuple):
-        return make_tag(name, attrs_dict=row[1], contents=row[0])
+        return make_tag(name, row[1], row[0])
+
+
+def _escape(text, entities=None):
+    if '&' in text or '<' in text or '>' in text or (entities and '"' in text):
+        return escape(text, entities or {})
+    return text
 
 
 def make_tag(name, attrs_dict, contents):
-    return '<%s>%s</%s>' % (space_join([name, dict_to_attrs(attrs_dict)]),
-                            contents,
-                            name)
+    """
+    >>> make_tag('description', {}, 'Tom & Jerry <3')
+    '<description>Tom &amp; Jerry &lt;3</description>'
+    """
+    contents = _escape('%s' % (contents,))
+    if attrs_dict:
+        return '<%s %s>%s</%s>' % (name, dict_to_attrs(attrs_dict), contents, name)
+    return '<%s>%s</%s>' % (name, contents, name)
 
 
 def make_empty_tag(name, attrs_dict):
@@ -414,15 +566,4 @@ def dict_to_attrs(values):
     """
     Convert a dictionary to a string containing attributes in XML format.
     """
-    return ' '.join('%s="%s"' % (k, v) for k, v in values.items())
-
-
-def make_exports_section(exports, architecture_independent, metapackage):
-    parts = [make_empty_tag(name, attrs_dict)
-             for name, attrs_dict in exports]
-    if architecture_independent:
-        parts.append('<architecture_independent/>')
-    if metapackage:
-        parts.append('<metapackage/>')
-    parts = [indent(p, 2) for p in parts]
-    return '\n'.join(parts)
+    return ' '.join('%s="%s"' % (k, _escape('%s' % (v,), ATTRIBUTE_ENTITIES)) for k, v in values.items())
@@ -0,0 +1,68 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+"""
+Reading of YAML data files, such as rosdep databases and rule packs.
+
+Files are read with PyYAML if it is installed. Without it, only files in
+JSON, which is a subset of YAML, can be read.
+"""
+
+import json
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+def load_data_file(path, what='data file'):
+    """
+    :param what: kind of file for error messages
+    :returns: the data in the YAML or JSON file at path
+    :raises: ValueError if the file cannot be parsed
+    """
+    with open(path) as fhand:
+        return parse_data_file(fhand.read(), path, what)
+
+
+def parse_data_file(text, path, what='data file'):
+    """
+    :returns: the data in text, the contents of the YAML or JSON file at path
+    :raises: ValueError if text cannot be parsed
+    """
+    if yaml is not None and not path.endswith('.json'):
+        try:
+            return yaml.safe_load(text)
+        except yaml.YAMLError as exc:
+            raise ValueError('Invalid %s %s: %s' % (what, path, exc))
+    try:
+        return json.loads(text)
+    except ValueError as exc:
+        if yaml is None and not path.endswith('.json'):
+            raise ValueError('Cannot read %s %s as JSON, install PyYAML for YAML: %s' % (what, path, exc))
+        raise ValueError('Invalid %s %s: %s' % (what, path, exc))
@@ -0,0 +1,106 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Unified diffs of changesets, between each old file and its converted replacement.
+"""
+
+import difflib
+import multiprocessing
+
+
+def _read(path):
+    if not path:
+        return ''
+    with open(path) as fhand:
+        return fhand.read()
+
+
+def _lines(text):
+    """
+    :returns: lines of text keeping line ends, marking a missing end at the last line
+    """
+    lines = text.splitlines(True)
+    if lines and not lines[-1].endswith('\n'):
+        lines[-1] += '\n\\ No newline at end of file\n'
+    return lines
+
+
+def make_diff(change):
+    """
+    :param change: 4-tuple of oldfile, backupfile, newfile, contents
+    :returns: unified diff from oldfile to newfile, '' if there is no newfile
+    """
+    oldfile, _, newfile, content = change
+    if not newfile:
+        return ''
+    return ''.join(difflib.unified_diff(_lines(_read(oldfile)), _lines(content),
+                                        oldfile or '/dev/null', newfile))
+
+
+class ChangesetDiffs(object):
+    """
+    Diffs of all changes of a changeset, computed when first needed by a
+    pool of jobs processes and kept for later.
+    """
+
+    def __init__(self, changeset, jobs=None):
+        self.changeset = changeset
+        self.jobs = jobs
+        self.diffs = [None] * len(changeset)
+
+    def __iter__(self):
+        """
+        Yields the diffs in the order of the changeset, each as soon as it is ready.
+        """
+        missing = [index for index, diff in enumerate(self.diffs) if diff is None]
+        jobs = self.jobs if self.jobs is not None else multiprocessing.cpu_count()
+        if jobs <= 1 or len(missing) <= 1:
+            diffs = (make_diff(self.changeset[index]) for index in missing)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(min(jobs, len(missing)))
+            diffs = pool.imap(make_diff, [self.changeset[index] for index in missing])
+        try:
+            for index, diff in enumerate(self.diffs):
+                if diff is None:
+                    diff = next(diffs)
+                    self.diffs[index] = diff
+                yield diff
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    def write(self, path):
+        """
+        Writes all diffs into a single file at path.
+        """
+        with open(path, 'w') as fhand:
+            for diff in self:
+                fhand.write(diff)
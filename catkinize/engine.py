@@ -0,0 +1,164 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Conversion engine for file systems with a high latency per operation, such
+as network storage. All file system state a package conversion needs is
+fetched at once by a pool of threads, so that a conversion waits for about
+one round trip instead of one per operation, and packages are converted
+concurrently.
+"""
+
+import os
+import stat
+from multiprocessing.pool import ThreadPool
+
+from catkinize import progress
+from catkinize.main import PACKAGE_FILES, STACK_FILES, _convert_contents, _create_changesets, \
+    _metapackage_changeset, _package_changeset, iter_packages
+
+# file system operations in flight at once
+DEFAULT_CONCURRENCY = 16
+
+
+def _count_converted(_):
+    progress.converted()
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def _read(path):
+    with open(path) as fhand:
+        return fhand.read()
+
+
+class ConversionEngine(object):
+    """
+    Converts packages and stacks like catkinize_package() and
+    catkinize_stack(), with up to concurrency file system operations and
+    concurrency package conversions in flight. submit_package() and
+    submit_stack() return AsyncResults of the changesets.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, cache=None, spill_dir=None, package_index=None,
+                 rosdep_resolver=None):
+        self.cache = cache
+        self.spill_dir = spill_dir
+        self.package_index = package_index
+        self.rosdep_resolver = rosdep_resolver
+        # operations never wait for other tasks, conversions only for
+        # operations and stacks only for conversions, so no pool can deadlock
+        self._operations = ThreadPool(concurrency)
+        self._conversions = ThreadPool(concurrency)
+        self._stacks = ThreadPool(1)
+
+    def close(self):
+        for pool in (self._stacks, self._conversions, self._operations):
+            pool.close()
+            pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def submit_package(self, path, version, callback=None):
+        return self._conversions.apply_async(self._catkinize_package, (path, version), callback=callback)
+
+    def submit_stack(self, path, version):
+        return self._stacks.apply_async(self._catkinize_stack, (path, version))
+
+    def catkinize_package(self, path, version):
+        return self.submit_package(path, version).get()
+
+    def catkinize_stack(self, path, version):
+        return self.submit_stack(path, version).get()
+
+    def _fetch_stats(self, paths):
+        """
+        :returns: os.stat results of all paths, None for missing ones, and
+        isfile and exists functions looking them up
+        """
+        stats = dict(zip(paths, self._operations.map(_stat, paths)))
+
+        def isfile(path):
+            return stats[path] is not None and stat.S_ISREG(stats[path].st_mode)
+
+        def exists(path):
+            return stats[path] is not None
+        return stats, isfile, exists
+
+    def _catkinize_package(self, path, version):
+        files = [os.path.join(path, filename) for filename in PACKAGE_FILES]
+        stats, isfile, exists = self._fetch_stats([path] + files + [filename + '.backup' for filename in files])
+        if stats[path] is None or not stat.S_ISDIR(stats[path].st_mode):
+            raise ValueError('No directory found at %s' % path)
+        manifest_path = os.path.join(path, 'manifest.xml')
+        if not isfile(manifest_path):
+            raise ValueError("No rosbuild package at %s, missing manifest.xml" % manifest_path)
+        manifest_xml, cmakelists = self._operations.map(_read, [manifest_path, os.path.join(path, 'CMakeLists.txt')])
+        new_manifest, new_cmake = _convert_contents(path, manifest_path, version, manifest_xml, cmakelists,
+                                                    self.cache, self.package_index, self.rosdep_resolver)
+        return _package_changeset(path, new_manifest, new_cmake, self.spill_dir, isfile, exists)
+
+    def _catkinize_stack(self, path, version):
+        files = [os.path.join(path, filename) for filename in STACK_FILES]
+        manifest_path = os.path.join(path, 'manifest.xml')
+        _, isfile, exists = self._fetch_stats([manifest_path] + files + [filename + '.backup' for filename in files])
+        stack_manifest_path = os.path.join(path, 'stack.xml')
+        if not isfile(stack_manifest_path):
+            raise ValueError('Path is not a rosbuild stack, missing stack.xml at %s' % path)
+
+        if isfile(manifest_path):
+            # unary stack
+            changeset = _create_changesets(path, STACK_FILES, isfile=isfile, exists=exists)
+            progress.discovered()
+            progress.discovery_done()
+            changeset.extend(self.submit_package(path, version, _count_converted).get())
+            return changeset
+
+        stack_manifest = self._operations.apply_async(_read, (stack_manifest_path,))
+        # packages are converted while the stack is still being searched
+        packages = []
+        results = []
+        for package in iter_packages(path):
+            packages.append(package)
+            progress.discovered()
+            results.append(self.submit_package(package, version, _count_converted))
+        progress.discovery_done()
+        changeset = _metapackage_changeset(path, stack_manifest.get(), packages, version, isfile, exists)
+        for result in results:
+            changeset.extend(result.get())
+        return changeset
@@ -27,11 +27,20 @@
 #
 
 from __future__ import print_function
+import heapq
+import multiprocessing
 import os
 import sys
+import xml.etree.ElementTree as ET
 
-from catkinize.convert_manifest import convert_manifest, make_from_stack_manifest
-from catkinize.convert_cmake import convert_cmake, make_metapackage_cmake
+from catkinize import profiling, progress
+from catkinize.changes import Change
+from catkinize.convert_manifest import convert_manifest, load_manifest, parse_manifest, make_from_stack_manifest
+from catkinize.convert_cmake import convert_cmake, get_rule_packs, get_rule_table, make_metapackage_cmake, \
+    rewrite_cmake, set_rule_packs
+from catkinize.diff import ChangesetDiffs
+from catkinize.package_index import PackageIndex
+from catkinize.transaction import JOURNAL_NAME, WRITE_JOBS, apply_changes, resume_changes, rollback_changes
 
 
 class Ui(object):
@@ -45,17 +54,35 @@ class Ui(object):
 
 DEFAULT_UI = Ui
 
+# directories never searched for packages: version control
+PRUNED_DIRECTORIES = set(['.svn', 'CVS', '.hg', '.git', '.bzr'])
+# files marking directories not searched for packages below the given path:
+# cmake build directories, catkin devel and install spaces, and directories
+# catkin is told to ignore
+PRUNING_MARKERS = ('CMakeCache.txt', '.catkin', 'CATKIN_IGNORE')
 
-def _create_changesets(path, filenames, newfiles=None, contents=None):
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+def _create_changesets(path, filenames, newfiles=None, contents=None,
+                       isfile=os.path.isfile, exists=os.path.exists):
     """
-    creates 4 tupels depending on the 4 input lists.
+    creates Changes depending on the 4 input lists.
     look up filenames in path, add changeset to rename to xyz.backup, if newfile is given, adds action to create with given contents
+    :param isfile: os.path.isfile, or a lookup of file system state fetched before
+    :param exists: os.path.exists, or a lookup of file system state fetched before
     """
     oldfiles = [os.path.join(path, filename) for filename in filenames]
     backup_files = [oldfile + '.backup' for oldfile in oldfiles]
-    changeset = []  # 4-tupels of oldfile, backup, newfile, contents
+    changeset = []
     for oldfile, backup_file in zip(oldfiles, backup_files):
-        if os.path.isfile(oldfile) and os.path.isfile(backup_file):
+        if isfile(oldfile) and isfile(backup_file):
             raise ValueError('Cannot write backup file %s, operation aborted without changes' % backup_file)
 
     if not newfiles:
@@ -63,26 +90,107 @@ def _create_changesets(path, filenames, newfiles=None, contents=None):
         contents = [None for _ in oldfiles]
 
     for oldfile, backup_file, newfile, content in zip(oldfiles, backup_files, newfiles, contents):
-        if os.path.exists(oldfile):
+        if exists(oldfile):
             if newfile:
-                changeset.append((oldfile,
-                                  backup_file,
-                                  os.path.join(path, newfile),
-                                  content))
+                changeset.append(Change(oldfile,
+                                        backup_file,
+                                        os.path.join(path, newfile),
+                                        content))
             else:
-                changeset.append((oldfile,
-                                  backup_file,
-                                  None, None))
+                changeset.append(Change(oldfile,
+                                        backup_file,
+                                        None, None))
         elif newfile:
-            changeset.append((None, None, newfile, content))
+            changeset.append(Change(None, None, os.path.join(path, newfile), content))
 
     return changeset
 
 
-def catkinize_package(path, version):
+def _convert_package(path, manifest_path, version, cache=None, package_index=None, rosdep_resolver=None):
+    """
+    Converts manifest.xml and CMakeLists.txt of a package, looking up the
+    results in cache first if given.
+    :returns: contents of package.xml and CMakeLists.txt
+    """
+    if cache is None:
+        with profiling.stage('parse manifest', path):
+            manifest = load_manifest(manifest_path)
+        with profiling.stage('convert manifest', path):
+            new_manifest = convert_manifest(path, manifest_path, version, manifest=manifest,
+                                            rosdep_resolver=rosdep_resolver)
+        with profiling.stage('convert cmake', path):
+            new_cmake = convert_cmake(path, manifest=manifest, package_index=package_index,
+                                      rosdep_resolver=rosdep_resolver)
+        return new_manifest, new_cmake
+
+    cmakelists_path = os.path.join(path, 'CMakeLists.txt')
+    with profiling.stage('read', path):
+        with open(manifest_path) as fhand:
+            manifest_xml = fhand.read()
+        with open(cmakelists_path) as fhand:
+            cmakelists = fhand.read()
+    return _convert_contents(path, manifest_path, version, manifest_xml, cmakelists, cache, package_index,
+                             rosdep_resolver)
+
+
+def _convert_contents(path, manifest_path, version, manifest_xml, cmakelists, cache=None, package_index=None,
+                      rosdep_resolver=None):
+    """
+    Converts the contents of manifest.xml and CMakeLists.txt of a package,
+    looking up the results in cache first if given.
+    :param package_index: PackageIndex to tell catkin from system dependencies,
+    its fingerprint is part of the CMakeLists.txt cache key
+    :param rosdep_resolver: RosdepResolver to check rosdep keys with, its
+    fingerprint is part of both cache keys. That of the rule packs in use is
+    part of the CMakeLists.txt key.
+    :returns: contents of package.xml and CMakeLists.txt
     """
-    Calculates a list of changes for one package. changes are 4-tupels of oldfile, backupfile, newfile, contents.
+    cmakelists_path = os.path.join(path, 'CMakeLists.txt')
+    new_manifest = new_cmake = manifest_key = cmake_key = None
+    if cache is not None:
+        with profiling.stage('cache lookup', path):
+            package_name = os.path.basename(os.path.abspath(path))
+            # keys without index, resolver and rule packs stay as they were, so that cached entries remain valid
+            options = ()
+            if rosdep_resolver is not None:
+                options = ('rosdep', rosdep_resolver.fingerprint)
+            manifest_key = cache.key('package.xml', package_name, version, manifest_xml, *options)
+            if package_index is not None:
+                options += ('index', package_index.fingerprint)
+            if get_rule_table().fingerprint is not None:
+                options += ('rules', get_rule_table().fingerprint)
+            cmake_key = cache.key('CMakeLists.txt', package_name, manifest_xml, cmakelists, *options)
+            new_manifest = cache.get(manifest_key)
+            new_cmake = cache.get(cmake_key)
+    if new_manifest is None or new_cmake is None:
+        with profiling.stage('parse manifest', path):
+            manifest = parse_manifest(manifest_xml)
+        if new_manifest is None:
+            with profiling.stage('convert manifest', path):
+                new_manifest = convert_manifest(path, manifest_path, version, manifest=manifest,
+                                                rosdep_resolver=rosdep_resolver)
+            if cache is not None:
+                cache.put(manifest_key, new_manifest)
+        if new_cmake is None:
+            if not progress.is_quiet():
+                # one write, so that lines of concurrent conversions do not mix
+                sys.stderr.write('Converting %s\n' % cmakelists_path)
+            with profiling.stage('convert cmake', path):
+                new_cmake = rewrite_cmake(cmakelists, path, manifest=manifest, package_index=package_index,
+                                          rosdep_resolver=rosdep_resolver)
+            if cache is not None:
+                cache.put(cmake_key, new_cmake)
+    return new_manifest, new_cmake
+
+
+def catkinize_package(path, version, cache=None, spill_dir=None, package_index=None, rosdep_resolver=None):
+    """
+    Calculates a list of changes for one package. changes are Changes of oldfile, backupfile, newfile, contents.
     This comes before execution so that the user may confirm or reject changes.
+    :param cache: ConversionCache for converted files, if any
+    :param spill_dir: directory to keep large converted contents in instead of memory, if any
+    :param package_index: PackageIndex of the workspace, see build_package_index, if any
+    :param rosdep_resolver: RosdepResolver to check rosdep keys with, if any
     """
     if not os.path.isdir(path):
         raise ValueError('No directory found at %s' % path)
@@ -90,20 +198,253 @@ def catkinize_package(path, version):
 
     if not os.path.isfile(manifest_path):
         raise ValueError("No rosbuild package at %s, missing manifest.xml" % manifest_path)
-    new_manifest = convert_manifest(path, manifest_path, version)
-    new_cmake = convert_cmake(path)
+    new_manifest, new_cmake = _convert_package(path, manifest_path, version, cache, package_index,
+                                               rosdep_resolver)
+    return _package_changeset(path, new_manifest, new_cmake, spill_dir)
+
+
+# files of a package replaced by catkinize_package, and their replacements
+PACKAGE_FILES = ['CMakeLists.txt', 'manifest.xml', 'Makefile']
+PACKAGE_NEWFILES = ['CMakeLists.txt', 'package.xml', None]
+
+
+def _package_changeset(path, new_manifest, new_cmake, spill_dir=None,
+                       isfile=os.path.isfile, exists=os.path.exists):
+    with profiling.stage('changesets', path):
+        changeset = _create_changesets(path, PACKAGE_FILES, PACKAGE_NEWFILES, [new_cmake, new_manifest, None],
+                                       isfile, exists)
+        if spill_dir is not None:
+            for change in changeset:
+                change.spill(spill_dir)
+        return changeset
+
+
+def _package_size(path):
+    """
+    Size in bytes of the files of a package that get converted, used to
+    schedule the largest packages first.
+    """
+    size = 0
+    for filename in ['manifest.xml', 'CMakeLists.txt']:
+        try:
+            size += os.path.getsize(os.path.join(path, filename))
+        except OSError:
+            pass
+    return size
+
+
+# PackageIndex and RosdepResolver of the run in pool workers, given once when the pool starts
+_worker_package_index = None
+_worker_rosdep_resolver = None
+
+
+def _init_worker(package_index, rosdep_resolver, rule_packs, quiet):
+    global _worker_package_index, _worker_rosdep_resolver
+    _worker_package_index = package_index
+    _worker_rosdep_resolver = rosdep_resolver
+    set_rule_packs(rule_packs)
+    progress.set_quiet(quiet)
+
+
+def _catkinize_package_args(args):
+    """
+    Helper for Pool.map, which passes a single argument only.
+    Returns the cache statistics and the profile of the worker with the changeset.
+    profile is the class of the Profiler of the run, None if profiling is off.
+    """
+    path, version, cache, spill_dir, profile = args
+    profiler = profiling.enable(profile()) if profile else None
+    try:
+        if cache is None:
+            return (catkinize_package(path, version, None, spill_dir, _worker_package_index,
+                                      _worker_rosdep_resolver), 0, 0,
+                    profiler and profiler.records())
+        hits, misses = cache.hits, cache.misses
+        changeset = catkinize_package(path, version, cache, spill_dir, _worker_package_index,
+                                      _worker_rosdep_resolver)
+        return changeset, cache.hits - hits, cache.misses - misses, profiler and profiler.records()
+    finally:
+        profiling.disable()
+
+
+def _catkinize_packages(packages, version, jobs, cache=None, spill_dir=None, package_index=None,
+                        rosdep_resolver=None):
+    """
+    Calculates the changesets for packages, in a pool of jobs processes if jobs > 1.
+    packages may be an iterator still discovering them, conversion starts with
+    the first package found. Progress is reported from this process only.
+    :returns: list of the packages and list of their changesets, in the order of packages
+    """
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    if jobs <= 1 or (isinstance(packages, list) and len(packages) <= 1):
+        found = []
+        changesets = []
+        for package in packages:
+            found.append(package)
+            progress.discovered()
+            changesets.append(catkinize_package(package, version, cache, spill_dir, package_index,
+                                                rosdep_resolver))
+            progress.converted()
+        progress.discovery_done()
+        return found, changesets
+
+    profiler = profiling.get_profiler()
+    found = []
+    results = []
+    # packages found but not yet given to the pool, largest first
+    waiting = []
+    # number of tasks finished, counted in the pool's result thread
+    finished = [0]
+    window = 2 * jobs
 
-    filenames = ['CMakeLists.txt', 'manifest.xml', 'Makefile']
-    newfiles = ['CMakeLists.txt', 'package.xml', None]
-    contents = [new_cmake, new_manifest, None]
+    def count_finished(_):
+        finished[0] += 1
+        progress.converted()
 
-    return _create_changesets(path, filenames, newfiles, contents)
+    def submit():
+        _, index, package = heapq.heappop(waiting)
+        results[index] = pool.apply_async(_catkinize_package_args,
+                                          ((package, version, cache, spill_dir, profiler and type(profiler)),),
+                                          callback=count_finished)
 
+    pool = multiprocessing.Pool(jobs, _init_worker, (package_index, rosdep_resolver, get_rule_packs(),
+                                                     progress.is_quiet()))
+    try:
+        for index, package in enumerate(packages):
+            found.append(package)
+            progress.discovered()
+            results.append(None)
+            heapq.heappush(waiting, (-_package_size(package), index, package))
+            # keep some packages back while all workers are busy, to pick the largest later
+            while waiting and (len(results) - len(waiting) - finished[0] < jobs or len(waiting) > window):
+                submit()
+        progress.discovery_done()
+        while waiting:
+            submit()
+        changesets = []
+        for result in results:
+            changeset, hits, misses, records = result.get()
+            changesets.append(changeset)
+            if cache is not None:
+                cache.hits += hits
+                cache.misses += misses
+            if profiler is not None:
+                profiler.merge(records)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return found, changesets
 
-def catkinize_stack(path, version):
+
+def _list_directory(path, follow_symlinks):
+    """
+    :returns: set of the names of files in directory path, and list of the
+    paths of its subdirectories in listing order
+    """
+    files = set()
+    subdirs = []
+    if scandir is not None:
+        for entry in scandir(path):
+            if entry.is_dir():
+                if follow_symlinks or not entry.is_symlink():
+                    subdirs.append(os.path.join(path, entry.name))
+            else:
+                files.add(entry.name)
+    else:
+        for name in os.listdir(path):
+            subdir = os.path.join(path, name)
+            if os.path.isdir(subdir):
+                if follow_symlinks or not os.path.islink(subdir):
+                    subdirs.append(subdir)
+            else:
+                files.add(name)
+    return files, subdirs
+
+
+def iter_packages(path, follow_symlinks=False, markers=('manifest.xml',)):
+    """
+    Yields the rosbuild package directories below path as soon as they are
+    found, in the same order as os.walk would. Version control directories
+    are never listed, nor build directories, devel and install spaces and
+    directories with a CATKIN_IGNORE file below path. Symlinks to directories are followed only
+    if follow_symlinks, then every directory is visited once so that symlink
+    loops end.
+    :param markers: names of files any of which makes a directory a package
+    """
+    visited = set()
+    pending = [path]
+    while pending:
+        directory = pending.pop()
+        if follow_symlinks:
+            try:
+                stat = os.stat(directory)
+            except OSError:
+                continue
+            if (stat.st_dev, stat.st_ino) in visited:
+                continue
+            visited.add((stat.st_dev, stat.st_ino))
+        try:
+            with profiling.stage('discovery'):
+                files, subdirs = _list_directory(directory, follow_symlinks)
+        except OSError:
+            continue
+        if 'CATKIN_IGNORE' in files and directory != path:
+            continue
+        if any(marker in files for marker in markers):
+            yield directory
+            continue
+        if directory != path and any(marker in files for marker in PRUNING_MARKERS):
+            continue
+        pending.extend(reversed([subdir for subdir in subdirs
+                                 if os.path.basename(subdir) not in PRUNED_DIRECTORIES]))
+
+
+def find_packages(path, follow_symlinks=False):
+    """
+    :returns: list of rosbuild package directories below path
+    """
+    return list(iter_packages(path, follow_symlinks))
+
+
+def build_package_index(paths, follow_symlinks=False):
+    """
+    Indexes the packages below all paths, rosbuild packages by their
+    directory name and catkin packages by the name in their package.xml.
+    :returns: PackageIndex
     """
-    Calculates a list of changes for one stack. changes are 4-tupels of oldfile, backupfile, newfile, contents.
+    names = []
+    for path in paths:
+        for package in iter_packages(path, follow_symlinks, ('package.xml', 'manifest.xml')):
+            with profiling.stage('index', package):
+                names.append(_package_name(package))
+    return PackageIndex(names)
+
+
+def _package_name(path):
+    """
+    :returns: name in the package.xml in path, else the directory name
+    """
+    try:
+        name = ET.parse(os.path.join(path, 'package.xml')).findtext('name')
+    except (IOError, ET.ParseError):
+        name = None
+    return name.strip() if name and name.strip() else os.path.basename(os.path.abspath(path))
+
+
+def catkinize_stack(path, version, jobs=1, cache=None, spill_dir=None, package_index=None,
+                    rosdep_resolver=None):
+    """
+    Calculates a list of changes for one stack. changes are Changes of oldfile, backupfile, newfile, contents.
     This comes before execution so that the user may confirm or reject changes.
+    :param jobs: number of processes converting packages in parallel, None for one per CPU
+    :param cache: ConversionCache for converted files, if any
+    :param spill_dir: directory to keep large converted contents in instead of memory, if any
+    :param package_index: PackageIndex of the workspace, see build_package_index, if any
+    :param rosdep_resolver: RosdepResolver to check rosdep keys with, if any
     """
     stack_manifest_path = os.path.join(path, 'stack.xml')
     if not os.path.isfile(stack_manifest_path):
@@ -114,54 +455,72 @@ def catkinize_stack(path, version):
 
     if os.path.isfile(os.path.join(path, 'manifest.xml')):
         # unary stack
-        packages = [path]
-        changeset.extend(_create_changesets(path, ['stack.xml', 'Makefile', 'CMakeLists.txt']))
-    else:
-        packages = []
-        for (parentdir, subdirs, files) in os.walk(path):
-            # print(files)
-            if 'manifest.xml' in files:
-                packages.append(parentdir)
-                del subdirs[:]
-            elif os.path.basename(parentdir) in ['.svn', 'CVS', '.hg', '.git']:
-                del subdirs[:]
-        meta_package_name = os.path.basename(path)
-        meta_manifest = os.path.join(meta_package_name, 'package.xml')
-        package_names = [os.path.basename(package) for package in packages]
-        meta_contents = make_from_stack_manifest(stack_manifest, meta_package_name, package_names, version)
-        meta_cmake = os.path.join(meta_package_name, 'CMakeLists.txt')
-        cmake_contents = make_metapackage_cmake(meta_package_name)
-        changeset.extend(_create_changesets(path,
-                                            ['stack.xml', 'Makefile', 'CMakeLists.txt'],
-                                            [meta_manifest, None, meta_cmake],
-                                            [meta_contents, None, cmake_contents]))
-
-    # print(packages)
-
-    for package in packages:
-        changeset.extend(catkinize_package(package, version))
+        changeset.extend(_create_changesets(path, STACK_FILES))
+        for package_changeset in _catkinize_packages([path], version, jobs, cache, spill_dir, package_index,
+                                                     rosdep_resolver)[1]:
+            changeset.extend(package_changeset)
+        return changeset
+
+    # packages are converted while the stack is still being searched
+    packages, package_changesets = _catkinize_packages(iter_packages(path), version, jobs, cache, spill_dir,
+                                                       package_index, rosdep_resolver)
+    changeset.extend(_metapackage_changeset(path, stack_manifest, packages, version))
+    for package_changeset in package_changesets:
+        changeset.extend(package_changeset)
     return changeset
 
 
-def prompt_changes(changeset, ui_class=DEFAULT_UI):
+# files of a stack replaced by catkinize_stack
+STACK_FILES = ['stack.xml', 'Makefile', 'CMakeLists.txt']
+
+
+def _metapackage_changeset(path, stack_manifest, packages, version,
+                           isfile=os.path.isfile, exists=os.path.exists):
+    """
+    :returns: changes replacing the stack files in path by a metapackage of packages
+    """
+    meta_package_name = os.path.basename(path)
+    meta_manifest = os.path.join(meta_package_name, 'package.xml')
+    package_names = [os.path.basename(package) for package in packages]
+    meta_contents = make_from_stack_manifest(stack_manifest, meta_package_name, package_names, version)
+    meta_cmake = os.path.join(meta_package_name, 'CMakeLists.txt')
+    cmake_contents = make_metapackage_cmake(meta_package_name)
+    return _create_changesets(path,
+                              STACK_FILES,
+                              [meta_manifest, None, meta_cmake],
+                              [meta_contents, None, cmake_contents],
+                              isfile, exists)
+
+
+def prompt_changes(changeset, ui_class=DEFAULT_UI, diffs=None):
     """
     interactive function, displays a list of planned changes for the user to confirm.
+    Details show the diff of each old file to its converted replacement.
+    :param diffs: ChangesetDiffs of changeset, computed when first shown if None
     :returns: True if the user confirmed, false else
     """
     ui = ui_class()
     abort = False
     details = False
+    if diffs is None:
+        diffs = ChangesetDiffs(changeset)
     prompt = "Perform these changes ((y)es / (n)o / (d)etails):"
     while not abort:
-        for oldfile, backup_file, newfile, content in changeset:
-            if oldfile:
-                print('Backup file %s  ==>  %s' % (oldfile, backup_file))
-            if newfile:
-                print('Create converted file %s' % newfile)
-                if details:
-                    print('-' * 80)
-                    print(content)
-                    print('-' * 80)
+        with profiling.stage('prompt output'):
+            details_iter = iter(diffs) if details else None
+            for change in changeset:
+                # the paths only, contents are not needed here
+                oldfile, backup_file, newfile = change[0], change[1], change[2]
+                if oldfile:
+                    print('Backup file %s  ==>  %s' % (oldfile, backup_file))
+                if newfile:
+                    print('Create converted file %s' % newfile)
+                if details_iter is not None:
+                    diff = next(details_iter)
+                    if diff:
+                        print('-' * 80)
+                        print(diff, end='')
+                        print('-' * 80)
 
         user_input = ui.get_input(prompt)
         if user_input == 'y':
@@ -174,18 +533,13 @@ def prompt_changes(changeset, ui_class=DEFAULT_UI):
     return False
 
 
-def perform_changes(changeset):
+def perform_changes(changeset, journal=None, jobs=WRITE_JOBS):
     """
-    Performs a set of changes as calculated by the other methods in this module
+    Performs a set of changes as calculated by the other methods in this module.
+    New files are written first, then all renames are done, recorded in a
+    journal for resume_changes or rollback_changes if interrupted.
+    :param journal: journal file, by default in the directory containing all changed files
+    :param jobs: number of threads writing new files
     """
-    for oldfile, backup_file, newfile, content in changeset:
-        if oldfile:
-            os.rename(oldfile, backup_file)
-            print('Backed up file: %s  ==>  %s ' % (oldfile, backup_file))
-        if newfile:
-            # for new meta packages
-            if not os.path.isdir(os.path.dirname(newfile)):
-                os.mkdir(os.path.dirname(newfile))
-            with open(newfile, "w") as fhand:
-                fhand.write(content)
-                print("Wrote new file %s" % newfile)
+    with profiling.stage('write'):
+        apply_changes(changeset, journal, jobs, report=print)
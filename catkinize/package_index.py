@@ -0,0 +1,95 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+"""
+Index of the package names of a workspace, telling catkin package
+dependencies from system dependencies.
+"""
+
+import hashlib
+import sys
+
+try:
+    intern = sys.intern
+except AttributeError:
+    pass
+
+
+class PackageIndex(object):
+    """
+    Set of the names of all packages found in a workspace, built once per run.
+    Names are interned, so that the many equal names of dependencies share
+    one string, and looked up in constant time.
+    """
+
+    def __init__(self, names=()):
+        self.names = frozenset(intern(str(name)) for name in names)
+        self._fingerprint = None
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return 'PackageIndex(%r)' % sorted(self.names)
+
+    @property
+    def fingerprint(self):
+        """
+        hash of all names, for cache keys of conversions using this index
+        """
+        if self._fingerprint is None:
+            self._fingerprint = hashlib.sha1('\n'.join(sorted(self.names)).encode('utf-8')).hexdigest()
+        return self._fingerprint
+
+    def split(self, depends, rosdeps):
+        """
+        :param depends: package dependencies of a manifest
+        :param rosdeps: rosdep keys of a manifest, taken for system dependencies
+        unless they name a package of the workspace
+        :returns: lists of catkin package dependencies, package dependencies
+        not found in the workspace, and system dependencies, each in order
+
+        >>> PackageIndex(['roscpp', 'tf']).split(['roscpp', 'foo', 'tf'], ['boost', 'tf'])
+        (['roscpp', 'tf'], ['foo'], ['boost'])
+        """
+        catkin = []
+        unknown = []
+        for depend in depends:
+            if depend in self.names:
+                catkin.append(depend)
+            else:
+                unknown.append(depend)
+        system = []
+        for rosdep in rosdeps:
+            if rosdep not in self.names:
+                system.append(rosdep)
+            elif rosdep not in catkin:
+                catkin.append(rosdep)
+        return catkin, unknown, system
@@ -0,0 +1,227 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Wall and CPU time per conversion stage and per package. Profiling is off
+unless a Profiler is enabled, and then stage() costs no more than a function
+call and a global lookup. A Tracer also keeps every stage as a span of a
+timeline, for a trace viewer.
+"""
+
+from __future__ import print_function
+import json
+import os
+import threading
+import time
+
+wall_clock = getattr(time, 'perf_counter', time.time)
+if hasattr(time, 'process_time'):
+    cpu_clock = time.process_time
+else:
+    def cpu_clock():
+        user, system = os.times()[:2]
+        return user + system
+
+_profiler = None
+
+
+class Profiler(object):
+    """
+    Accumulates the times spent in stages, in total and per package.
+    stages maps a stage name to [calls, wall, cpu], packages maps a package to [wall, cpu].
+    Stages may end on several threads at once. Their cpu is the CPU time of
+    the whole process while they ran, which includes that of other threads.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.packages = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, package, path, start, wall, cpu):
+        """adds a stage that started at start by wall_clock(), path is the file it worked on if any"""
+        with self._lock:
+            self._add(name, package, wall, cpu)
+
+    def add(self, name, package, wall, cpu, calls=1):
+        with self._lock:
+            self._add(name, package, wall, cpu, calls)
+
+    def _add(self, name, package, wall, cpu, calls=1):
+        totals = self.stages.setdefault(name, [0, 0.0, 0.0])
+        totals[0] += calls
+        totals[1] += wall
+        totals[2] += cpu
+        if package is not None:
+            totals = self.packages.setdefault(package, [0.0, 0.0])
+            totals[0] += wall
+            totals[1] += cpu
+
+    def records(self):
+        """:returns: picklable contents, for merge() in another process"""
+        return self.stages, self.packages
+
+    def merge(self, records):
+        stages, packages = records[:2]
+        with self._lock:
+            for name, (calls, wall, cpu) in stages.items():
+                self._add(name, None, wall, cpu, calls)
+            for package, (wall, cpu) in packages.items():
+                totals = self.packages.setdefault(package, [0.0, 0.0])
+                totals[0] += wall
+                totals[1] += cpu
+
+    def summary(self, slowest=10):
+        """
+        :returns: table of all stages and the slowest packages, the CPU time
+        being that of the process, see Profiler
+        """
+        lines = ['%-30s %8s %10s %16s' % ('stage', 'calls', 'wall [s]', 'process cpu [s]')]
+        for name, (calls, wall, cpu) in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+            lines.append('%-30s %8d %10.3f %16.3f' % (name, calls, wall, cpu))
+        if self.packages:
+            lines.append('')
+            lines.append('%-49s %10s %16s' % ('slowest packages', 'wall [s]', 'process cpu [s]'))
+            ranked = sorted(self.packages.items(), key=lambda item: -item[1][0])
+            for package, (wall, cpu) in ranked[:slowest]:
+                lines.append('%-49s %10.3f %16.3f' % (package, wall, cpu))
+        return '\n'.join(lines)
+
+
+class Tracer(Profiler):
+    """
+    Profiler also recording each stage as a span, kept in memory as tuples of
+    name, package, path, start, wall, process id and thread id until written
+    out in the Chrome trace event format.
+    """
+
+    def __init__(self):
+        Profiler.__init__(self)
+        self.spans = []
+        self.origin = wall_clock()
+
+    def record(self, name, package, path, start, wall, cpu):
+        span = (name, package, path, start, wall, os.getpid(), threading.current_thread().ident)
+        with self._lock:
+            self._add(name, package, wall, cpu)
+            self.spans.append(span)
+
+    def records(self):
+        return self.stages, self.packages, self.spans
+
+    def merge(self, records):
+        Profiler.merge(self, records)
+        with self._lock:
+            self.spans.extend(records[2])
+
+    def trace_events(self):
+        """
+        :returns: list of complete events, one per span with its package and
+        file as arguments, and names for the processes, this one being the main
+        process. The package of a file is its directory.
+        """
+        events = []
+        for pid in sorted(set(span[5] for span in self.spans) | set([os.getpid()])):
+            events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                           'args': {'name': 'catkinize' if pid == os.getpid() else 'worker %d' % pid}})
+        for name, package, path, start, wall, pid, tid in self.spans:
+            event = {'name': name, 'cat': 'catkinize', 'ph': 'X', 'pid': pid, 'tid': tid,
+                     'ts': round((start - self.origin) * 1e6, 1), 'dur': round(wall * 1e6, 1)}
+            if path is not None:
+                event['args'] = {'package': package or os.path.dirname(path), 'file': path}
+            elif package is not None:
+                event['args'] = {'package': package}
+            events.append(event)
+        return events
+
+    def write_trace(self, path):
+        """writes the spans to path as JSON, for chrome://tracing and other trace viewers"""
+        with open(path, 'w') as fhand:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, fhand)
+
+
+class _Stage(object):
+
+    __slots__ = ('profiler', 'name', 'package', 'path', 'wall', 'cpu')
+
+    def __init__(self, profiler, name, package, path):
+        self.profiler = profiler
+        self.name = name
+        self.package = package
+        self.path = path
+
+    def __enter__(self):
+        self.wall = wall_clock()
+        self.cpu = cpu_clock()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.package, self.path, self.wall, wall_clock() - self.wall,
+                             cpu_clock() - self.cpu)
+        return False
+
+
+class _NullStage(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, package=None, path=None):
+    """
+    :param path: file the stage works on, shown in traces only
+    :returns: context manager timing a stage, for package if given
+    """
+    if _profiler is None:
+        return _NULL_STAGE
+    return _Stage(_profiler, name, package, path)
+
+
+def enable(profiler=None):
+    """
+    Makes profiler, or a new Profiler, collect the times of all stages.
+    :returns: the enabled Profiler
+    """
+    global _profiler
+    _profiler = profiler or Profiler()
+    return _profiler
+
+
+def disable():
+    global _profiler
+    _profiler = None
+
+
+def get_profiler():
+    """:returns: the enabled Profiler, None if profiling is off"""
+    return _profiler
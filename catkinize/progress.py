@@ -0,0 +1,247 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+"""
+Live progress of a stack conversion: packages discovered and converted, then
+files written, with throughput and an estimate of the time left. Progress is
+off unless enabled, and then each event costs a counter update and a clock
+read, while rendering happens at most once per interval.
+"""
+
+from __future__ import division
+import json
+import threading
+
+from catkinize.profiling import wall_clock
+
+# seconds between two renderings of the progress
+UPDATE_INTERVAL = 0.5
+BAR_WIDTH = 20
+
+_progress = None
+# whether per file messages are left out as progress is shown instead, also
+# set in pool workers, which do not report progress themselves
+_quiet = False
+
+
+class Progress(object):
+    """
+    Counts the events of a conversion in two phases, 'convert' until all
+    packages discovered are converted, then 'write' once the number of files
+    to write is known. Events may come from several threads.
+    :param render: called with the state, see state(), at most every
+    interval seconds, and always when a phase is complete
+    """
+
+    def __init__(self, render, interval=UPDATE_INTERVAL, clock=wall_clock):
+        self.render = render
+        self.interval = interval
+        self.clock = clock
+        self.phase = 'convert'
+        self.discovered = 0
+        self.discovering = True
+        self.converted = 0
+        self.written = 0
+        self.writes = None
+        self.started = self.phase_started = self.rendered = clock()
+        self._lock = threading.Lock()
+
+    def add(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            self._update()
+
+    def end_discovery(self):
+        with self._lock:
+            self.discovering = False
+            self._update()
+
+    def start_writing(self, writes):
+        with self._lock:
+            if self.phase == 'convert' and not self._complete():
+                self.render(self.state(self.clock(), final=True))
+            self.phase = 'write'
+            self.writes = writes
+            self.phase_started = self.clock()
+            self._update()
+
+    def _complete(self):
+        if self.phase == 'convert':
+            return not self.discovering and self.converted >= self.discovered
+        return self.written >= self.writes
+
+    def _update(self):
+        now = self.clock()
+        final = self._complete()
+        if final or now - self.rendered >= self.interval:
+            self.rendered = now
+            self.render(self.state(now, final))
+
+    def state(self, now, final=False):
+        """
+        :returns: dict of the counters, the elapsed seconds, the rate of the
+        current phase per second and the estimated seconds left in it, None
+        while unknown. While discovering, the estimate covers the packages
+        found so far only.
+        """
+        if self.phase == 'convert':
+            done, total = self.converted, self.discovered
+        else:
+            done, total = self.written, self.writes
+        elapsed = now - self.phase_started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (total - done) / rate if rate > 0 else None
+        return {'phase': self.phase,
+                'discovered': self.discovered,
+                'discovering': self.discovering,
+                'converted': self.converted,
+                'written': self.written,
+                'writes': self.writes,
+                'elapsed': round(now - self.started, 3),
+                'rate': round(rate, 3),
+                'eta': None if eta is None else round(eta, 1),
+                'final': final}
+
+
+def format_duration(seconds):
+    """
+    >>> format_duration(75.4), format_duration(3725)
+    ('1:15', '1:02:05')
+    """
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    if minutes < 60:
+        return '%d:%02d' % (minutes, seconds)
+    return '%d:%02d:%02d' % (minutes // 60, minutes % 60, seconds)
+
+
+def format_bar(state, width=BAR_WIDTH):
+    """
+    :returns: one line showing state as a bar, the counts, the rate and the time left
+
+    >>> format_bar({'phase': 'convert', 'discovered': 40, 'discovering': True, 'converted': 10,
+    ...             'written': 0, 'writes': None, 'rate': 2.5, 'eta': 12.0}, width=8)
+    'convert [##------] 10/40+ packages  2.5/s  ETA 0:12'
+    """
+    if state['phase'] == 'convert':
+        done, total, unit = state['converted'], state['discovered'], 'packages'
+    else:
+        done, total, unit = state['written'], state['writes'], 'files'
+    filled = width * done // total if total else width
+    eta = format_duration(state['eta']) if state['eta'] is not None else '-:--'
+    return '%s [%s%s] %d/%d%s %s  %.1f/s  ETA %s' % (
+        state['phase'], '#' * filled, '-' * (width - filled), done, total,
+        '+' if state['discovering'] else '', unit, state['rate'], eta)
+
+
+class BarRenderer(object):
+    """Renders progress as a bar redrawn on one line of stream, ended when a phase is complete"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.length = 0
+
+    def __call__(self, state):
+        line = format_bar(state)
+        self.stream.write('\r' + line + ' ' * (self.length - len(line)))
+        if state['final']:
+            self.stream.write('\n')
+            self.length = 0
+        else:
+            self.length = len(line)
+        self.stream.flush()
+
+
+class JsonRenderer(object):
+    """Renders progress as one JSON object per line of stream, for other programs to follow"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __call__(self, state):
+        self.stream.write(json.dumps(dict(state, event='progress'), sort_keys=True) + '\n')
+        self.stream.flush()
+
+
+RENDERERS = {'bar': BarRenderer, 'json': JsonRenderer}
+
+
+def discovered():
+    if _progress is not None:
+        _progress.add('discovered')
+
+
+def discovery_done():
+    if _progress is not None:
+        _progress.end_discovery()
+
+
+def converted():
+    if _progress is not None:
+        _progress.add('converted')
+
+
+def writing(writes):
+    """starts the write phase, of writes files"""
+    if _progress is not None:
+        _progress.start_writing(writes)
+
+
+def written():
+    if _progress is not None:
+        _progress.add('written')
+
+
+def enable(progress):
+    """
+    Makes progress count the events of conversions from now on.
+    :returns: progress
+    """
+    global _progress, _quiet
+    _progress = progress
+    _quiet = True
+    return progress
+
+
+def disable():
+    global _progress, _quiet
+    _progress = None
+    _quiet = False
+
+
+def get_progress():
+    """:returns: the enabled Progress, None if progress is off"""
+    return _progress
+
+
+def set_quiet(quiet):
+    global _quiet
+    _quiet = quiet
+
+
+def is_quiet():
+    """:returns: True if per file messages are to be left out, as progress is shown"""
+    return _quiet
@@ -0,0 +1,121 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Machine readable report of a run, for converting many repositories unattended.
+"""
+
+import json
+import os
+import re
+
+import catkinize
+
+# lines of converted files that need manual migration: commands left to
+# migrate by hand, and dependencies not known as catkin packages or rosdep
+# keys. Notes on removed commands and the TODOs of the catkin_package()
+# template are in every converted file, so they are no markers.
+MARKER_PATTERN = re.compile(r'CATKIN_MIGRATION(?!: removed)|'
+                            r'TODO: (?:not found in the rosdep database|remove (?:all )?from COMPONENTS)')
+
+
+def find_markers(content):
+    """
+    :returns: list of dicts with line number and text of the lines needing manual migration
+    """
+    markers = []
+    for number, line in enumerate(content.splitlines(), 1):
+        if MARKER_PATTERN.search(line):
+            markers.append({'line': number, 'text': line.strip()})
+    return markers
+
+
+def package_status(changes):
+    """
+    :param changes: the report entries of the changes of one package
+    :returns: 'needs_migration' if a new file has lines to migrate by hand,
+    'converted' if new files were made without any, 'removed' if the package
+    only has files removed
+    """
+    if any(change['markers'] for change in changes):
+        return 'needs_migration'
+    if any(change['newfile'] for change in changes):
+        return 'converted'
+    return 'removed'
+
+
+def make_report(path, changeset, status, profiler=None, error=None):
+    """
+    :param path: the converted package or stack
+    :param status: 'applied', 'declined' or 'failed'
+    :param profiler: Profiler of the run, for stage and package timings
+    :param error: exception the run failed with, if any
+    :returns: dict with the run status and timings, and per package the
+    planned changes with their migration markers and its status, see
+    package_status()
+    """
+    packages = {}
+    order = []
+    for oldfile, backup_file, newfile, content in changeset:
+        # new metapackages are created in a subdirectory of the stack
+        package = os.path.normpath(os.path.dirname(newfile or oldfile))
+        if package not in packages:
+            packages[package] = []
+            order.append(package)
+        packages[package].append({'oldfile': oldfile,
+                                  'backup_file': backup_file,
+                                  'newfile': newfile,
+                                  'size': len(content) if newfile else None,
+                                  'markers': find_markers(content) if newfile else []})
+    timings = {}
+    stages = {}
+    if profiler is not None:
+        for package, (wall, cpu) in profiler.packages.items():
+            timings[os.path.normpath(package)] = {'wall': wall, 'cpu': cpu}
+        for name, (calls, wall, cpu) in profiler.stages.items():
+            stages[name] = {'calls': calls, 'wall': wall, 'cpu': cpu}
+    report = {'version': catkinize.__version__,
+              'path': path,
+              'status': status,
+              'stages': stages,
+              'packages': [{'name': os.path.basename(package),
+                            'path': package,
+                            'status': package_status(packages[package]),
+                            'timings': timings.get(package),
+                            'changes': packages[package],
+                            'markers': sum(len(change['markers']) for change in packages[package])}
+                           for package in order]}
+    if error is not None:
+        report['error'] = '%s: %s' % (type(error).__name__, error)
+    return report
+
+
+def write_report(report, path):
+    with open(path, 'w') as fhand:
+        json.dump(report, fhand, indent=2, sort_keys=True)
+        fhand.write('\n')
@@ -0,0 +1,119 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+"""
+Offline lookup of rosdep keys in the rosdep database files of a local
+directory, such as the rosdep directory of a rosdistro checkout.
+Reading YAML files needs PyYAML, see load_data_file().
+"""
+
+import hashlib
+import os
+import sys
+
+from catkinize.data_file import load_data_file
+
+try:
+    intern = sys.intern
+except AttributeError:
+    pass
+
+# file names of rosdep database files
+DATABASE_EXTENSIONS = ('.yaml', '.yml', '.json')
+
+
+def _load_file(path):
+    """
+    :returns: the rosdep definitions in the file at path, a dict from key to rules
+    :raises: ValueError if the file cannot be parsed
+    """
+    definitions = load_data_file(path, 'rosdep database')
+    if definitions is None:
+        return {}
+    if not isinstance(definitions, dict):
+        raise ValueError('Invalid rosdep database %s: no mapping of keys' % path)
+    return definitions
+
+
+class RosdepResolver(object):
+    """
+    All rosdep keys of the database files in directory, loaded once into a
+    set. Lookups of keys are constant time, the rules of the keys are not
+    kept as conversions only need to know whether a key exists.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        keys = set()
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(DATABASE_EXTENSIONS):
+                keys.update(intern(str(key)) for key in _load_file(os.path.join(directory, filename)))
+        self.keys = frozenset(keys)
+        self._fingerprint = None
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def fingerprint(self):
+        """
+        hash of all keys, for cache keys of conversions using this resolver
+        """
+        if self._fingerprint is None:
+            self._fingerprint = hashlib.sha1('\n'.join(sorted(self.keys)).encode('utf-8')).hexdigest()
+        return self._fingerprint
+
+    def split(self, keys):
+        """
+        :returns: lists of the keys found in the database and of the others, in order
+        """
+        known = []
+        unknown = []
+        for key in keys:
+            if key in self.keys:
+                known.append(key)
+            else:
+                unknown.append(key)
+        return known, unknown
+
+
+# RosdepResolvers by directory, so that a run loads each database once
+_resolvers = {}
+
+
+def get_rosdep_resolver(directory):
+    """
+    :returns: the RosdepResolver of the database files in directory, loaded on first use
+    """
+    directory = os.path.abspath(directory)
+    resolver = _resolvers.get(directory)
+    if resolver is None:
+        resolver = _resolvers[directory] = RosdepResolver(directory)
+    return resolver
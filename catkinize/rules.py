@@ -0,0 +1,140 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+"""
+Rule packs: conversions of in-house rosbuild macros, loaded from YAML or
+JSON files and compiled into the RuleTable of catkinize.convert_cmake.
+
+A rule pack is a list of rules, or a mapping with the list under "rules".
+Each rule names a command and has one action:
+
+  rules:
+    - {name: shop_add_bin, rename: add_executable}
+    - {name: shop_init, remove: true}
+    - {name: shop_add_flags, manual: use target_compile_options()}
+    - {name: shop_add_test, template: "catkin_add_gtest(@1@ test/@1@.cpp)"}
+
+Templates replace @NAME@ by the command name, @ARGS@ by all arguments as
+written and @1@, @2@... by single arguments.
+"""
+
+import json
+import re
+
+from catkinize.convert_cmake import RENAME, REMOVE, MANUAL, TEMPLATE, REMOVED_COMMENT, set_rule_packs
+from catkinize.data_file import parse_data_file
+
+try:
+    basestring
+except NameError:
+    # Python 3
+    basestring = str
+
+ACTIONS = ('rename', 'remove', 'manual', 'template')
+COMMAND_NAME_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _native(text):
+    """JSON gives unicode on Python 2, the converters work on str"""
+    if not isinstance(text, str):
+        text = text.encode('utf-8')
+    return text
+
+
+def compile_rule_pack(data, path):
+    """
+    :param data: the parsed contents of the rule pack file at path
+    :returns: list of (name, action, text) for RuleTable
+    :raises: ValueError for invalid rules
+    """
+    if isinstance(data, dict):
+        data = data.get('rules')
+    if not isinstance(data, list):
+        raise ValueError('Invalid rule pack %s: expected a list of rules' % path)
+    rules = []
+    for index, rule in enumerate(data):
+        where = '%s: rule %d' % (path, index + 1)
+        if not isinstance(rule, dict) or 'name' not in rule:
+            raise ValueError('%s: expected a mapping with a name' % where)
+        name = rule['name']
+        if not isinstance(name, basestring) or not COMMAND_NAME_PATTERN.match(name):
+            raise ValueError('%s: invalid command name %r' % (where, name))
+        actions = [action for action in ACTIONS if action in rule]
+        if len(actions) != 1 or len(rule) != 2:
+            raise ValueError('%s: expected a name and one of %s' % (where, ', '.join(ACTIONS)))
+        action = actions[0]
+        value = rule[action]
+        if action == 'remove':
+            if value is not True:
+                raise ValueError('%s: remove must be true' % where)
+            rules.append((_native(name), REMOVE, REMOVED_COMMENT))
+            continue
+        if not isinstance(value, basestring) or not value.strip():
+            raise ValueError('%s: %s must be a non-empty string' % (where, action))
+        if action == 'rename':
+            if not COMMAND_NAME_PATTERN.match(value):
+                raise ValueError('%s: invalid command name %r' % (where, value))
+            rules.append((_native(name), RENAME, _native(value)))
+        elif action == 'manual':
+            lines = [line if line.startswith('#') else '# ' + line for line in value.strip().splitlines()]
+            rules.append((_native(name), MANUAL, _native('\n# CATKIN_MIGRATION\n' + '\n'.join(lines))))
+        else:
+            rules.append((_native(name), TEMPLATE, _native(value)))
+    return rules
+
+
+def load_rule_pack(path, cache=None):
+    """
+    Reads and compiles the rule pack file at path. With a ConversionCache,
+    compiled packs are kept by the contents of the file, so that a run
+    with unchanged rules does not parse them again.
+    :returns: list of (name, action, text) for RuleTable
+    """
+    with open(path) as fhand:
+        text = fhand.read()
+    key = None
+    if cache is not None:
+        key = cache.key('rule pack', text)
+        # not a conversion, left out of the hits and misses of the run
+        compiled = cache.get(key, count=False)
+        if compiled is not None:
+            return [tuple(_native(field) for field in rule) for rule in json.loads(compiled)]
+    rules = compile_rule_pack(parse_data_file(text, path, 'rule pack'), path)
+    if cache is not None:
+        cache.put(key, json.dumps(rules))
+    return rules
+
+
+def use_rule_packs(paths, cache=None):
+    """
+    Loads the rule packs at paths and makes the conversions of this process
+    use them, later packs overriding earlier ones.
+    :returns: number of rules loaded
+    """
+    packs = [load_rule_pack(path, cache) for path in paths]
+    set_rule_packs(packs)
+    return sum(len(pack) for pack in packs)
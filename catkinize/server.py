@@ -0,0 +1,210 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Long running conversion server, answering JSON requests one per line so
+that many conversions share one process with its compiled rules and caches.
+
+Requests are objects with an "op" and its parameters, and optionally an "id"
+that is copied into the response. Responses are objects with "ok" and either
+the "result" or the "error":
+
+  {"id": 1, "op": "convert_cmake", "project_path": "foo"}
+  {"id": 1, "ok": true, "result": "cmake_minimum_required(..."}
+"""
+
+from __future__ import print_function
+import io
+import json
+import os
+import socket
+import threading
+import xml.etree.ElementTree as ET
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from catkinize.convert_cmake import convert_cmake, rewrite_cmake
+from catkinize.convert_manifest import convert_manifest, parse_manifest
+from catkinize.main import catkinize_package
+
+
+class Server(object):
+    """
+    Handles requests, keeping state between them.
+    :param cache: ConversionCache for catkinize_package, if any
+    :param package_index: PackageIndex of the workspace for CMakeLists.txt conversions, if any
+    :param rosdep_resolver: RosdepResolver to check rosdep keys with, if any
+    """
+
+    def __init__(self, cache=None, package_index=None, rosdep_resolver=None):
+        self.cache = cache
+        self.package_index = package_index
+        self.rosdep_resolver = rosdep_resolver
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self.ops = {'convert_cmake': self.convert_cmake,
+                    'convert_manifest': self.convert_manifest,
+                    'catkinize_package': self.catkinize_package,
+                    'stats': self.stats}
+
+    def convert_cmake(self, project_path, cmakelists_path=None, manifest_xml_path=None, cmakelists=None):
+        """
+        Converts the CMakeLists.txt at cmakelists_path, or the given contents
+        cmakelists, like catkinize_cmakelists.py.
+        """
+        if cmakelists is None:
+            return convert_cmake(project_path, cmakelists_path, manifest_xml_path,
+                                 package_index=self.package_index, rosdep_resolver=self.rosdep_resolver)
+        return rewrite_cmake(cmakelists, project_path, manifest_xml_path, package_index=self.package_index,
+                             rosdep_resolver=self.rosdep_resolver)
+
+    def convert_manifest(self, version, manifest_xml_path=None, package_path=None, manifest_xml=None,
+                         architecture_independent=False, metapackage=False, bugtracker_url='',
+                         replaces=None, conflicts=None):
+        """
+        Converts the manifest.xml at manifest_xml_path, or the given contents
+        manifest_xml, like catkinize_manifest_xml_to_package_xml.py.
+        """
+        if package_path is None:
+            if manifest_xml_path is None:
+                raise ValueError('package_path or manifest_xml_path required')
+            package_path = os.path.dirname(manifest_xml_path)
+        manifest = None
+        if manifest_xml is not None:
+            manifest = parse_manifest(manifest_xml)
+        result = convert_manifest(package_path, manifest_xml_path, version, architecture_independent,
+                                  metapackage, bugtracker_url, replaces, conflicts, manifest,
+                                  self.rosdep_resolver)
+        if result is None:
+            raise ValueError('Invalid manifest %s' % manifest_xml_path)
+        return result
+
+    def catkinize_package(self, path, version):
+        """
+        :returns: the changes of catkinize_package as lists of oldfile, backupfile, newfile, contents
+        """
+        return [list(change) for change in catkinize_package(path, version, self.cache,
+                                                                   package_index=self.package_index,
+                                                                   rosdep_resolver=self.rosdep_resolver)]
+
+    def stats(self):
+        stats = {'requests': self.requests, 'errors': self.errors}
+        if self.cache is not None:
+            stats.update(cache_hits=self.cache.hits, cache_misses=self.cache.misses)
+        return stats
+
+    def handle(self, request):
+        """
+        :param request: dict with op, its parameters and an optional id
+        :returns: response dict
+        """
+        with self._lock:
+            self.requests += 1
+        response = {'id': None, 'ok': False}
+        try:
+            if not isinstance(request, dict):
+                raise ValueError('Request must be a JSON object')
+            params = dict(request)
+            response['id'] = params.pop('id', None)
+            op = params.pop('op', None)
+            if op not in self.ops:
+                raise ValueError('Unknown op %r, expected one of %s' % (op, ', '.join(sorted(self.ops))))
+            # parameters must be valid identifiers to be passed as keywords
+            params = dict((str(key), value) for key, value in params.items())
+            response['result'] = self.ops[op](**params)
+            response['ok'] = True
+        except (ValueError, TypeError, IOError, OSError, ET.ParseError) as err:
+            with self._lock:
+                self.errors += 1
+            response['error'] = '%s: %s' % (type(err).__name__, err)
+        return response
+
+    def serve(self, instream, outstream):
+        """
+        Answers the requests read from instream, one JSON object per line,
+        writing a response line per request to outstream, until instream ends.
+        """
+        for line in iter(instream.readline, ''):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as err:
+                response = {'id': None, 'ok': False, 'error': 'ValueError: %s' % err}
+                with self._lock:
+                    self.requests += 1
+                    self.errors += 1
+            else:
+                response = self.handle(request)
+            outstream.write(json.dumps(response) + '\n')
+            outstream.flush()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        if bytes is str:
+            self.server.catkinize_server.serve(self.rfile, self.wfile)
+            return
+        # Python 3 sockets read and write bytes, serve() lines of text
+        rfile = io.TextIOWrapper(self.rfile, 'utf-8')
+        wfile = io.TextIOWrapper(self.wfile, 'utf-8', write_through=True)
+        try:
+            self.server.catkinize_server.serve(rfile, wfile)
+        finally:
+            # leave closing the socket files to the request handler
+            rfile.detach()
+            wfile.detach()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_unix_server(path, server):
+    """
+    :returns: SocketServer answering requests to server on the Unix socket
+    at path, one thread per connection; call serve_forever() on it
+    """
+    if os.path.exists(path):
+        # left from an earlier server, unless one is still listening
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except socket.error:
+            os.remove(path)
+        else:
+            raise ValueError('Server already listening on %s' % path)
+        finally:
+            probe.close()
+    unix_server = _UnixServer(path, _Handler)
+    unix_server.catkinize_server = server
+    return unix_server
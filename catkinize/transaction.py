@@ -0,0 +1,258 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Applies changesets crash safely. New files are first written next to their
+targets and synced, then committed with atomic renames. A journal records
+the progress, so that an interrupted run can be resumed or rolled back.
+"""
+
+import errno
+import json
+import os
+from multiprocessing.pool import ThreadPool
+
+from catkinize import profiling, progress
+
+JOURNAL_NAME = '.catkinize.journal'
+STAGED_SUFFIX = '.catkinize-new'
+# threads writing files, writes are mostly waiting on the file system
+WRITE_JOBS = 8
+# journal records written between two syncs of the journal
+SYNC_BATCH = 64
+
+
+def _makedirs(path):
+    """
+    Creates directory path and its parents, unless they exist, also when
+    created concurrently.
+    """
+    try:
+        os.makedirs(path)
+    except OSError as err:
+        if err.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
+
+
+def _sync_directory(path):
+    """
+    Syncs the entries of directory path, so that renames survive a crash.
+    Not all platforms can open directories, there this is a no-op.
+    """
+    try:
+        handle = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(handle)
+    except OSError:
+        pass
+    finally:
+        os.close(handle)
+
+
+def _absolute(path):
+    return path and os.path.abspath(path)
+
+
+def journal_path(changeset):
+    """
+    :returns: default journal location, in the innermost directory containing all files of changeset
+    """
+    paths = [os.path.abspath(os.path.dirname(path))
+             for change in changeset for path in (change[0], change[1], change[2]) if path]
+    common = os.path.commonprefix([path.split(os.sep) for path in paths])
+    return os.path.join(os.sep.join(common) or os.sep, JOURNAL_NAME)
+
+
+def _missing_directories(changes):
+    """
+    :returns: directories that have to be created for the new files, parents first
+    """
+    missing = set()
+    for _, _, newfile in changes:
+        directory = newfile and os.path.dirname(newfile)
+        while directory and not os.path.isdir(directory) and directory not in missing:
+            missing.add(directory)
+            directory = os.path.dirname(directory)
+    return sorted(missing, key=len)
+
+
+def _log(fhand, record, sync=False):
+    fhand.write(json.dumps(record) + '\n')
+    fhand.flush()
+    if sync:
+        os.fsync(fhand.fileno())
+
+
+def _read_journal(journal):
+    """
+    :returns: changes and directories of the journal header, whether staging
+    finished and the set of indices of committed changes
+    """
+    with open(journal) as fhand:
+        lines = fhand.read().splitlines()
+    header = json.loads(lines[0])
+    staged = False
+    done = set()
+    for line in lines[1:]:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # last record cut short by a crash
+            break
+        staged = staged or record.get('staged', False)
+        if 'done' in record:
+            done.add(record['done'])
+    return [tuple(change) for change in header['changes']], header['directories'], staged, done
+
+
+def _stage(args):
+    newfile, change = args
+    with profiling.stage('write file', path=newfile):
+        _makedirs(os.path.dirname(newfile))
+        with open(newfile + STAGED_SUFFIX, 'w') as fhand:
+            # contents are produced here, not all held at once
+            fhand.write(change[3])
+            fhand.flush()
+            os.fsync(fhand.fileno())
+
+
+def _commit(changes, fhand, report, done=(), resuming=False):
+    """
+    Renames the files of all changes not in done, logging each to the journal fhand.
+    When resuming, renames that happened before the interruption are skipped.
+    """
+    directories = set()
+    for index, (oldfile, backup_file, newfile) in enumerate(changes):
+        if index in done:
+            continue
+        if oldfile and not (resuming and os.path.lexists(backup_file)):
+            os.rename(oldfile, backup_file)
+            directories.add(os.path.dirname(backup_file))
+            report('Backed up file: %s  ==>  %s ' % (oldfile, backup_file))
+        if newfile and not (resuming and not os.path.lexists(newfile + STAGED_SUFFIX)):
+            os.rename(newfile + STAGED_SUFFIX, newfile)
+            directories.add(os.path.dirname(newfile))
+            report('Wrote new file %s' % newfile)
+        _log(fhand, {'done': index}, sync=(index + 1) % SYNC_BATCH == 0)
+    os.fsync(fhand.fileno())
+    for directory in directories:
+        _sync_directory(directory)
+
+
+def _ignore(message):
+    pass
+
+
+def apply_changes(changeset, journal=None, jobs=WRITE_JOBS, report=_ignore):
+    """
+    Performs changeset, a list of Changes or 4-tuples of oldfile, backupfile, newfile, contents.
+    New files are written by a pool of jobs threads first. If that fails,
+    nothing was changed. Then the old files are renamed to their backups and
+    the new files into place in the order of changeset. If that fails, the
+    journal is left for resume_changes or rollback_changes.
+    :param journal: journal file, by default in the directory containing all files
+    :param report: called with a message for every renamed file
+    """
+    if journal is None:
+        journal = journal_path(changeset)
+    if os.path.exists(journal):
+        raise ValueError('Unfinished changes recorded in %s, resume or roll back first' % journal)
+    changes = [(_absolute(change[0]), _absolute(change[1]), _absolute(change[2]))
+               for change in changeset]
+    directories = _missing_directories(changes)
+    _makedirs(os.path.dirname(os.path.abspath(journal)))
+    with open(journal, 'w') as fhand:
+        _log(fhand, {'changes': changes, 'directories': directories}, sync=True)
+        writes = [(newfile, change) for (_, _, newfile), change in zip(changes, changeset)
+                  if newfile]
+        progress.writing(len(writes))
+        try:
+            if jobs > 1 and len(writes) > 1:
+                pool = ThreadPool(min(jobs, len(writes)))
+                try:
+                    for _ in pool.imap_unordered(_stage, writes):
+                        progress.written()
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                for write in writes:
+                    _stage(write)
+                    progress.written()
+            for directory in set(os.path.dirname(newfile) for newfile, _ in writes):
+                _sync_directory(directory)
+        except:
+            fhand.close()
+            rollback_changes(journal)
+            raise
+        _log(fhand, {'staged': True}, sync=True)
+        _commit(changes, fhand, report)
+    os.remove(journal)
+
+
+def resume_changes(journal, report=_ignore):
+    """
+    Finishes the changes of an interrupted apply_changes, skipping those already done.
+    If writing the new files had not finished, nothing was changed and
+    everything is rolled back instead.
+    :returns: True if the changes were finished, False if rolled back
+    """
+    changes, _, staged, done = _read_journal(journal)
+    if not staged:
+        rollback_changes(journal, report)
+        return False
+    with open(journal, 'a') as fhand:
+        _commit(changes, fhand, report, done, resuming=True)
+    os.remove(journal)
+    return True
+
+
+def rollback_changes(journal, report=_ignore):
+    """
+    Undoes the changes of an interrupted apply_changes, restoring the backed up files.
+    """
+    changes, directories, staged, _ = _read_journal(journal)
+    for oldfile, backup_file, newfile in reversed(changes):
+        if newfile:
+            if os.path.lexists(newfile + STAGED_SUFFIX):
+                os.remove(newfile + STAGED_SUFFIX)
+            elif staged and os.path.lexists(newfile):
+                # was renamed into place
+                os.remove(newfile)
+                report('Removed new file %s' % newfile)
+        if oldfile and os.path.lexists(backup_file) and not os.path.lexists(oldfile):
+            os.rename(backup_file, oldfile)
+            report('Restored file: %s  ==>  %s ' % (backup_file, oldfile))
+    os.remove(journal)
+    for directory in reversed(directories):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
@@ -0,0 +1,124 @@
+#
+# Copyright (c) 2012, Willow Garage, Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#     * Redistributions of source code must retain the above copyright
+#       notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright
+#       notice, this list of conditions and the following disclaimer in the
+#       documentation and/or other materials provided with the distribution.
+#     * Neither the name of the Willow Garage, Inc. nor the names of its
+#       contributors may be used to endorse or promote products derived from
+#       this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+"""
+Polling of package files, to convert packages again as soon as their files
+change.
+"""
+
+import hashlib
+import os
+import time
+
+# files modified less than this many seconds before a snapshot are also
+# compared by contents, as file systems with a coarse mtime resolution may
+# not show a second change within that time
+HASH_WINDOW = 2.0
+
+
+def _digest(path):
+    try:
+        with open(path, 'rb') as fhand:
+            return hashlib.sha1(fhand.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+
+
+class Watcher(object):
+    """
+    Detects changes of a fixed set of files by comparing snapshots of their
+    mtime and size, falling back to hashing the contents of files that were
+    modified too recently for the mtime to tell.
+    """
+
+    def __init__(self, paths):
+        self.snapshots = {}
+        for path in paths:
+            self.snapshots[path] = self._snapshot(path)
+
+    def _snapshot(self, path, digest=None):
+        """
+        :returns: (mtime, size, digest or None), None for a missing file
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_mtime < time.time() - HASH_WINDOW:
+            return (stat.st_mtime, stat.st_size, None)
+        return (stat.st_mtime, stat.st_size, digest or _digest(path))
+
+    def poll(self):
+        """
+        :returns: list of the files that changed since the last poll
+        """
+        changed = []
+        for path, old in self.snapshots.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            if stat is None or old is None:
+                if stat is not None or old is not None:
+                    changed.append(path)
+                    self.snapshots[path] = self._snapshot(path)
+                continue
+            if (stat.st_mtime, stat.st_size) != old[:2]:
+                changed.append(path)
+                self.snapshots[path] = self._snapshot(path)
+            elif old[2] is not None:
+                digest = _digest(path)
+                if digest != old[2]:
+                    changed.append(path)
+                self.snapshots[path] = self._snapshot(path, digest)
+        return changed
+
+
+def watch_packages(packages, convert, interval=0.05, polls=None):
+    """
+    Calls convert(package) whenever one of the files of a package changes.
+    The set of packages is fixed, only their files are polled.
+
+    :param packages: dict from package to the list of its files to watch
+    :param interval: seconds between polls
+    :param polls: number of polls before returning, None to poll forever
+    """
+    owners = {}
+    for package, paths in packages.items():
+        for path in paths:
+            owners.setdefault(path, []).append(package)
+    watcher = Watcher(owners.keys())
+    while polls is None or polls > 0:
+        time.sleep(interval)
+        changed_packages = set()
+        for path in watcher.poll():
+            changed_packages.update(owners[path])
+        for package in sorted(changed_packages):
+            convert(package)
+        if polls is not None:
+            polls -= 1
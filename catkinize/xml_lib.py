@@ -21,6 +21,9 @@ class Empty(object):
     def getchildren(self):
         return []
 
+    def __iter__(self):
+        return iter([])
+
 
 def comment_out_tags_named(xml, tag_name):
     """
@@ -29,6 +32,7 @@ def comment_out_tags_named(xml, tag_name):
     >>> comment_out_tags_named('<a/><b/><c></c><b q="foo">bop</b><d>', 'b')
     '<a/><!-- <b/> --><c></c><!-- <b q="foo">bop</b> --><d>'
     """
+    tag_name = re.escape(tag_name)
     rx1 = re.compile('(\\b%s/>)' % tag_name)
     rx2 = re.compile('(<%s\\b)' % tag_name)
     rx3 = re.compile('(</%s>)' % tag_name)
@@ -36,38 +36,150 @@ from __future__ import print_function
 import os
 import sys
 import argparse
-from catkinize.convert_cmake import convert_cmake
+import glob
+import xml.etree.ElementTree as ET
+from catkinize.batch import convert_cmake_task, expand_paths, output_path, run_batch
+from catkinize.convert_cmake import get_rule_packs, iter_convert_cmake, read_chunks, set_rule_packs
+from catkinize.main import find_packages
+from catkinize.rules import use_rule_packs
+from catkinize.watch import watch_packages
 
 
-def main(argv, outstream):
+def main(argv, outstream, instream=sys.stdin):
     """
-    reads file and prints converted file to stdout
+    reads file and prints converted file to stdout. With '-' as project_path
+    or cmakelists_path, reads CMakeLists.txt from stdin.
     """
     parser = argparse.ArgumentParser(description='writes converted version of CMakeLists.txt to stdout')
-    parser.add_argument('project_path',
-                        nargs='?',
+    parser.add_argument('paths',
+                        nargs='*',
+                        metavar='path',
+                        help='project_path [cmakelists_path [manifest_xml_path]]: the path to the package, '
+                        'or - to filter stdin in the current directory, the path to the CMakeLists.txt, '
+                        'or - for stdin, and the path to the manifest.xml. '
+                        'Several package paths or globs convert all of them in batch mode')
+    parser.add_argument('--watch',
+                        action='store_true',
+                        help='keep running and print the converted CMakeLists.txt again whenever it or the manifest.xml changes. '
+                        'If project_path is no package, watches all packages below')
+    parser.add_argument('--interval',
+                        type=float,
+                        default=0.05,
+                        help='seconds between checks for changes in watch mode (default: %(default)s)')
+    parser.add_argument('--rules',
+                        action='append',
+                        default=[],
+                        metavar='FILE',
+                        help='also convert commands by the rules in this YAML or JSON rule pack, '
+                        'which may be given several times, later packs overriding earlier ones')
+    parser.add_argument('--from-file',
+                        metavar='FILE',
+                        help='convert the packages listed in FILE, one per line, or - for stdin, in batch mode')
+    parser.add_argument('-o', '--output-dir',
+                        help='in batch mode, write each CMakeLists.txt below OUTPUT_DIR at the path of its package')
+    parser.add_argument('--json',
+                        action='store_true',
+                        help='batch mode even for a single package, writing JSON lines with path, ok, '
+                        'and result or error to stdout. This is the default in batch mode without --output-dir')
+    parser.add_argument('-j', '--jobs',
+                        type=int,
                         default=None,
-                        help='The path to the package')
-    parser.add_argument('cmakelists_path',
-                        nargs='?',
-                        default=None,
-                        help='path to the CMakeLists.txt')
-    parser.add_argument('manifest_xml_path',
-                        nargs='?',
-                        default=None,
-                        help='path to the manifest.xml')
+                        help='number of packages converted in parallel in batch mode (default: one per CPU)')
     # Parse args
     args = parser.parse_args(argv)
-    project_path = args.project_path or os.getcwd()
+    if args.rules:
+        use_rule_packs(args.rules)
+    if len(args.paths) > 3 or args.from_file or args.output_dir or args.json or \
+            any(glob.has_magic(path) for path in args.paths) or \
+            (len(args.paths) > 1 and os.path.isdir(args.paths[1])):
+        if args.watch:
+            parser.error('cannot watch in batch mode')
+        return convert_batch(args, outstream, instream)
+    if args.jobs is not None:
+        parser.error('--jobs needs batch mode')
+    args.paths.extend([None] * (3 - len(args.paths)))
+    project_path, cmakelists_path, args.manifest_xml_path = args.paths
+    project_path = project_path or os.getcwd()
+    if project_path == '-':
+        project_path = os.getcwd()
+        cmakelists_path = '-'
+    if args.watch:
+        if cmakelists_path == '-':
+            parser.error('cannot watch stdin')
+        watch(project_path, cmakelists_path, args.manifest_xml_path, outstream, args.interval)
+        return
+    if not cmakelists_path:
+        cmakelists_path = os.path.join(project_path, 'CMakeLists.txt')
 
     # Convert CMakeLists.txt
-    print(
-        convert_cmake(
-            project_path,
-            args.cmakelists_path,
-            args.manifest_xml_path),
-        file=outstream)
+    if cmakelists_path == '-':
+        convert_stream(instream, outstream, project_path, args.manifest_xml_path)
+    else:
+        print('Converting %s' % cmakelists_path, file=sys.stderr)
+        with open(cmakelists_path, 'r') as f_in:
+            convert_stream(f_in, outstream, project_path, args.manifest_xml_path)
+
+
+def convert_batch(args, outstream, instream):
+    """
+    converts all packages given by args in parallel, writing them below the
+    output directory or as JSON lines to outstream.
+    :returns: exit status, 1 if any package could not be converted
+    """
+    packages = expand_paths(args.paths, args.from_file, instream)
+    if args.output_dir:
+        def output(package):
+            return output_path(args.output_dir, package, 'CMakeLists.txt')
+    else:
+        output = None
+    failed = run_batch(convert_cmake_task, packages, args.jobs, output, outstream,
+                       initializer=set_rule_packs, initargs=(get_rule_packs(),))
+    print('Converted %d of %d packages' % (len(packages) - failed, len(packages)), file=sys.stderr)
+    return 1 if failed else 0
+
+
+def convert_stream(instream, outstream, project_path, manifest_xml_path):
+    """
+    writes the converted contents of instream to outstream chunk by chunk
+    """
+    for chunk in iter_convert_cmake(read_chunks(instream), project_path, manifest_xml_path):
+        outstream.write(chunk)
+    outstream.write('\n')
+    outstream.flush()
+
+
+def watch(project_path, cmakelists_path, manifest_xml_path, outstream, interval):
+    """
+    converts the package at project_path, or all packages below, whenever their files change.
+    Packages are looked up once at startup.
+    """
+    if cmakelists_path or manifest_xml_path or os.path.isfile(os.path.join(project_path, 'manifest.xml')):
+        package_files = {project_path: [cmakelists_path or os.path.join(project_path, 'CMakeLists.txt'),
+                                        manifest_xml_path or os.path.join(project_path, 'manifest.xml')]}
+    else:
+        package_files = {}
+        for package in find_packages(project_path):
+            package_files[package] = [os.path.join(package, 'CMakeLists.txt'),
+                                      os.path.join(package, 'manifest.xml')]
+
+    def convert(package):
+        package_cmakelists_path, package_manifest_xml_path = package_files[package]
+        if len(package_files) > 1:
+            outstream.write('==> %s <==\n' % package_cmakelists_path)
+        try:
+            with open(package_cmakelists_path, 'r') as f_in:
+                convert_stream(f_in, outstream, package, package_manifest_xml_path)
+        except (IOError, ValueError, ET.ParseError) as exc:
+            print('Could not convert %s: %s' % (package_cmakelists_path, exc), file=sys.stderr)
+
+    if len(package_files) == 1:
+        convert(project_path)
+    print('Watching %d packages' % len(package_files), file=sys.stderr)
+    try:
+        watch_packages(package_files, convert, interval)
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == '__main__':
-    main(argv=sys.argv[1:], outstream=sys.stdout)
+    sys.exit(main(argv=sys.argv[1:], outstream=sys.stdout))
@@ -30,14 +30,18 @@
 
 
 '''Script to generate package.xml from manifest.xml'''
+from __future__ import print_function
 import os
+import sys
 from optparse import OptionParser
 
+from catkinize.batch import convert_manifest_task, expand_paths, output_path, run_batch
 from catkinize.convert_manifest import convert_manifest
 
 
 def main():
-    usage = 'usage: %prog [options] manifest_xml_path package_name version'
+    usage = '''usage: %prog [options] manifest_xml_path package_name version
+       %prog [options] --package-version version [manifest_xml_path|package_path ...]'''
     parser = OptionParser(usage)
     parser.add_option('-a', '--architecture_independent',
                       dest='architecture_independent',
@@ -61,7 +65,33 @@ def main():
                       type='string', default='',
                       help='Comma-separated list of pkgs conflicting ' +
                            'with this package')
+    parser.add_option('--package-version',
+                      dest='package_version',
+                      type='string', default=None,
+                      help='Batch mode: convert all manifests given as ' +
+                           'paths, package paths or globs to this version')
+    parser.add_option('--from-file',
+                      dest='from_file',
+                      type='string', default=None,
+                      help='In batch mode, also convert the manifests ' +
+                           'listed in this file, one per line, - for stdin')
+    parser.add_option('-o', '--output-dir',
+                      dest='output_dir',
+                      type='string', default=None,
+                      help='In batch mode, write each package.xml below ' +
+                           'this directory at the path of its package. ' +
+                           'Without it, JSON lines with path, ok, and ' +
+                           'result or error are written to stdout')
+    parser.add_option('-j', '--jobs',
+                      dest='jobs',
+                      type='int', default=None,
+                      help='Number of manifests converted in parallel in ' +
+                           'batch mode (default: one per CPU)')
     options, args = parser.parse_args()
+    if options.package_version is not None:
+        return convert_batch(options, args)
+    if options.from_file or options.output_dir or options.jobs is not None:
+        parser.error('--from-file, --output-dir and --jobs need --package-version')
     if len(args) != 3:
         parser.error('wrong number of arguments %s' % len(args))
 
@@ -78,5 +108,32 @@ def main():
                            options.conflicts))
 
 
+def convert_batch(options, args):
+    '''
+    Converts all manifests given by args and options.from_file in parallel.
+    :returns: exit status, 1 if any manifest could not be converted
+    '''
+    tasks = []
+    for path in expand_paths(args, options.from_file):
+        if os.path.isdir(path):
+            path = os.path.join(path, 'manifest.xml')
+        tasks.append((os.path.dirname(path),
+                      path,
+                      options.package_version,
+                      options.architecture_independent,
+                      options.metapackage,
+                      options.bugtracker_url,
+                      options.replaces,
+                      options.conflicts))
+    if options.output_dir:
+        def output(manifest_xml_path):
+            return output_path(options.output_dir, os.path.dirname(manifest_xml_path), 'package.xml')
+    else:
+        output = None
+    failed = run_batch(convert_manifest_task, tasks, options.jobs, output, sys.stdout)
+    print('Converted %d of %d manifests' % (len(tasks) - failed, len(tasks)), file=sys.stderr)
+    return 1 if failed else 0
+
+
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
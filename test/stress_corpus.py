@@ -0,0 +1,86 @@
+'''
+Generators of pathological inputs for the converters: very long CMake files,
+deeply nested and unterminated command invocations, and manifests with
+thousands of dependencies. Each generator takes a size and returns a string,
+so that the same input can be made at several sizes to check scaling.
+'''
+
+ROSBUILD_LINES = [
+    'rosbuild_add_executable(node_%(n)d src/node_%(n)d.cpp)',
+    '  target_link_libraries(node_%(n)d ${catkin_LIBRARIES} "quoted ) arg")',
+    '# rosbuild_add_library(commented_%(n)d src/lib.cpp)',
+    'if(NOT DEFINED VAR_%(n)d AND (A OR B))',
+    '  set(VAR_%(n)d [[bracket ( argument]] # trailing comment',
+    '      more_%(n)d)',
+    'endif()',
+    'rosbuild_add_boost_directories()',
+    'rosbuild_link_boost(node_%(n)d thread system)',
+    'rosbuild_add_gtest(test_%(n)d test/test_%(n)d.cpp)',
+]
+
+
+def long_cmakelists(lines):
+    """a CMakeLists.txt of typical rosbuild commands, lines long"""
+    return '\n'.join(ROSBUILD_LINES[n % len(ROSBUILD_LINES)] % {'n': n} for n in range(lines)) + '\n'
+
+
+def deep_nesting(depth):
+    """a condition with depth levels of nested parentheses"""
+    return 'if(%sA%s)\nendif()\n' % ('(' * depth, ')' * depth)
+
+
+def long_arguments(count):
+    """a single command with count arguments, one per line"""
+    return 'set(SOURCES\n%s)\n' % ''.join('  src/file_%d.cpp\n' % n for n in range(count))
+
+
+def unterminated_call(lines):
+    """a command whose arguments run to the end of the file"""
+    return 'rosbuild_init()\nrosbuild_add_executable(foo\n' + '  src/foo.cpp\n' * lines
+
+
+def unterminated_quote(lines):
+    """a quoted argument that is never closed"""
+    return 'message("never closed\n' + 'text ( with ) parens\n' * lines
+
+
+def unbalanced_parens(count):
+    """a command with count opening parentheses that are never closed"""
+    return 'if(' + '(A ' * count + '\n'
+
+
+def long_identifier(length):
+    """one name without parentheses, which a backtracking pattern scans again from every position"""
+    return 'a' * length + '\n'
+
+
+def many_depends(count):
+    """a manifest.xml with count package and system dependencies"""
+    depends = ''.join('  <depend package="pkg_%d"/>\n  <rosdep name="sys_%d"/>\n' % (n, n)
+                      for n in range(count))
+    return ('<package>\n'
+            '  <description brief="stress">many dependencies</description>\n'
+            '  <author>%s</author>\n'
+            '  <license>BSD</license>\n'
+            '%s'
+            '</package>\n') % (', '.join('Author %d/a%d@example.com' % (n, n) for n in range(count // 10 + 1)),
+                               depends)
+
+
+def many_tags(count):
+    """a package.xml with count test_depend tags to comment out"""
+    return '<package>\n%s</package>\n' % ''.join('  <test_depend>pkg_%d</test_depend>\n  <build_depend/>\n' % n
+                                                   for n in range(count))
+
+
+# CMake inputs at their full size, with the syntax error each must be
+# rejected with, if any
+CMAKE_CORPUS = [
+    (long_cmakelists, 50000, None),
+    (deep_nesting, 10000, None),
+    (long_arguments, 50000, None),
+    (long_identifier, 100000, None),
+    (unterminated_call, 50000, 'Unterminated command invocation at line 2'),
+    (unterminated_quote, 50000, 'Unterminated quoted argument at line 1'),
+    (unbalanced_parens, 10000, 'Unterminated command invocation at line 1'),
+]
@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import imp
+imp.load_source('catkinize_cmakelists',
+                os.path.join(os.path.dirname(__file__),
+                             '..', 'scripts', 'catkinize_cmakelists.py'))
+
+from catkinize_cmakelists import main
+from catkinize.batch import convert_cmake_task, convert_manifest_task, expand_paths, output_path, run_batch
+from catkinize.convert_cmake import convert_cmake, set_rule_packs
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.packages = []
+        for case in ['navfn', 'rpekf', 'stage']:
+            package = os.path.join(self.root_dir, 'src', case)
+            os.makedirs(package)
+            shutil.copy(os.path.join(FIXTURES, 'CMakeLists.%s.txt.in' % case),
+                        os.path.join(package, 'CMakeLists.txt'))
+            shutil.copy(os.path.join(FIXTURES, 'manifest.%s.xml' % case),
+                        os.path.join(package, 'manifest.xml'))
+            self.packages.append(package)
+        self.stderr = sys.stderr
+        sys.stderr = StringIO()
+
+    def tearDown(self):
+        sys.stderr = self.stderr
+        shutil.rmtree(self.root_dir)
+
+    def test_expand_paths(self):
+        listing = os.path.join(self.root_dir, 'packages.txt')
+        with open(listing, 'w') as fhand:
+            fhand.write('# packages\n%s\n\n%s\n' % (self.packages[2], os.path.join(self.root_dir, 'other')))
+        self.assertEqual(self.packages + [os.path.join(self.root_dir, 'other')],
+                         expand_paths([os.path.join(self.root_dir, 'src', '*')], listing))
+        self.assertEqual(['foo', 'bar'], expand_paths(['foo'], '-', StringIO('bar\nfoo\n')))
+        self.assertEqual([], expand_paths([os.path.join(self.root_dir, 'none', '*')]))
+
+    def test_output_path(self):
+        self.assertEqual(os.path.join('out', 'src', 'foo', 'package.xml'),
+                         output_path('out', os.path.join('src', 'foo'), 'package.xml'))
+        self.assertEqual(os.path.join('out', 'foo', 'package.xml'),
+                         output_path('out', os.path.join('src', '..', 'foo'), 'package.xml'))
+        self.assertEqual(os.path.join('out', 'outside', 'foo', 'package.xml'),
+                         output_path('out', os.path.join(os.sep, 'outside', 'foo'), 'package.xml'))
+
+    def test_tasks(self):
+        path, ok, result = convert_cmake_task(self.packages[0])
+        self.assertEqual((self.packages[0], True), (path, ok))
+        self.assertEqual(convert_cmake(self.packages[0]) + '\n', result)
+        missing = os.path.join(self.root_dir, 'missing')
+        self.assertEqual((missing, False), convert_cmake_task(missing)[:2])
+        manifest = os.path.join(self.packages[1], 'manifest.xml')
+        path, ok, result = convert_manifest_task((self.packages[1], manifest, '1.2.3'))
+        self.assertEqual((manifest, True), (path, ok))
+        self.assertTrue('<version>1.2.3</version>' in result, result)
+        with open(manifest, 'w') as fhand:
+            fhand.write('<package')
+        self.assertEqual((manifest, False), convert_manifest_task((self.packages[1], manifest, '1.2.3'))[:2])
+
+    def test_run_batch_json(self):
+        missing = os.path.join(self.root_dir, 'missing')
+        outstream = StringIO()
+        self.assertEqual(1, run_batch(convert_cmake_task, self.packages + [missing], 2, output_file=outstream))
+        records = [json.loads(line) for line in outstream.getvalue().splitlines()]
+        self.assertEqual(self.packages + [missing], [record['path'] for record in records])
+        self.assertEqual([True, True, True, False], [record['ok'] for record in records])
+        self.assertEqual(convert_cmake(self.packages[2]) + '\n', records[2]['result'])
+        self.assertTrue(records[3]['error'])
+
+    def test_main_output_dir(self):
+        output_dir = os.path.join(self.root_dir, 'out')
+        cwd = os.getcwd()
+        os.chdir(self.root_dir)
+        try:
+            self.assertEqual(0, main(['src/*', '-o', output_dir, '-j', '2'], outstream=StringIO()))
+        finally:
+            os.chdir(cwd)
+        for case, package in zip(['navfn', 'rpekf', 'stage'], self.packages):
+            expect = StringIO()
+            main([package], outstream=expect)
+            with open(os.path.join(output_dir, 'src', case, 'CMakeLists.txt')) as fhand:
+                self.assertEqual(expect.getvalue(), fhand.read())
+
+    def test_main_json(self):
+        outstream = StringIO()
+        self.assertEqual(0, main(['--from-file', '-'], outstream=outstream,
+                                 instream=StringIO('\n'.join(self.packages))))
+        self.assertEqual(self.packages, [json.loads(line)['path'] for line in outstream.getvalue().splitlines()])
+        outstream = StringIO()
+        self.assertEqual(0, main(self.packages[:2], outstream=outstream))
+        self.assertEqual(2, len(outstream.getvalue().splitlines()))
+
+    def test_main_rules(self):
+        rules = os.path.join(self.root_dir, 'rules.json')
+        with open(rules, 'w') as fhand:
+            fhand.write('[{"name": "rosbuild_add_executable", "template": "shop_add_bin(@ARGS@)"}]')
+        outstream = StringIO()
+        try:
+            self.assertEqual(0, main(['--rules', rules, '-j', '2'] + self.packages, outstream=outstream))
+        finally:
+            set_rule_packs(())
+        for line in outstream.getvalue().splitlines():
+            result = json.loads(line)['result']
+            self.assertTrue('shop_add_bin(' in result and 'add_executable(' not in result, result)
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from catkinize.cache import ConversionCache
+
+
+class ConversionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_key(self):
+        cache = ConversionCache(self.cache_dir)
+        self.assertEqual(cache.key('a', 'bc'), cache.key('a', 'bc'))
+        self.assertNotEqual(cache.key('a', 'bc'), cache.key('ab', 'c'))
+        self.assertNotEqual(cache.key('a', 'bc'), cache.key('a', 'bc', False))
+
+    def test_get_put(self):
+        cache = ConversionCache(self.cache_dir)
+        key = cache.key('foo')
+        self.assertEqual(None, cache.get(key))
+        cache.put(key, 'bar')
+        self.assertEqual('bar', cache.get(key))
+        self.assertEqual('bar', ConversionCache(self.cache_dir).get(key))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_prune(self):
+        cache = ConversionCache(self.cache_dir, max_size=10)
+        keys = [cache.key(str(i)) for i in range(3)]
+        for count, key in enumerate(keys):
+            cache.put(key, 'x' * 5)
+            os.utime(cache._path(key), (time.time() - 100 + count, time.time() - 100 + count))
+        # reading marks the oldest entry as recently used
+        cache.get(keys[0])
+        self.assertEqual(1, cache.prune())
+        self.assertEqual(None, cache.get(keys[1]))
+        self.assertEqual('xxxxx', cache.get(keys[0]))
+        self.assertEqual('xxxxx', cache.get(keys[2]))
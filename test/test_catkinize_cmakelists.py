@@ -1,8 +1,12 @@
+import os
 import unittest
 
 from catkinize.convert_cmake import make_header_lines, convert_snippet, \
     convert_boost_snippet, ARGUMENT_SPLITTER, FUNCALL_PATTERN, \
-    make_package_lines
+    make_package_lines, RuleTable, convert_cmake, iter_convert_cmake, rewrite_cmake
+from catkinize.convert_manifest import parse_manifest
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
 
 
 class CatkinizeCmakeTest(unittest.TestCase):
@@ -10,11 +14,39 @@ class CatkinizeCmakeTest(unittest.TestCase):
     def test_convert_snippet(self):
         self.assertEqual(' catkin_add_gtest(bar)', convert_snippet(' rosbuild_add_gtest', '(bar)'))
         self.assertEqual(' catkin_add_nosetests(bar)', convert_snippet(' rosbuild_add_pyunit', '(bar)'))
+        self.assertEqual('\n# CATKIN_MIGRATION: removed during catkin migration\n# rosbuild_init()',
+                         convert_snippet('rosbuild_init', '()'))
+        self.assertEqual('\n# CATKIN_MIGRATION\n# use bloom tool\n# rosbuild_make_distribution(1.0)',
+                         convert_snippet('rosbuild_make_distribution', '(1.0)'))
+        self.assertEqual('include(foo)', convert_snippet('include', '(foo)'))
+        self.assertEqual('add_definitions(-DFOO)', convert_snippet('add_definitions', '(-DFOO)'))
+
+    def test_rule_table(self):
+        table = RuleTable([('foo', 'bar'), ('foo', None)], [('foo', '# manual'), ('baz', '# manual')])
+        self.assertEqual('  bar(x)', table.convert('  foo', '(x)'))
+        self.assertEqual('\n# CATKIN_MIGRATION\n# manual\n# baz(x)', table.convert('baz', '(x)'))
+        self.assertEqual('add_message_files(\n  FILES\n  # TODO: List your msg files here\n)',
+                         table.convert('rosbuild_genmsg', '()'))
 
     def test_make_header_lines(self):
         lines = make_header_lines('foo', 'bar, baz')
         self.assertTrue('project(foo)' in lines, lines)
 
+    def test_make_header_lines_package_index(self):
+        lines = make_header_lines('foo', 'roscpp', 'bar')
+        self.assertTrue('find_package(catkin REQUIRED COMPONENTS roscpp bar)' in lines, lines)
+        self.assertTrue('# TODO: remove from COMPONENTS if not catkin packages: bar' in lines, lines)
+        lines = make_header_lines('foo', 'roscpp', '')
+        self.assertTrue('find_package(catkin REQUIRED COMPONENTS roscpp)' in lines, lines)
+        self.assertFalse([line for line in lines if 'TODO' in line], lines)
+        self.assertTrue('find_package(catkin REQUIRED )' in make_header_lines('foo', '', ''))
+
+    def test_make_package_lines_package_index(self):
+        lines = make_package_lines('fltk', False, 'roscpp std_msgs')
+        self.assertTrue('    DEPENDS fltk\n    CATKIN_DEPENDS roscpp std_msgs\n' in lines, lines)
+        lines = make_package_lines('', False, '')
+        self.assertTrue('    DEPENDS  # TODO\n    CATKIN_DEPENDS # TODO\n' in lines, lines)
+
     def test_make_package_lines(self):
         lines = make_package_lines('bar, baz', True)
         self.assertEquals(
@@ -103,3 +135,28 @@ link_boost(${PROJECT_NAME} system)
         replacement, comps = convert_boost_snippet('rosbuild_link_boost', '(foo\nbar\nbaz)')
         self.assertEqual('target_link_libraries(foo ${Boost_LIBRARIES})', replacement)
         self.assertEqual(['bar', 'baz'], comps)
+
+    def test_iter_convert_cmake(self):
+        infile = os.path.join(FIXTURES, 'CMakeLists.rpekf.txt.in')
+        manfile = os.path.join(FIXTURES, 'manifest.rpekf.xml')
+        expected = convert_cmake('foo', infile, manfile)
+        with open(infile) as fhand:
+            content = fhand.read()
+        for size in [1, 7, 1000]:
+            chunks = [content[i:i + size] for i in range(0, len(content), size)]
+            result = ''.join(iter_convert_cmake(chunks, 'foo', manfile, spool_size=16))
+            self.assertEqual(expected, result)
+
+    def test_rewrite_cmake(self):
+        manifest = parse_manifest('<package><depend package="roscpp"/><rosdep name="boost"/></package>')
+        contents = ['',
+                    'rosbuild_init()\n',
+                    '  include(foo)\n# rosbuild_init()\nrosbuild_link_boost(foo thread)\n'
+                    'rosbuild_add_executable(foo foo.cpp)\nrosbuild_link_boost(bar system)\n',
+                    'catkin_package()\nrosbuild_genmsg()\nadd_definitions(-DFOO)']
+        for case in ['navfn', 'rpekf', 'stage']:
+            with open(os.path.join(FIXTURES, 'CMakeLists.%s.txt.in' % case)) as fhand:
+                contents.append(fhand.read())
+        for content in contents:
+            self.assertEqual(''.join(iter_convert_cmake([content], 'foo', manifest=manifest)),
+                             rewrite_cmake(content, 'foo', manifest=manifest))
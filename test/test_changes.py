@@ -0,0 +1,63 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from catkinize.changes import Change, SpilledContent, changeset_sizes
+
+
+class ChangeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def test_tuple_compatible(self):
+        change = Change('a', 'a.backup', 'b', 'content')
+        oldfile, backup_file, newfile, content = change
+        self.assertEqual(('a', 'a.backup', 'b', 'content'), (oldfile, backup_file, newfile, content))
+        self.assertEqual(('a', 'a.backup', 'b', 'content'), change)
+        self.assertEqual(change, ('a', 'a.backup', 'b', 'content'))
+        self.assertEqual([('a', 'a.backup', 'b', 'content')], [change])
+        self.assertNotEqual(change, ('a', 'a.backup', 'b', 'other'))
+        self.assertNotEqual(change, 'abcd')
+        self.assertNotEqual(change, None)
+        self.assertEqual(('a', 'content', 'content'), (change[0], change[3], change[-1]))
+        self.assertEqual(('a', 'a.backup'), change[:2])
+        self.assertEqual(4, len(change))
+        self.assertEqual(7, change.size)
+        self.assertEqual(Change(None, None, None, None), (None, None, None, None))
+
+    def test_producer(self):
+        produced = []
+
+        def producer():
+            produced.append(1)
+            return 'content'
+        change = Change('a', 'a.backup', 'b', producer)
+        self.assertEqual((None, 0), (change.size, change.memory_size))
+        self.assertEqual(('a', 'a.backup', 'b'), (change[0], change[1], change[2]))
+        self.assertEqual([], produced)
+        self.assertEqual('content', change.content)
+        self.assertEqual([1], produced)
+
+    def test_spill(self):
+        small = Change('a', 'a.backup', os.path.join('pkg', 'package.xml'), 'small')
+        large = Change('a', 'a.backup', os.path.join('pkg', 'CMakeLists.txt'), 'large' * 10)
+        small.spill(self.root_dir, threshold=10)
+        large.spill(self.root_dir, threshold=10)
+        self.assertEqual(1, len(os.listdir(self.root_dir)))
+        self.assertTrue(os.listdir(self.root_dir)[0].startswith('CMakeLists.txt.'))
+        self.assertEqual((5, 5), (small.size, small.memory_size))
+        self.assertEqual((50, 0), (large.size, large.memory_size))
+        self.assertEqual('large' * 10, large.content)
+        self.assertEqual((55, 5), changeset_sizes([small, large]))
+        self.assertEqual((58, 8), changeset_sizes([small, large, ('a', 'b', 'c', 'new')]))
+
+        copy = pickle.loads(pickle.dumps(large, 2))
+        self.assertTrue(isinstance(copy._content, SpilledContent))
+        self.assertEqual(large, copy)
+        self.assertEqual(50, copy.size)
@@ -0,0 +1,47 @@
+import unittest
+
+from catkinize.cmake_lexer import scan, split_arguments
+from catkinize.convert_cmake import convert_boost_snippet
+
+
+class CMakeLexerTest(unittest.TestCase):
+
+    def snippets(self, content):
+        return [(content[c.start:c.args_start], content[c.args_start:c.end])
+                for c in scan(content).commands]
+
+    def test_nested_parens(self):
+        content = 'if((A OR B) AND C)\n  foo (bar)\nendif()\n'
+        self.assertEqual([('if', '((A OR B) AND C)'),
+                          ('  foo', ' (bar)'),
+                          ('endif', '()')],
+                         self.snippets(content))
+
+    def test_quoted_and_bracket_arguments(self):
+        content = 'message("a ) b \\" c")\nset(x [==[ ) ]] ]==])\nfoo()'
+        self.assertEqual([('message', '("a ) b \\" c")'),
+                          ('set', '(x [==[ ) ]] ]==])'),
+                          ('foo', '()')],
+                         self.snippets(content))
+
+    def test_comments(self):
+        content = '#rosbuild_init()\n#[[ rosbuild_init()\n]] foo(a # )\n b)\n'
+        self.assertEqual([(' foo', '(a # )\n b)')], self.snippets(content))
+
+    def test_names(self):
+        result = scan('catkin_package()\n# add_message_files()\n')
+        self.assertTrue(result.has_command('catkin_package'))
+        self.assertFalse(result.has_command('add_message_files'))
+
+    def test_unterminated(self):
+        self.assertRaises(ValueError, scan, 'foo(bar\n')
+        self.assertRaises(ValueError, scan, 'foo("bar)\n')
+        self.assertRaises(ValueError, scan, 'foo([[bar)\n')
+
+    def test_split_arguments(self):
+        self.assertEqual(['foo', 'bar', 'baz'], split_arguments(' (foo\n  # the target\n  bar baz)'))
+
+    def test_convert_boost_snippet_comments(self):
+        replacement, comps = convert_boost_snippet('rosbuild_link_boost', '(foo # target\n thread\n signals)')
+        self.assertEqual('target_link_libraries(foo ${Boost_LIBRARIES})', replacement)
+        self.assertEqual(['thread', 'signals'], comps)
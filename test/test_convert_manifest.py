@@ -0,0 +1,79 @@
+import os
+import unittest
+import xml.etree.ElementTree as ET
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from catkinize import xml_lib
+from catkinize.convert_manifest import PackageXmlWriter, convert_manifest, create_project_xml, \
+    load_manifest, make_from_manifest, merge_dups, write_project_xml
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def project_xml_args(**kwargs):
+    args = dict(package_name='foo', version='1.0.0', description='', maintainers=[],
+                licenses=['BSD'], website_url='', bugtracker_url='', authors=[],
+                build_depends=[], run_depends=[], test_depends=[], replaces=[],
+                conflicts=[], exports=[], architecture_independent=False, metapackage=False)
+    args.update(kwargs)
+    return args
+
+
+class PackageXmlWriterTest(unittest.TestCase):
+
+    def test_lines(self):
+        writer = PackageXmlWriter()
+        writer.line('a')
+        writer.lines('b', 'b', '')
+        writer.line('')
+        writer.finish()
+        self.assertEqual('a\nb\nb\n\n\n', writer.getvalue())
+
+        writer = PackageXmlWriter(merge_duplicates=True, final_newline=False)
+        writer.line('a')
+        writer.lines('b', 'b', '')
+        writer.line('')
+        writer.line('a')
+        writer.finish()
+        self.assertEqual('\n'.join(merge_dups(['a', 'b', 'b', '', '', 'a'])), writer.getvalue())
+
+    def test_section(self):
+        stream = StringIO()
+        writer = PackageXmlWriter(stream, commented=['test_depend'])
+        writer.section('test_depend', ['foo', ('bar', {'version_gte': '1.0'})])
+        writer.section('run_depend', [])
+        writer.section('run_depend', ['foo'])
+        writer.finish()
+        self.assertEqual('  <!-- <test_depend>foo</test_depend> -->\n'
+                         '  <!-- <test_depend version_gte="1.0">bar</test_depend> -->\n'
+                         '\n'
+                         '  <run_depend>foo</run_depend>\n',
+                         stream.getvalue())
+        self.assertEqual('', writer.getvalue())
+
+    def test_escaping(self):
+        xml = create_project_xml(**project_xml_args(
+            description='Tom & Jerry <3',
+            authors=[('A "B" C', {'email': 'a&b@example.com'})],
+            exports=[('cpp', {'cflags': '-DNAME="foo" `pkg-config --cflags bar` > 0'})]))
+        tree = ET.XML(xml)
+        self.assertEqual('Tom & Jerry <3', tree.find('description').text)
+        self.assertEqual('A "B" C', tree.find('author').text)
+        self.assertEqual('a&b@example.com', tree.find('author').attrib['email'])
+        self.assertEqual('-DNAME="foo" `pkg-config --cflags bar` > 0',
+                         tree.find('export').find('cpp').attrib['cflags'])
+
+    def test_same_as_postprocessing(self):
+        args = project_xml_args(test_depends=['foo', 'bar'], run_depends=['foo', 'foo'])
+        xml = create_project_xml(**args)
+        writer = PackageXmlWriter(commented=['test_depend'])
+        write_project_xml(writer, **args)
+        self.assertEqual(xml_lib.comment_out_tags_named(xml, 'test_depend'), writer.getvalue())
+        for fixture in ['navfn', 'stage', 'rpekf']:
+            path = os.path.join(FIXTURES, 'manifest.%s.xml' % fixture)
+            pkg_xml = make_from_manifest(load_manifest(path), 'foo', '1.0.0', False, False, '', [], [])
+            self.assertEqual('\n'.join(merge_dups(pkg_xml.splitlines())),
+                             convert_manifest(os.path.join('src', 'foo'), path, '1.0.0'))
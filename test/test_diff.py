@@ -0,0 +1,80 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from catkinize import diff
+from catkinize.diff import ChangesetDiffs, make_diff
+from catkinize.main import prompt_changes
+
+
+class DiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.oldfile = os.path.join(self.root_dir, 'CMakeLists.txt')
+        with open(self.oldfile, 'w') as fhand:
+            fhand.write('rosbuild_init()\nrosbuild_add_executable(foo foo.cpp)\n')
+        self.newfile = os.path.join(self.root_dir, 'package.xml')
+        self.changeset = [(self.oldfile, self.oldfile + '.backup', None, None),
+                          (self.oldfile, self.oldfile + '.backup', self.oldfile,
+                           'project(foo)\nadd_executable(foo foo.cpp)\n'),
+                          (None, None, self.newfile, '<package/>')]
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def test_make_diff(self):
+        self.assertEqual('', make_diff(self.changeset[0]))
+        self.assertEqual('--- %s\n+++ %s\n@@ -1,2 +1,2 @@\n'
+                         '-rosbuild_init()\n-rosbuild_add_executable(foo foo.cpp)\n'
+                         '+project(foo)\n+add_executable(foo foo.cpp)\n' % (self.oldfile, self.oldfile),
+                         make_diff(self.changeset[1]))
+        self.assertEqual('--- /dev/null\n+++ %s\n@@ -0,0 +1 @@\n+<package/>\n\\ No newline at end of file\n'
+                         % self.newfile,
+                         make_diff(self.changeset[2]))
+
+    def test_changeset_diffs(self):
+        expected = [make_diff(change) for change in self.changeset]
+        self.assertEqual(expected, list(ChangesetDiffs(self.changeset, jobs=2)))
+        computed = []
+        make = diff.make_diff
+
+        def counting_make_diff(change):
+            computed.append(change)
+            return make(change)
+        diff.make_diff = counting_make_diff
+        try:
+            diffs = ChangesetDiffs(self.changeset, jobs=1)
+            self.assertEqual(expected[0], next(iter(diffs)))
+            self.assertEqual(1, len(computed))
+            self.assertEqual(expected, list(diffs))
+            self.assertEqual(expected, list(diffs))
+            self.assertEqual(3, len(computed))
+        finally:
+            diff.make_diff = make
+        output = os.path.join(self.root_dir, 'changes.diff')
+        diffs.write(output)
+        with open(output) as fhand:
+            self.assertEqual(''.join(expected), fhand.read())
+
+    def test_prompt_changes(self):
+        inputs = ['d', 'y']
+
+        class FakeUi(object):
+            def get_input(self, prompt):
+                return inputs.pop(0)
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            self.assertTrue(prompt_changes(self.changeset, FakeUi, ChangesetDiffs(self.changeset, jobs=1)))
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(1, output.count('+<package/>'))
+        self.assertEqual(2, output.count('Create converted file %s' % self.newfile))
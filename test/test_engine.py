@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from catkinize import engine
+from catkinize.engine import ConversionEngine
+from catkinize.main import catkinize_package, catkinize_stack
+
+
+class ConversionEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.stack = os.path.join(self.root_dir, 'foostack')
+        os.makedirs(self.stack)
+        with open(os.path.join(self.stack, 'stack.xml'), 'w') as fhand:
+            fhand.write('<stack><description>foo</description></stack>')
+        with open(os.path.join(self.stack, 'Makefile'), 'w') as fhand:
+            fhand.write('include $(shell rospack find mk)/cmake_stack.mk')
+        self.packages = []
+        for index in range(10):
+            package = os.path.join(self.stack, 'group%d' % (index % 3), 'pkg%d' % index)
+            os.makedirs(package)
+            with open(os.path.join(package, 'manifest.xml'), 'w') as fhand:
+                fhand.write('<package><depend package="roscpp"/></package>')
+            with open(os.path.join(package, 'CMakeLists.txt'), 'w') as fhand:
+                fhand.write('rosbuild_init()\nrosbuild_add_executable(foo%d foo.cpp)\n' % index)
+            self.packages.append(package)
+        self.stat = engine._stat
+        self.read = engine._read
+
+    def tearDown(self):
+        engine._stat = self.stat
+        engine._read = self.read
+        shutil.rmtree(self.root_dir)
+
+    def test_same_results(self):
+        with ConversionEngine(4) as conversions:
+            self.assertEqual(catkinize_package(self.packages[0], '0.1.2'),
+                             conversions.catkinize_package(self.packages[0], '0.1.2'))
+            self.assertEqual(catkinize_stack(self.stack, '0.1.2'),
+                             conversions.catkinize_stack(self.stack, '0.1.2'))
+            # unary stack
+            with open(os.path.join(self.packages[0], 'stack.xml'), 'w') as fhand:
+                fhand.write('<stack/>')
+            self.assertEqual(catkinize_stack(self.packages[0], '0.1.2'),
+                             conversions.catkinize_stack(self.packages[0], '0.1.2'))
+
+    def test_errors(self):
+        with ConversionEngine(4) as conversions:
+            self.assertRaises(ValueError, conversions.catkinize_package, os.path.join(self.root_dir, 'none'), '1')
+            self.assertRaises(ValueError, conversions.catkinize_package, self.stack, '1')
+            self.assertRaises(ValueError, conversions.catkinize_stack, self.packages[0], '1')
+            with open(os.path.join(self.packages[1], 'CMakeLists.txt.backup'), 'w') as fhand:
+                fhand.write('')
+            result = conversions.submit_stack(self.stack, '1')
+            self.assertRaises(ValueError, result.get)
+
+    def test_latency(self):
+        latency = 0.02
+        operations = []
+
+        def slow_stat(path):
+            operations.append(path)
+            time.sleep(latency)
+            return self.stat(path)
+
+        def slow_read(path):
+            operations.append(path)
+            time.sleep(latency)
+            return self.read(path)
+        engine._stat = slow_stat
+        engine._read = slow_read
+        start = time.time()
+        with ConversionEngine(16) as conversions:
+            conversions.catkinize_stack(self.stack, '0.1.2')
+        # one round trip per operation would take at least latency * len(operations)
+        self.assertTrue(time.time() - start < latency * len(operations) / 3)
@@ -3,7 +3,14 @@ import unittest
 import tempfile
 import shutil
 
-from catkinize.main import catkinize_package, catkinize_stack, _create_changesets, perform_changes
+import catkinize.changes
+import catkinize.convert_manifest
+from catkinize import profiling, progress
+from catkinize.cache import ConversionCache
+from catkinize.convert_cmake import set_rule_packs
+from catkinize.rosdep import RosdepResolver
+from catkinize.main import catkinize_package, catkinize_stack, _create_changesets, perform_changes, \
+    find_packages, iter_packages, build_package_index
 
 
 class CatkinizeTest(unittest.TestCase):
@@ -41,11 +48,12 @@ class CatkinizeTest(unittest.TestCase):
                          _create_changesets(self.foo_stack, ['stack.xml'], [], []))
         self.assertEqual([(self.foo_stack_xml, self.foo_stack_xml + '.backup', None, None)],
                          _create_changesets(self.foo_stack, ['stack.xml']))
-        self.assertEqual([(None, None, 'foo', 'hello')],
+        self.assertEqual([(None, None, os.path.join('.', 'foo'), 'hello')],
                          _create_changesets('.', ['baz'], ['foo'], ['hello']))
         self.assertEqual([(self.foo_stack_xml, self.foo_stack_xml + '.backup', os.path.join(self.foo_stack, 'foo'), 'hello')],
                          _create_changesets(self.foo_stack, ['stack.xml'], ['foo'], ['hello']))
-        self.assertEqual([(None, None, 'foo', 'hello'), (None, None, 'fooz', 'hello2')],
+        self.assertEqual([(None, None, os.path.join('.', 'foo'), 'hello'),
+                          (None, None, os.path.join('.', 'fooz'), 'hello2')],
                          _create_changesets('.', ['baz', 'bam'], ['foo', 'fooz'], ['hello', 'hello2']))
         raised = False
         try:
@@ -88,3 +96,230 @@ class CatkinizeTest(unittest.TestCase):
                 (self.foo_pkg_cmake, self.foo_pkg_cmake + '.backup', self.foo_pkg_cmake, '# http://ros.org/doc/groovy/api/catkin/html/user_guide/supposed.html\ncmake_minimum_required(VERSION 2.8.3)\nproject(foopkg)\n# Load catkin and all dependencies required for this package\n# TODO: remove all from COMPONENTS that are not catkin packages.\nfind_package(catkin REQUIRED )\n\n# include_directories(include ${Boost_INCLUDE_DIR} ${catkin_INCLUDE_DIRS})\n# TODO: fill in what other packages will need to use this package\n## LIBRARIES: libraries you create in this project that dependent projects also need\n## CATKIN_DEPENDS: catkin_packages dependent projects also need\n## DEPENDS: system dependencies of this project that dependent projects also need\ncatkin_package(\n    DEPENDS  # TODO\n    CATKIN-DEPENDS # TODO\n    INCLUDE_DIRS # TODO include\n    LIBRARIES # TODO\n)'),
                 (self.foo_pkg_xml, self.foo_pkg_xml + '.backup', os.path.join(self.foo_pkg, 'package.xml'), '<package>\n  <name>foopkg</name>\n  <version>0.1.2</version>\n  <description></description>\n  <!-- <maintainer></maintainer> -->\n\n  <license></license>\n\n  <url type="website"></url>\n  <!-- <url type="bugtracker"></url> -->\n\n  <author></author>\n\n  <export>\n\n  </export>\n</package>')],
                          catkinize_stack(self.foo_stack, '0.1.2'))
+
+    def test_catkinize_stack_metapackage_cmake(self):
+        # the stack has no CMakeLists.txt to replace, so the one of the
+        # metapackage is a new file
+        changeset = catkinize_stack(self.foo_stack, '0.1.2')
+        self.assertEqual([os.path.join(self.foo_stack, 'foostack', 'CMakeLists.txt')],
+                         [change[2] for change in changeset if change[0] is None])
+
+    def test_catkinize_stack_parallel(self):
+        self.bar_pkg = os.path.join(self.foo_stack, "barpkg")
+        os.makedirs(self.bar_pkg)
+        with open(os.path.join(self.bar_pkg, 'manifest.xml'), "w") as fhand:
+            fhand.write('<package><depend package="foopkg"/></package>')
+        with open(os.path.join(self.bar_pkg, 'CMakeLists.txt'), "w") as fhand:
+            fhand.write("rosbuild_init()\nrosbuild_add_executable(bar bar.cpp)\n")
+        self.assertEqual(catkinize_stack(self.foo_stack, '0.1.2'),
+                         catkinize_stack(self.foo_stack, '0.1.2', jobs=2))
+
+    def test_catkinize_package_parses_manifest_once(self):
+        parsed = []
+        xml = catkinize.convert_manifest.ET.XML
+
+        def counting_xml(text):
+            parsed.append(text)
+            return xml(text)
+        catkinize.convert_manifest.ET.XML = counting_xml
+        try:
+            catkinize_package(self.foo_pkg, '0.1.2')
+        finally:
+            catkinize.convert_manifest.ET.XML = xml
+        self.assertEqual(['<package/>'], parsed)
+
+    def test_catkinize_stack_cache(self):
+        cache = ConversionCache(os.path.join(self.root_dir, 'cache'))
+        expected = catkinize_stack(self.foo_stack, '0.1.2')
+        self.assertEqual(expected, catkinize_stack(self.foo_stack, '0.1.2', cache=cache))
+        self.assertEqual((0, 2), (cache.hits, cache.misses))
+        self.assertEqual(expected, catkinize_stack(self.foo_stack, '0.1.2', cache=cache))
+        self.assertEqual((2, 2), (cache.hits, cache.misses))
+        self.assertEqual(expected, catkinize_stack(self.foo_stack, '0.1.2', jobs=2, cache=cache))
+        self.assertEqual((4, 2), (cache.hits, cache.misses))
+
+    def test_catkinize_stack_profile(self):
+        self.bar_pkg = os.path.join(self.foo_stack, "barpkg")
+        os.makedirs(self.bar_pkg)
+        with open(os.path.join(self.bar_pkg, 'manifest.xml'), "w") as fhand:
+            fhand.write('<package/>')
+        with open(os.path.join(self.bar_pkg, 'CMakeLists.txt'), "w") as fhand:
+            fhand.write("rosbuild_init()\n")
+        profiler = profiling.enable()
+        try:
+            catkinize_stack(self.foo_stack, '0.1.2', jobs=2)
+        finally:
+            profiling.disable()
+        self.assertEqual(2, profiler.stages['convert cmake'][0])
+        # the stack directory and both packages
+        self.assertEqual(3, profiler.stages['discovery'][0])
+        self.assertEqual(sorted([self.foo_pkg, self.bar_pkg]), sorted(profiler.packages))
+
+    def _make_package(self, *parts):
+        path = os.path.join(self.foo_stack, *parts)
+        os.makedirs(path)
+        with open(os.path.join(path, 'manifest.xml'), "w") as fhand:
+            fhand.write('<package/>')
+        with open(os.path.join(path, 'CMakeLists.txt'), "w") as fhand:
+            fhand.write("rosbuild_init()\n" * len(parts[-1]))
+        return path
+
+    def test_find_packages(self):
+        self._make_package('group', 'apkg')
+        self._make_package('group', 'apkg', 'nested')
+        self._make_package('.git', 'gitpkg')
+        # only marker files tell build outputs from sources, whatever the name
+        self._make_package('build', 'buildpkg')
+        self._make_package('install')
+        self._make_package('cmakebuild', 'cmakepkg')
+        self._make_package('devel', 'develpkg')
+        self._make_package('ignored', 'ignoredpkg')
+        self._make_package('ignoredpkg')
+        for dirname, marker in [('cmakebuild', 'CMakeCache.txt'), ('devel', '.catkin'), ('ignored', 'CATKIN_IGNORE'),
+                                ('ignoredpkg', 'CATKIN_IGNORE')]:
+            with open(os.path.join(self.foo_stack, dirname, marker), "w") as fhand:
+                fhand.write("")
+        expected = []
+        for dirpath, dirnames, filenames in os.walk(self.foo_stack):
+            if os.path.basename(dirpath) in ['.git', 'cmakebuild', 'devel', 'ignored', 'ignoredpkg']:
+                del dirnames[:]
+            elif 'manifest.xml' in filenames:
+                expected.append(dirpath)
+                del dirnames[:]
+        self.assertEqual(expected, find_packages(self.foo_stack))
+        self.assertEqual(sorted([self.foo_pkg, os.path.join(self.foo_stack, 'group', 'apkg'),
+                                 os.path.join(self.foo_stack, 'build', 'buildpkg'),
+                                 os.path.join(self.foo_stack, 'install')]),
+                         sorted(expected))
+
+    def test_iter_packages_symlinks(self):
+        os.symlink(self.foo_stack, os.path.join(self.foo_stack, 'loop'))
+        os.symlink(self.foo_pkg, os.path.join(self.foo_stack, 'linkpkg'))
+        self.assertEqual([self.foo_pkg], list(iter_packages(self.foo_stack)))
+        found = list(iter_packages(self.foo_stack, follow_symlinks=True))
+        self.assertEqual(1, len(found))
+        self.assertEqual(os.path.realpath(self.foo_pkg), os.path.realpath(found[0]))
+
+    def test_catkinize_stack_parallel_streaming(self):
+        for name in ['a', 'bbbbbb', 'cc', 'ddddd', 'eee', 'ffff', 'g', 'hhhhhhhh']:
+            self._make_package('group', name)
+        self.assertEqual(catkinize_stack(self.foo_stack, '0.1.2'),
+                         catkinize_stack(self.foo_stack, '0.1.2', jobs=2))
+
+    def test_catkinize_stack_spill(self):
+        spill_dir = os.path.join(self.root_dir, 'spill')
+        os.makedirs(spill_dir)
+        expected = catkinize_stack(self.foo_stack, '0.1.2')
+        threshold = catkinize.changes.SPILL_THRESHOLD
+        catkinize.changes.SPILL_THRESHOLD = 10
+        try:
+            self.assertEqual(expected, catkinize_stack(self.foo_stack, '0.1.2', spill_dir=spill_dir))
+            self.assertEqual(2, len(os.listdir(spill_dir)))
+            self.assertEqual(expected, catkinize_stack(self.foo_stack, '0.1.2', jobs=2, spill_dir=spill_dir))
+            self.assertEqual(4, len(os.listdir(spill_dir)))
+        finally:
+            catkinize.changes.SPILL_THRESHOLD = threshold
+
+    def test_build_package_index(self):
+        self._make_package('group', 'apkg')
+        catkin_pkg = os.path.join(self.root_dir, 'ws', 'src', 'catkin_dir')
+        os.makedirs(catkin_pkg)
+        with open(os.path.join(catkin_pkg, 'package.xml'), "w") as fhand:
+            fhand.write('<package><name> catkinpkg </name></package>')
+        package_index = build_package_index([self.foo_stack, os.path.join(self.root_dir, 'ws')])
+        self.assertEqual(set(['foopkg', 'apkg', 'catkinpkg']), package_index.names)
+
+    def test_catkinize_stack_package_index(self):
+        for name in ['a', 'b']:
+            path = self._make_package('group', name)
+            with open(os.path.join(path, 'manifest.xml'), "w") as fhand:
+                fhand.write('<package><depend package="foopkg"/><depend package="other"/>'
+                            '<rosdep name="boost"/></package>')
+        package_index = build_package_index([self.foo_stack])
+        changeset = catkinize_stack(self.foo_stack, '0.1.2', package_index=package_index)
+        self.assertEqual(changeset, catkinize_stack(self.foo_stack, '0.1.2', jobs=2, package_index=package_index))
+        cmake = [change[3] for change in changeset
+                 if change[2] == os.path.join(self.foo_stack, 'group', 'a', 'CMakeLists.txt')][0]
+        self.assertTrue('find_package(catkin REQUIRED COMPONENTS foopkg other)' in cmake, cmake)
+        self.assertTrue('    DEPENDS boost\n    CATKIN_DEPENDS foopkg\n' in cmake, cmake)
+
+        cache = ConversionCache(os.path.join(self.root_dir, 'cache'))
+        catkinize_stack(self.foo_stack, '0.1.2', cache=cache)
+        self.assertEqual(changeset, catkinize_stack(self.foo_stack, '0.1.2', cache=cache,
+                                                    package_index=package_index))
+
+    def test_catkinize_stack_rosdep_resolver(self):
+        rosdep_dir = os.path.join(self.root_dir, 'rosdep')
+        os.makedirs(rosdep_dir)
+        with open(os.path.join(rosdep_dir, 'base.yaml'), "w") as fhand:
+            fhand.write('{"boost": {"ubuntu": ["libboost-all-dev"]}}')
+        for name in ['a', 'b']:
+            path = self._make_package('group', name)
+            with open(os.path.join(path, 'manifest.xml'), "w") as fhand:
+                fhand.write('<package><rosdep name="boost"/><rosdep name="nonsense"/></package>')
+        resolver = RosdepResolver(rosdep_dir)
+        changeset = catkinize_stack(self.foo_stack, '0.1.2', rosdep_resolver=resolver)
+        self.assertEqual(changeset, catkinize_stack(self.foo_stack, '0.1.2', jobs=2, rosdep_resolver=resolver))
+        package_xml = [change[3] for change in changeset
+                       if change[2] == os.path.join(self.foo_stack, 'group', 'a', 'package.xml')][0]
+        self.assertTrue('<run_depend>boost</run_depend>' in package_xml, package_xml)
+        self.assertTrue('<!-- <run_depend>nonsense</run_depend> -->' in package_xml, package_xml)
+
+        cache = ConversionCache(os.path.join(self.root_dir, 'cache'))
+        catkinize_stack(self.foo_stack, '0.1.2', cache=cache)
+        self.assertEqual(changeset, catkinize_stack(self.foo_stack, '0.1.2', cache=cache, rosdep_resolver=resolver))
+
+    def test_catkinize_stack_rule_packs(self):
+        for name in ['a', 'b']:
+            path = self._make_package('group', name)
+            with open(os.path.join(path, 'CMakeLists.txt'), "w") as fhand:
+                fhand.write('shop_add_bin(foo foo.cpp)\n')
+        cache = ConversionCache(os.path.join(self.root_dir, 'cache'))
+        plain = catkinize_stack(self.foo_stack, '0.1.2', cache=cache)
+        set_rule_packs([[('shop_add_bin', 'rename', 'add_executable')]])
+        try:
+            changeset = catkinize_stack(self.foo_stack, '0.1.2', cache=cache)
+            self.assertNotEqual(plain, changeset)
+            self.assertEqual(changeset, catkinize_stack(self.foo_stack, '0.1.2', jobs=2))
+        finally:
+            set_rule_packs(())
+        cmake = [change[3] for change in changeset
+                 if change[2] == os.path.join(self.foo_stack, 'group', 'a', 'CMakeLists.txt')][0]
+        self.assertTrue('add_executable(foo foo.cpp)' in cmake, cmake)
+
+    def test_catkinize_stack_progress(self):
+        self._make_package('group', 'apkg')
+        for jobs in [1, 2]:
+            states = []
+            progress.enable(progress.Progress(states.append, interval=0))
+            try:
+                catkinize_stack(self.foo_stack, '0.1.2', jobs=jobs)
+                self.assertEqual([(2, 2, False, True)], [(state['discovered'], state['converted'],
+                                                          state['discovering'], state['final'])
+                                                         for state in states if state['final']])
+                self.assertEqual((1, 0, True), (states[0]['discovered'], states[0]['converted'],
+                                                states[0]['discovering']))
+            finally:
+                progress.disable()
+        states = []
+        progress.enable(progress.Progress(states.append, interval=0))
+        try:
+            perform_changes(catkinize_package(self.foo_pkg, '0.1.2'))
+        finally:
+            progress.disable()
+        self.assertEqual(('write', 2, 2, True), tuple(states[-1][key] for key in
+                                                      ['phase', 'written', 'writes', 'final']))
+
+    def test_catkinize_stack_trace(self):
+        self._make_package('group', 'apkg')
+        tracer = profiling.enable(profiling.Tracer())
+        try:
+            catkinize_stack(self.foo_stack, '0.1.2', jobs=2)
+        finally:
+            profiling.disable()
+        events = tracer.trace_events()
+        workers = set(event['pid'] for event in events if event['name'] == 'convert cmake')
+        self.assertFalse(os.getpid() in workers)
+        self.assertEqual(sorted([self.foo_pkg, os.path.join(self.foo_stack, 'group', 'apkg')]),
+                         sorted(event['args']['package'] for event in events if event['name'] == 'changesets'))
+        self.assertTrue([event for event in events if event['name'] == 'discovery' and event['pid'] == os.getpid()])
@@ -0,0 +1,25 @@
+import unittest
+
+from catkinize.package_index import PackageIndex
+
+
+class PackageIndexTest(unittest.TestCase):
+
+    def test_lookup(self):
+        package_index = PackageIndex(['roscpp', 'tf', 'roscpp'])
+        self.assertEqual(2, len(package_index))
+        self.assertTrue('roscpp' in package_index)
+        self.assertFalse('boost' in package_index)
+        name = ''.join(['ros', 'cpp'])
+        self.assertTrue(name in package_index)
+        self.assertTrue([known for known in package_index.names if known == name][0] is intern(name))
+
+    def test_split(self):
+        package_index = PackageIndex(['roscpp', 'tf', 'python_qt_binding'])
+        self.assertEqual((['roscpp', 'python_qt_binding'], ['foo'], ['boost', 'fltk']),
+                         package_index.split(['roscpp', 'foo'], ['boost', 'python_qt_binding', 'fltk']))
+        self.assertEqual(([], [], []), package_index.split([], []))
+
+    def test_fingerprint(self):
+        self.assertEqual(PackageIndex(['a', 'b']).fingerprint, PackageIndex(['b', 'a']).fingerprint)
+        self.assertNotEqual(PackageIndex(['a', 'b']).fingerprint, PackageIndex(['a', 'bc']).fingerprint)
@@ -0,0 +1,89 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from catkinize import profiling
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def tearDown(self):
+        profiling.disable()
+
+    def test_disabled(self):
+        self.assertEqual(None, profiling.get_profiler())
+        with profiling.stage('foo', 'pkg'):
+            pass
+        self.assertTrue(profiling.stage('foo') is profiling.stage('bar'))
+
+    def test_stages(self):
+        profiler = profiling.enable()
+        for package in ['foo', 'bar', 'foo']:
+            with profiling.stage('convert', package):
+                pass
+        with profiling.stage('discovery'):
+            pass
+        self.assertEqual(3, profiler.stages['convert'][0])
+        self.assertEqual(1, profiler.stages['discovery'][0])
+        self.assertEqual(['bar', 'foo'], sorted(profiler.packages))
+
+        other = profiling.Profiler()
+        other.add('convert', 'baz', 5.0, 4.0)
+        profiler.merge(other.records())
+        self.assertEqual(4, profiler.stages['convert'][0])
+        summary = profiler.summary(slowest=1)
+        self.assertTrue('discovery' in summary, summary)
+        self.assertTrue('baz' in summary, summary)
+        self.assertFalse('foo' in summary.split('slowest packages')[1], summary)
+
+    def test_threads(self):
+        profiler = profiling.enable(profiling.Tracer())
+
+        def stages():
+            for _ in range(1000):
+                with profiling.stage('write file', 'foo'):
+                    pass
+        threads = [threading.Thread(target=stages) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(8000, profiler.stages['write file'][0])
+        self.assertEqual(8000, len(profiler.spans))
+        self.assertTrue('process cpu [s]' in profiler.summary())
+
+    def test_tracer(self):
+        tracer = profiling.enable(profiling.Tracer())
+        with profiling.stage('convert', 'foo'):
+            pass
+        with profiling.stage('write file', path=os.path.join('foo', 'package.xml')):
+            pass
+        self.assertEqual(1, tracer.stages['write file'][0])
+        self.assertEqual(['foo'], list(tracer.packages))
+
+        other = profiling.Tracer()
+        other.record('convert', 'bar', None, tracer.origin + 1.0, 0.5, 0.5)
+        records = other.records()
+        records[2][0] = records[2][0][:5] + (-1, 7)
+        tracer.merge(records)
+        self.assertEqual(2, tracer.stages['convert'][0])
+        events = tracer.trace_events()
+        self.assertEqual([('M', os.getpid(), 'catkinize'), ('M', -1, 'worker -1')],
+                         sorted([(event['ph'], event['pid'], event['args']['name'])
+                                 for event in events if event['ph'] == 'M'], key=lambda event: -event[1]))
+        spans = [event for event in events if event['ph'] == 'X']
+        self.assertEqual([{'package': 'foo'}, {'package': 'foo', 'file': os.path.join('foo', 'package.xml')},
+                          {'package': 'bar'}], [event['args'] for event in spans])
+        self.assertEqual((1000000.0, 500000.0, 7), (spans[2]['ts'], spans[2]['dur'], spans[2]['tid']))
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'trace.json')
+            tracer.write_trace(path)
+            with open(path) as fhand:
+                self.assertEqual(len(events), len(json.load(fhand)['traceEvents']))
+        finally:
+            shutil.rmtree(directory)
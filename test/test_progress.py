@@ -0,0 +1,105 @@
+import json
+import unittest
+from StringIO import StringIO
+
+from catkinize import progress
+from catkinize.progress import BarRenderer, JsonRenderer, Progress
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class ProgressTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.states = []
+        self.progress = Progress(self.states.append, interval=1.0, clock=self.clock)
+
+    def tearDown(self):
+        progress.disable()
+
+    def test_disabled(self):
+        self.assertEqual(None, progress.get_progress())
+        self.assertFalse(progress.is_quiet())
+        progress.discovered()
+        progress.converted()
+        progress.writing(3)
+        progress.written()
+
+    def test_rate_limited(self):
+        progress.enable(self.progress)
+        self.assertTrue(progress.is_quiet())
+        for _ in range(10):
+            progress.discovered()
+        self.assertEqual([], self.states)
+        self.clock.now += 1.0
+        progress.converted()
+        self.assertEqual(1, len(self.states))
+        state = self.states[0]
+        self.assertEqual((10, 1, True, False), (state['discovered'], state['converted'], state['discovering'],
+                                                state['final']))
+        self.assertEqual((1.0, 9.0), (state['rate'], state['eta']))
+        progress.converted()
+        self.assertEqual(1, len(self.states))
+
+    def test_phases(self):
+        progress.enable(self.progress)
+        progress.discovered()
+        progress.discovered()
+        progress.converted()
+        self.clock.now += 0.5
+        progress.converted()
+        self.assertEqual([], self.states)
+        progress.discovery_done()
+        self.assertEqual(('convert', True, 0.0), (self.states[-1]['phase'], self.states[-1]['final'],
+                                                  self.states[-1]['eta']))
+        self.clock.now += 1.0
+        progress.writing(4)
+        self.assertEqual(('write', 0, 0.0, None), tuple(self.states[-1][key] for key in
+                                                         ['phase', 'written', 'rate', 'eta']))
+        self.clock.now += 2.0
+        progress.written()
+        self.assertEqual(('write', 1, 4, 0.5, 6.0), tuple(self.states[-1][key] for key in
+                                                           ['phase', 'written', 'writes', 'rate', 'eta']))
+        for _ in range(3):
+            progress.written()
+        self.assertTrue(self.states[-1]['final'])
+        self.assertEqual(3.5, self.states[-1]['elapsed'])
+
+    def test_writing_ends_conversion(self):
+        self.progress.add('discovered')
+        self.progress.start_writing(0)
+        self.assertEqual([('convert', True), ('write', True)],
+                         [(state['phase'], state['final']) for state in self.states])
+
+    def test_bar_renderer(self):
+        stream = StringIO()
+        self.progress.render = BarRenderer(stream)
+        self.progress.interval = 0
+        self.progress.add('discovered')
+        self.progress.add('discovered')
+        self.clock.now += 2.0
+        self.progress.add('converted')
+        self.progress.end_discovery()
+        self.progress.add('converted')
+        lines = stream.getvalue().split('\r')
+        self.assertEqual('convert [----------' + '-' * 10 + '] 0/1+ packages  0.0/s  ETA -:--', lines[1])
+        self.assertEqual('convert [##########----------] 1/2 packages  0.5/s  ETA 0:02', lines[4].rstrip())
+        self.assertTrue(lines[5].startswith('convert [####################] 2/2 packages  1.0/s  ETA 0:00'))
+        self.assertTrue(lines[5].endswith('\n'))
+
+    def test_json_renderer(self):
+        stream = StringIO()
+        self.progress.render = JsonRenderer(stream)
+        self.progress.end_discovery()
+        events = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(1, len(events))
+        self.assertEqual(('progress', 'convert', True, None), (events[0]['event'], events[0]['phase'],
+                                                              events[0]['final'], events[0]['writes']))
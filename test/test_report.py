@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from catkinize.main import catkinize_package
+from catkinize.package_index import PackageIndex
+from catkinize.profiling import Profiler
+from catkinize.report import find_markers, make_report
+
+
+class ReportTest(unittest.TestCase):
+
+    def test_find_markers(self):
+        self.assertEqual([], find_markers(''))
+        self.assertEqual([{'line': 2, 'text': '# CATKIN_MIGRATION'},
+                          {'line': 4, 'text': '# TODO: remove from COMPONENTS if not catkin packages: bar'}],
+                         find_markers('project(foo)\n# CATKIN_MIGRATION\nfoo()\n'
+                                      '# TODO: remove from COMPONENTS if not catkin packages: bar\n'))
+        self.assertEqual([], find_markers('# CATKIN_MIGRATION: removed during catkin migration\n'
+                                          '# rosbuild_init()\n  LIBRARIES # TODO\n'))
+
+    def test_make_report(self):
+        stack = os.path.join('src', 'foostack')
+        pkg = os.path.join(stack, 'foopkg')
+        changeset = [(os.path.join(stack, 'stack.xml'), os.path.join(stack, 'stack.xml.backup'),
+                      os.path.join(stack, 'foostack', 'package.xml'), '<package/>'),
+                     (os.path.join(stack, 'Makefile'), os.path.join(stack, 'Makefile.backup'), None, None),
+                     (os.path.join(pkg, 'CMakeLists.txt'), os.path.join(pkg, 'CMakeLists.txt.backup'),
+                      os.path.join(pkg, 'CMakeLists.txt'), 'project(foopkg)\n# CATKIN_MIGRATION\n')]
+        profiler = Profiler()
+        profiler.add('convert cmake', pkg + os.sep, 2.0, 1.0)
+        report = make_report(stack, changeset, 'applied', profiler)
+        self.assertEqual('applied', report['status'])
+        self.assertEqual({'convert cmake': {'calls': 1, 'wall': 2.0, 'cpu': 1.0}}, report['stages'])
+        self.assertEqual([os.path.join(stack, 'foostack'), stack, pkg],
+                         [package['path'] for package in report['packages']])
+        package = report['packages'][2]
+        self.assertEqual('foopkg', package['name'])
+        self.assertEqual({'wall': 2.0, 'cpu': 1.0}, package['timings'])
+        self.assertEqual(1, package['markers'])
+        self.assertEqual(['converted', 'removed', 'needs_migration'],
+                         [package['status'] for package in report['packages']])
+        self.assertEqual([{'line': 2, 'text': '# CATKIN_MIGRATION'}], package['changes'][0]['markers'])
+        self.assertEqual(None, report['packages'][0]['timings'])
+        self.assertFalse('error' in report)
+
+        report = make_report(stack, [], 'failed', None, ValueError('broken'))
+        self.assertEqual('ValueError: broken', report['error'])
+        self.assertEqual([], report['packages'])
+
+    def test_converted_package(self):
+        root_dir = tempfile.mkdtemp()
+        try:
+            pkg = os.path.join(root_dir, 'foopkg')
+            os.makedirs(pkg)
+            with open(os.path.join(pkg, 'manifest.xml'), 'w') as fhand:
+                fhand.write('<package>\n  <description brief="foo">Foo</description>\n  <author>A</author>\n'
+                            '  <license>BSD</license>\n  <depend package="roscpp"/>\n</package>\n')
+            with open(os.path.join(pkg, 'CMakeLists.txt'), 'w') as fhand:
+                fhand.write('cmake_minimum_required(VERSION 2.4.6)\n'
+                            'include($ENV{ROS_ROOT}/core/rosbuild/rosbuild.cmake)\n'
+                            'rosbuild_init()\nrosbuild_add_executable(foo src/foo.cpp)\n')
+            changeset = catkinize_package(pkg, '0.1.0', package_index=PackageIndex(['roscpp']))
+            package = make_report(pkg, changeset, 'declined')['packages'][0]
+            self.assertEqual('converted', package['status'])
+            self.assertEqual(0, package['markers'])
+        finally:
+            shutil.rmtree(root_dir)
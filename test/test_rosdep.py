@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from catkinize import rosdep
+from catkinize.convert_cmake import iter_convert_cmake
+from catkinize.convert_manifest import convert_manifest, parse_manifest
+from catkinize.rosdep import RosdepResolver, get_rosdep_resolver
+
+MANIFEST = '''<package>
+  <description>foo</description>
+  <author>Alice</author>
+  <license>BSD</license>
+  <depend package="roscpp"/>
+  <rosdep name="boost"/>
+  <rosdep name="nonsense"/>
+</package>'''
+
+
+class RosdepResolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.root_dir, 'base.yaml'), 'w') as fhand:
+            json.dump({'boost': {'ubuntu': {'lucid': ['libboost1.40-all-dev'], 'precise': ['libboost-all-dev']},
+                                 'fedora': 'boost-devel boost-python',
+                                 'osx': {'homebrew': {'packages': ['boost']}}},
+                       'fltk': {'ubuntu': {'apt': {'packages': ['libfltk1.1-dev']}}}}, fhand)
+        with open(os.path.join(self.root_dir, 'python.json'), 'w') as fhand:
+            json.dump({'python': {'ubuntu': ['python-dev']}}, fhand)
+        with open(os.path.join(self.root_dir, 'README'), 'w') as fhand:
+            fhand.write('not a database')
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def test_lookup(self):
+        resolver = RosdepResolver(self.root_dir)
+        self.assertEqual(3, len(resolver))
+        self.assertTrue('boost' in resolver)
+        self.assertTrue('python' in resolver)
+        self.assertFalse('nonsense' in resolver)
+        self.assertEqual((['boost', 'python'], ['nonsense']), resolver.split(['boost', 'nonsense', 'python']))
+
+    def test_get_rosdep_resolver(self):
+        resolver = get_rosdep_resolver(self.root_dir)
+        try:
+            self.assertTrue(resolver is get_rosdep_resolver(os.path.join(self.root_dir, '.')))
+        finally:
+            rosdep._resolvers.clear()
+
+    def test_invalid_database(self):
+        with open(os.path.join(self.root_dir, 'broken.json'), 'w') as fhand:
+            fhand.write('{"boost": ')
+        self.assertRaises(ValueError, RosdepResolver, self.root_dir)
+        with open(os.path.join(self.root_dir, 'broken.json'), 'w') as fhand:
+            fhand.write('["boost"]')
+        self.assertRaises(ValueError, RosdepResolver, self.root_dir)
+
+    def test_convert_manifest(self):
+        manifest = parse_manifest(MANIFEST)
+        plain = convert_manifest('foo', None, '0.1.0', manifest=manifest)
+        self.assertFalse('boost' in plain, plain)
+        package_xml = convert_manifest('foo', None, '0.1.0', manifest=manifest,
+                                       rosdep_resolver=RosdepResolver(self.root_dir))
+        self.assertTrue('  <build_depend>roscpp</build_depend>\n  <build_depend>boost</build_depend>\n'
+                        in package_xml, package_xml)
+        self.assertTrue('  <run_depend>boost</run_depend>\n'
+                        '  <!-- TODO: not found in the rosdep database, replace by the right keys -->\n'
+                        '  <!-- <run_depend>nonsense</run_depend> -->\n' in package_xml, package_xml)
+
+    def test_convert_cmake(self):
+        manifest = parse_manifest(MANIFEST)
+        plain = ''.join(iter_convert_cmake([''], 'foo', manifest=manifest))
+        self.assertTrue('DEPENDS roscpp boost nonsense' in plain, plain)
+        cmake = ''.join(iter_convert_cmake([''], 'foo', manifest=manifest,
+                                           rosdep_resolver=RosdepResolver(self.root_dir)))
+        self.assertTrue('DEPENDS roscpp boost\n' in cmake, cmake)
+        self.assertTrue('# TODO: not found in the rosdep database, add to DEPENDS if needed: nonsense\n' in cmake,
+                        cmake)
@@ -0,0 +1,91 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from catkinize import rules
+from catkinize.cache import ConversionCache
+from catkinize.convert_cmake import RuleTable, convert_snippet, expand_template, get_rule_table, set_rule_packs, \
+    MANUAL, REMOVE, RENAME, TEMPLATE, REMOVED_COMMENT
+from catkinize.rules import compile_rule_pack, load_rule_pack, use_rule_packs
+
+PACK = {'rules': [{'name': 'shop_add_bin', 'rename': 'add_executable'},
+                  {'name': 'shop_init', 'remove': True},
+                  {'name': 'shop_add_flags', 'manual': 'use target_compile_options()\n# or add_definitions()'},
+                  {'name': 'shop_add_test', 'template': 'catkin_add_gtest(@1@ test/@1@.cpp)'},
+                  {'name': 'rosbuild_init', 'template': '# @NAME@(@ARGS@) dropped'}]}
+
+
+class RulesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.pack_path = os.path.join(self.root_dir, 'shop.json')
+        with open(self.pack_path, 'w') as fhand:
+            json.dump(PACK, fhand)
+
+    def tearDown(self):
+        set_rule_packs(())
+        shutil.rmtree(self.root_dir)
+
+    def test_compile_rule_pack(self):
+        compiled = compile_rule_pack(PACK, 'shop.json')
+        self.assertEqual([('shop_add_bin', RENAME, 'add_executable'),
+                          ('shop_init', REMOVE, REMOVED_COMMENT),
+                          ('shop_add_flags', MANUAL,
+                           '\n# CATKIN_MIGRATION\n# use target_compile_options()\n# or add_definitions()'),
+                          ('shop_add_test', TEMPLATE, 'catkin_add_gtest(@1@ test/@1@.cpp)'),
+                          ('rosbuild_init', TEMPLATE, '# @NAME@(@ARGS@) dropped')], compiled)
+        self.assertEqual(compiled, compile_rule_pack(PACK['rules'], 'shop.json'))
+
+    def test_compile_invalid_rule_pack(self):
+        for data in [{'rule': []},
+                     ['shop_init'],
+                     [{'name': 'shop init', 'remove': True}],
+                     [{'name': 'shop_init'}],
+                     [{'name': 'shop_init', 'remove': True, 'rename': 'foo'}],
+                     [{'name': 'shop_init', 'remove': 'yes'}],
+                     [{'name': 'shop_init', 'rename': 'foo bar'}],
+                     [{'name': 'shop_init', 'manual': ''}]]:
+            self.assertRaises(ValueError, compile_rule_pack, data, 'shop.json')
+
+    def test_expand_template(self):
+        self.assertEqual('\n  catkin_add_gtest(foo test/foo.cpp)',
+                         expand_template('catkin_add_gtest(@1@ test/@1@.cpp)', '\n  shop_add_test', ' (foo bar)'))
+        self.assertEqual('x(@ARG@ )', expand_template('x(@ARG@ @3@)', 'y', '(a b)'))
+
+    def test_rule_table_packs(self):
+        table = RuleTable([('shop_add_bin', 'foo'), ('rosbuild_init', None)], [], packs=[
+            compile_rule_pack(PACK, 'shop.json'),
+            [('shop_init', RENAME, 'init')]])
+        self.assertEqual('  add_executable(x)', table.convert('  shop_add_bin', '(x)'))
+        self.assertEqual('  init()', table.convert('  shop_init', '()'))
+        self.assertEqual('# rosbuild_init( a ) dropped', table.convert('rosbuild_init', '( a )'))
+        self.assertEqual('\n# CATKIN_MIGRATION\n# use target_compile_options()\n# or add_definitions()\n'
+                         '# shop_add_flags(-O3)', table.convert('shop_add_flags', '(-O3)'))
+        self.assertTrue(table.fingerprint)
+        self.assertEqual(None, RuleTable([], []).fingerprint)
+
+    def test_use_rule_packs(self):
+        self.assertEqual('shop_add_bin(x)', convert_snippet('shop_add_bin', '(x)'))
+        self.assertEqual(5, use_rule_packs([self.pack_path]))
+        self.assertEqual('add_executable(x)', convert_snippet('shop_add_bin', '(x)'))
+        self.assertTrue(get_rule_table().fingerprint)
+
+    def test_load_rule_pack_cache(self):
+        cache = ConversionCache(os.path.join(self.root_dir, 'cache'))
+        expected = load_rule_pack(self.pack_path)
+        self.assertEqual(expected, load_rule_pack(self.pack_path, cache))
+        parse = rules.parse_data_file
+
+        def fail(*args):
+            raise AssertionError('parsed again')
+        rules.parse_data_file = fail
+        try:
+            compiled = load_rule_pack(self.pack_path, cache)
+        finally:
+            rules.parse_data_file = parse
+        self.assertEqual(expected, compiled)
+        self.assertTrue(all(isinstance(field, str) for rule in compiled for field in rule))
+        self.assertEqual((0, 0), (cache.hits, cache.misses))
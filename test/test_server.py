@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from catkinize.cache import ConversionCache
+from catkinize.convert_cmake import convert_cmake
+from catkinize.convert_manifest import convert_manifest
+from catkinize.main import catkinize_package
+from catkinize.server import Server, make_unix_server
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+class ServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.package = os.path.join(self.root_dir, 'navfn')
+        os.makedirs(self.package)
+        shutil.copy(os.path.join(FIXTURES, 'manifest.navfn.xml'), os.path.join(self.package, 'manifest.xml'))
+        shutil.copy(os.path.join(FIXTURES, 'CMakeLists.navfn.txt.in'), os.path.join(self.package, 'CMakeLists.txt'))
+        self.manifest = os.path.join(self.package, 'manifest.xml')
+        self.cmakelists = os.path.join(self.package, 'CMakeLists.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def test_handle(self):
+        server = Server(ConversionCache(os.path.join(self.root_dir, 'cache')))
+        self.assertEqual({'id': 1, 'ok': True, 'result': convert_cmake(self.package)},
+                         server.handle({'id': 1, 'op': 'convert_cmake', 'project_path': self.package}))
+        with open(self.cmakelists) as fhand:
+            cmakelists = fhand.read()
+        self.assertEqual(convert_cmake(self.package),
+                         server.handle({'op': 'convert_cmake', 'project_path': self.package,
+                                        'manifest_xml_path': self.manifest, 'cmakelists': cmakelists})['result'])
+        expected = convert_manifest(self.package, self.manifest, '1.0')
+        self.assertEqual(expected, server.handle({'op': 'convert_manifest', 'version': '1.0',
+                                                  'manifest_xml_path': self.manifest})['result'])
+        with open(self.manifest) as fhand:
+            manifest_xml = fhand.read()
+        self.assertEqual(expected, server.handle({'op': 'convert_manifest', 'version': '1.0',
+                                                  'package_path': self.package,
+                                                  'manifest_xml': manifest_xml})['result'])
+        for _ in range(2):
+            self.assertEqual([list(change) for change in catkinize_package(self.package, '1.0')],
+                             server.handle({'op': 'catkinize_package', 'path': self.package,
+                                            'version': '1.0'})['result'])
+        self.assertEqual({'requests': 7, 'errors': 0, 'cache_hits': 2, 'cache_misses': 2},
+                         server.handle({'op': 'stats'})['result'])
+
+    def test_handle_errors(self):
+        server = Server()
+        for request in [[], {'id': 2}, {'op': 'foo'}, {'op': 'stats', 'foo': 1},
+                        {'op': 'catkinize_package', 'path': self.root_dir, 'version': '1'},
+                        {'op': 'convert_manifest', 'version': '1', 'manifest_xml': '<package>'}]:
+            response = server.handle(request)
+            self.assertFalse(response['ok'])
+            self.assertTrue(response['error'])
+        self.assertEqual(2, server.handle({'op': 'stats', 'id': 2})['id'])
+
+    def test_serve(self):
+        instream = StringIO('{"id": 1, "op": "stats"}\n\nnot json\n{"id": 2, "op": "stats"}\n')
+        outstream = StringIO()
+        Server().serve(instream, outstream)
+        responses = [json.loads(line) for line in outstream.getvalue().splitlines()]
+        self.assertEqual([1, None, 2], [response['id'] for response in responses])
+        self.assertEqual([True, False, True], [response['ok'] for response in responses])
+        self.assertEqual({'requests': 3, 'errors': 1}, responses[2]['result'])
+
+    def test_unix_socket(self):
+        path = os.path.join(self.root_dir, 'socket')
+        unix_server = make_unix_server(path, Server())
+        thread = threading.Thread(target=unix_server.serve_forever)
+        thread.start()
+        try:
+            self.assertRaises(ValueError, make_unix_server, path, Server())
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(path)
+            fhand = client.makefile('rw')
+            for request_id in range(3):
+                fhand.write(json.dumps({'id': request_id, 'op': 'convert_cmake', 'project_path': self.package}) + '\n')
+                fhand.flush()
+                response = json.loads(fhand.readline())
+                self.assertEqual((request_id, True), (response['id'], response['ok']))
+            fhand.close()
+            client.close()
+        finally:
+            unix_server.shutdown()
+            unix_server.server_close()
+            thread.join()
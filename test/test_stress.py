@@ -0,0 +1,115 @@
+import signal
+import time
+import unittest
+
+from catkinize import xml_lib
+from catkinize.cmake_lexer import CMakeSyntaxError, scan, split_arguments
+from catkinize.convert_cmake import iter_convert_cmake, rewrite_cmake
+from catkinize.convert_manifest import Manifest, make_from_manifest
+
+import stress_corpus
+
+# seconds each entry point may take on a full size input
+BUDGET = 10.0
+# growth of the time for an input four times as large, with margin for noise;
+# quadratic behavior would show as 16
+MAX_GROWTH = 8.0
+MANIFEST = Manifest(stress_corpus.many_depends(3))
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def _budget_exceeded(signum, frame):
+    raise BudgetExceeded()
+
+
+def convert_chunks(content, size=4096):
+    chunks = (content[pos:pos + size] for pos in range(0, len(content), size))
+    return ''.join(iter_convert_cmake(chunks, 'foo', manifest=MANIFEST))
+
+
+class StressTest(unittest.TestCase):
+    """
+    Runs the converter entry points on pathological inputs, checking that they
+    finish within a time budget and in time linear in the size of the input.
+    Where alarms are available, a run over budget is interrupted and fails
+    instead of hanging.
+    """
+
+    def run_bounded(self, what, function, content):
+        """:returns: time taken by function(content), which must be within BUDGET"""
+        alarm = hasattr(signal, 'setitimer')
+        if alarm:
+            previous = signal.signal(signal.SIGALRM, _budget_exceeded)
+            signal.setitimer(signal.ITIMER_REAL, BUDGET)
+        start = time.time()
+        try:
+            function(content)
+        except BudgetExceeded:
+            self.fail('%s did not finish within %.0fs on %d characters, catastrophic backtracking?' %
+                      (what, BUDGET, len(content)))
+        finally:
+            if alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous)
+        elapsed = time.time() - start
+        self.assertTrue(elapsed <= BUDGET, '%s took %.1fs on %d characters' % (what, elapsed, len(content)))
+        return elapsed
+
+    def best_time(self, what, function, content, repeat=3):
+        return min(self.run_bounded(what, function, content) for _ in range(repeat))
+
+    def check(self, what, function, generator, size, error=None):
+        """checks function on the input from generator at full size, and its scaling below that"""
+        what = '%s on %s' % (what, generator.__name__)
+        if error is not None:
+            function = self.rejecting(function, error)
+        self.run_bounded(what, function, generator(size))
+        small = self.best_time(what, function, generator(size // 20))
+        large = self.best_time(what, function, generator(size // 5))
+        # a small absolute margin, as timers are coarse on some platforms
+        self.assertTrue(large <= MAX_GROWTH * small + 0.01,
+                        '%s took %.3fs for size %d but %.3fs for size %d, not linear' %
+                        (what, small, size // 20, large, size // 5))
+
+    def rejecting(self, function, error):
+        """:returns: function checking that its input is rejected with the given syntax error"""
+        def run(content):
+            try:
+                function(content)
+            except CMakeSyntaxError as exc:
+                self.assertEqual(error, str(exc))
+            else:
+                self.fail('no syntax error, expected: %s' % error)
+        return run
+
+    def test_scan(self):
+        for generator, size, error in stress_corpus.CMAKE_CORPUS:
+            self.check('scan', scan, generator, size, error)
+
+    def test_rewrite_cmake(self):
+        for generator, size, error in stress_corpus.CMAKE_CORPUS:
+            self.check('rewrite_cmake', lambda content: rewrite_cmake(content, 'foo', manifest=MANIFEST),
+                       generator, size, error)
+
+    def test_iter_convert_cmake(self):
+        for generator, size, error in stress_corpus.CMAKE_CORPUS:
+            self.check('iter_convert_cmake', convert_chunks, generator, size, error)
+
+    def test_split_arguments(self):
+        self.check('split_arguments', lambda content: split_arguments(content[len('set'):]),
+                   stress_corpus.long_arguments, 50000)
+        self.check('split_arguments', lambda content: split_arguments(content[len('if'):content.index('\n')]),
+                   stress_corpus.deep_nesting, 10000)
+
+    def test_make_from_manifest(self):
+        self.check('make_from_manifest',
+                   lambda content: make_from_manifest(content, 'foo', '1.0.0', False, False, '', [], []),
+                   stress_corpus.many_depends, 10000)
+
+    def test_comment_out_tags_named(self):
+        self.check('comment_out_tags_named',
+                   lambda content: xml_lib.comment_out_tags_named(content, 'test_depend'),
+                   stress_corpus.many_tags, 10000)
@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from catkinize import transaction
+from catkinize.transaction import apply_changes, journal_path, resume_changes, rollback_changes, \
+    JOURNAL_NAME, STAGED_SUFFIX
+
+
+class TransactionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.journal = os.path.join(self.root_dir, JOURNAL_NAME)
+        self.changeset = []
+        for name in ['a', 'b', 'c']:
+            oldfile = os.path.join(self.root_dir, name, 'CMakeLists.txt')
+            os.makedirs(os.path.dirname(oldfile))
+            with open(oldfile, 'w') as fhand:
+                fhand.write('old ' + name)
+            self.changeset.append((oldfile, oldfile + '.backup', oldfile, 'new ' + name))
+        self.changeset.append((None, None, os.path.join(self.root_dir, 'meta', 'sub', 'package.xml'), 'meta'))
+        self.rename = os.rename
+
+    def tearDown(self):
+        os.rename = self.rename
+        shutil.rmtree(self.root_dir)
+
+    def read(self, path):
+        with open(path) as fhand:
+            return fhand.read()
+
+    def listing(self):
+        return sorted(os.path.relpath(os.path.join(dirpath, filename), self.root_dir)
+                      for dirpath, _, filenames in os.walk(self.root_dir) for filename in filenames)
+
+    def crash_after(self, renames):
+        count = [0]
+
+        def crashing_rename(src, dst):
+            if count[0] == renames:
+                raise KeyboardInterrupt()
+            count[0] += 1
+            self.rename(src, dst)
+        os.rename = crashing_rename
+
+    def test_journal_path(self):
+        self.assertEqual(self.journal, journal_path(self.changeset))
+
+    def test_apply_changes(self):
+        messages = []
+        apply_changes(self.changeset, jobs=2, report=messages.append)
+        for oldfile, backup_file, newfile, content in self.changeset:
+            self.assertEqual(content, self.read(newfile))
+            if oldfile:
+                self.assertEqual(content.replace('new', 'old'), self.read(backup_file))
+        self.assertEqual(7, len(messages))
+        self.assertFalse(os.path.exists(self.journal))
+        self.assertFalse([path for path in self.listing() if path.endswith(STAGED_SUFFIX)])
+
+    def test_apply_changes_unfinished(self):
+        with open(self.journal, 'w') as fhand:
+            fhand.write('{}\n')
+        self.assertRaises(ValueError, apply_changes, self.changeset)
+
+    def test_apply_changes_write_fails(self):
+        before = self.listing()
+        # parent directory is a file
+        changeset = self.changeset + [(None, None, os.path.join(self.changeset[0][0], 'foo'), 'foo')]
+        self.assertRaises(OSError, apply_changes, changeset, jobs=1)
+        self.assertEqual(before, self.listing())
+        self.assertFalse(os.path.exists(os.path.join(self.root_dir, 'meta')))
+
+    def test_resume_changes(self):
+        for renames in range(7):
+            shutil.rmtree(self.root_dir)
+            self.setUp()
+            self.crash_after(renames)
+            self.assertRaises(KeyboardInterrupt, apply_changes, self.changeset)
+            os.rename = self.rename
+            self.assertTrue(os.path.exists(self.journal))
+            messages = []
+            self.assertTrue(resume_changes(self.journal, messages.append))
+            self.assertEqual(7 - renames, len(messages))
+            self.assertFalse(os.path.exists(self.journal))
+            for _, _, newfile, content in self.changeset:
+                self.assertEqual(content, self.read(newfile))
+
+    def test_rollback_changes(self):
+        before = self.listing()
+        for renames in range(7):
+            self.crash_after(renames)
+            self.assertRaises(KeyboardInterrupt, apply_changes, self.changeset)
+            os.rename = self.rename
+            rollback_changes(self.journal)
+            self.assertEqual(before, self.listing())
+            for oldfile, _, _, content in self.changeset:
+                if oldfile:
+                    self.assertEqual(content.replace('new', 'old'), self.read(oldfile))
+            self.assertFalse(os.path.exists(os.path.join(self.root_dir, 'meta')))
+
+    def test_resume_changes_not_staged(self):
+        before = self.listing()
+        with open(self.journal, 'w') as fhand:
+            fhand.write('{"changes": [], "directories": []}\n')
+        self.assertFalse(resume_changes(self.journal))
+        self.assertEqual(before, self.listing())
+
+    def test_apply_changes_interrupted_writing(self):
+        before = self.listing()
+        write = transaction._stage
+
+        def crashing_stage(args):
+            if args[1][3] == 'new c':
+                raise KeyboardInterrupt()
+            write(args)
+        transaction._stage = crashing_stage
+        try:
+            self.assertRaises(KeyboardInterrupt, apply_changes, self.changeset, jobs=1)
+        finally:
+            transaction._stage = write
+        self.assertEqual(before, self.listing())
@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import catkinize.watch
+from catkinize.watch import Watcher, watch_packages
+
+
+class WatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.foo = os.path.join(self.root_dir, 'foo')
+        self.bar = os.path.join(self.root_dir, 'bar')
+        for path in [self.foo, self.bar]:
+            with open(path, 'w') as fhand:
+                fhand.write('abc')
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def test_poll(self):
+        watcher = Watcher([self.foo, self.bar])
+        self.assertEqual([], watcher.poll())
+        with open(self.foo, 'w') as fhand:
+            fhand.write('abcd')
+        self.assertEqual([self.foo], watcher.poll())
+        self.assertEqual([], watcher.poll())
+        os.remove(self.bar)
+        self.assertEqual([self.bar], watcher.poll())
+        self.assertEqual([], watcher.poll())
+
+    def test_poll_same_mtime_and_size(self):
+        watcher = Watcher([self.foo])
+        stat = os.stat(self.foo)
+        with open(self.foo, 'w') as fhand:
+            fhand.write('xyz')
+        os.utime(self.foo, (stat.st_atime, stat.st_mtime))
+        self.assertEqual([self.foo], watcher.poll())
+
+    def test_watch_packages(self):
+        converted = []
+        sleep = catkinize.watch.time.sleep
+
+        def edit_foo(seconds):
+            if not converted:
+                with open(self.foo, 'w') as fhand:
+                    fhand.write('changed')
+        catkinize.watch.time.sleep = edit_foo
+        try:
+            watch_packages({'foopkg': [self.foo], 'barpkg': [self.bar]}, converted.append, polls=2)
+        finally:
+            catkinize.watch.time.sleep = sleep
+        self.assertEqual(['foopkg'], converted)
@@ -31,6 +31,16 @@ class CatkinizeCmakeFixturesTest(unittest.TestCase):
         # self.assertEqual(expect, result_buf.getvalue(), "%s\n!=\n%s" % (expect, result_buf.getvalue()))
         self.compare_contents(outfile, expect, result_buf.getvalue())
 
+    def test_stdin_filter(self):
+        infile = os.path.join(os.path.dirname(__file__), 'fixtures', 'CMakeLists.stage.txt.in')
+        manfile = os.path.join(os.path.dirname(__file__), 'fixtures', 'manifest.stage.xml')
+        expect_buf = StringIO.StringIO()
+        main(['foo', infile, manfile], outstream=expect_buf)
+        result_buf = StringIO.StringIO()
+        with open(infile, 'r') as fhand:
+            main(['foo', '-', manfile], outstream=result_buf, instream=fhand)
+        self.assertEqual(expect_buf.getvalue(), result_buf.getvalue())
+
     def test_stage(self):
         self.run_with_fixture('stage')
 